@@ -0,0 +1,182 @@
+"""
+Context assembly for retrieved documents.
+
+Turns the ranked documents returned by the retriever into a compact, token-
+budgeted context string for the LLM: overlapping or adjacent chunks from the
+same source are merged back together, near-duplicates are dropped, passages
+are ordered by score and cut to the budget, each with a short source label.
+"""
+import os
+import re
+from typing import Callable, List, Optional, Sequence
+
+from langchain_core.documents import Document
+
+# Shortest suffix/prefix match treated as a chunk overlap
+MIN_OVERLAP_CHARS = 20
+# Word-shingle Jaccard similarity above which a passage is a near-duplicate
+DUPLICATE_THRESHOLD = 0.85
+# Do not bother appending a truncated passage smaller than this
+MIN_PASSAGE_TOKENS = 40
+
+_encoder = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts tokens with tiktoken when available.
+
+    Falls back to an estimate (4 ASCII characters or 1 non-ASCII character
+    per token) if tiktoken or its encoding files are unavailable.
+    """
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text, disallowed_special=()))
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+def _truncate(text: str, max_tokens: int, counter: Callable[[str], int]) -> str:
+    """Cuts text to roughly max_tokens, on a word boundary."""
+    if counter(text) <= max_tokens:
+        return text
+    max_tokens -= counter(" …")
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if counter(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    cut = text[:low]
+    space = cut.rfind(" ")
+    return (cut[:space] if space > len(cut) // 2 else cut).rstrip() + " …"
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of left that is a prefix of right."""
+    max_len = min(len(left), len(right))
+    for size in range(max_len, MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _shingles(text: str) -> set:
+    words = re.findall(r"\w+", text.lower())
+    return {" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+
+
+class _Passage:
+    def __init__(self, doc: Document, score: float):
+        self.source = doc.metadata.get("source", "")
+        self.page = doc.metadata.get("page")
+        self.start = doc.metadata.get("start_index")
+        self.text = doc.page_content
+        self.score = score
+
+    @property
+    def end(self) -> Optional[int]:
+        return None if self.start is None else self.start + len(self.text)
+
+    def label(self) -> str:
+        name = os.path.basename(self.source) or "document"
+        return f"{name} (p.{self.page + 1})" if isinstance(self.page, int) else name
+
+    def try_merge(self, other: "_Passage") -> bool:
+        """Merges other into this passage if they overlap or touch."""
+        if other.source != self.source or other.page != self.page:
+            return False
+        if other.text in self.text:
+            self.score = max(self.score, other.score)
+            return True
+        if self.start is not None and other.start is not None:
+            if self.start <= other.start <= self.end < other.end:
+                self.text += other.text[self.end - other.start:]
+                self.score = max(self.score, other.score)
+                return True
+            return False
+        size = _overlap(self.text, other.text)
+        if size:
+            self.text += other.text[size:]
+            self.score = max(self.score, other.score)
+            return True
+        return False
+
+
+def _position(passage: _Passage):
+    page = passage.page if isinstance(passage.page, int) else -1
+    return (passage.source, page, passage.start if passage.start is not None else -1)
+
+
+def _merge(passages: List[_Passage]) -> List[_Passage]:
+    """Merges overlapping passages until no more pairs can be joined."""
+    merged = sorted(passages, key=_position)
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(len(merged)):
+                if i != j and merged[i].try_merge(merged[j]):
+                    del merged[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+
+def assemble_context(
+    docs: Sequence[Document],
+    max_tokens: Optional[int] = None,
+    token_counter: Callable[[str], int] = count_tokens,
+) -> str:
+    """
+    Builds the context string handed to the LLM from ranked documents.
+
+    Args:
+        docs: Retrieved documents, best first. A `relevance_score` metadata
+            entry (set by the reranker) takes precedence over list order.
+        max_tokens: Token budget. Defaults to RAG_CONTEXT_TOKENS (1500).
+        token_counter: Function counting the tokens of a string.
+
+    Returns:
+        Numbered passages with compact source labels, best first.
+    """
+    if max_tokens is None:
+        max_tokens = int(os.getenv("RAG_CONTEXT_TOKENS", "1500"))
+
+    passages = []
+    for rank, doc in enumerate(docs):
+        score = doc.metadata.get("relevance_score")
+        passages.append(_Passage(doc, float(score) if score is not None else 1.0 / (rank + 1)))
+    passages = _merge(passages)
+    passages.sort(key=lambda p: p.score, reverse=True)
+
+    kept, kept_shingles = [], []
+    for passage in passages:
+        shingles = _shingles(passage.text)
+        if any(len(shingles & other) / len(shingles | other) >= DUPLICATE_THRESHOLD for other in kept_shingles):
+            continue
+        kept.append(passage)
+        kept_shingles.append(shingles)
+
+    parts, used = [], 0
+    for passage in kept:
+        header = f"[{len(parts) + 1}] {passage.label()}\n"
+        cost = token_counter(header) + token_counter(passage.text)
+        if used + cost <= max_tokens:
+            parts.append(header + passage.text)
+            used += cost
+            continue
+        remaining = max_tokens - used - token_counter(header)
+        if remaining >= MIN_PASSAGE_TOKENS:
+            parts.append(header + _truncate(passage.text, remaining, token_counter))
+        break
+    return "\n\n".join(parts)
@@ -1,112 +1,173 @@
-import subprocess
-import json
+import asyncio
 import os
-from langchain_core.tools import tool
+import threading
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from langchain_core.tools import StructuredTool
+from mcp import StdioServerParameters
+
+from .cache import SQLiteTTLCache, cache_key
+from .deadline import bounded_timeout
+from .mcp_pool import MCPSessionPool
 
 # Context7 Configuration
 CONTEXT7_COMMAND = "npx"
 CONTEXT7_ARGS = ["-y", "@upstash/context7-mcp@latest"]
+CONTEXT7_POOL_SIZE = int(os.getenv("CONTEXT7_POOL_SIZE", "2"))
+CONTEXT7_TIMEOUT = float(os.getenv("CONTEXT7_TIMEOUT", "60"))
+DEFAULT_CACHE_PATH = "./context7_cache.sqlite"
+TOOL_NAME = "context7_tool"
+
+# Long-lived Context7 server processes, started with the app (or on first
+# use) instead of spawning npx for every query
+context7_pool = MCPSessionPool(
+    StdioServerParameters(command=CONTEXT7_COMMAND, args=CONTEXT7_ARGS, env=dict(os.environ)),
+    size=CONTEXT7_POOL_SIZE,
+    name="Context7",
+)
+
 
-@tool
-def context7_tool(query: str) -> str:
+def find_search_tool(tools) -> Optional[str]:
+    """Returns the name of the first tool that looks like a search/query tool."""
+    for t in tools:
+        if "search" in t.name.lower() or "query" in t.name.lower():
+            return t.name
+    return None
+
+
+def _result_text(result) -> str:
+    return "\n".join(c.text for c in result.content if getattr(c, "type", None) == "text")
+
+
+@lru_cache(maxsize=1)
+def get_context7_cache() -> Optional[SQLiteTTLCache]:
     """
-    Uses Context7 MCP to search documentation for Apache, Nginx, and Tomcat.
-    
-    Args:
-        query: The search query.
-        
-    Returns:
-        The search results from Context7.
+    On-disk cache of Context7 answers shared by the workers on this host.
+
+    Configured from CONTEXT7_CACHE ("false" disables it), CONTEXT7_CACHE_PATH,
+    CONTEXT7_CACHE_SIZE, CONTEXT7_CACHE_TTL and CONTEXT7_CACHE_STALE_TTL.
     """
-    try:
-        # Since we don't have a persistent MCP client session easily available in this stateless tool,
-        # and the user provided a CLI command, we might need to check if the CLI supports one-off commands.
-        # However, MCP servers usually run over stdio and wait for JSON-RPC messages.
-        # Running a fresh npx instance for every request is slow and might not work if it expects a session.
-        
-        # BUT, for this environment, let's try to run it as a one-off if possible, 
-        # OR we can try to use the `mcp-cli` or similar if available.
-        
-        # Given the constraints and the user's request to "use context7 mcp internally",
-        # and the command provided is for the SERVER, we need a CLIENT.
-        
-        # Let's try to use a python script to interact with the server process.
-        # We will spawn the process, send the 'initialize' request, then 'tools/call' (or resources/read), then exit.
-        
-        # NOTE: This is a simplified implementation. A real implementation would keep the process alive.
-        
-        # Construct the command
-        cmd = [CONTEXT7_COMMAND] + CONTEXT7_ARGS
-        
-        # We will use a helper script to interact with the MCP server because handling async stdio in a sync tool is tricky.
-        # But here we can just do a quick interaction.
-        
-        # Wait! The user said "context7 mcp... to answer Q&A". 
-        # Context7 likely exposes tools or resources. We need to know WHAT tool to call.
-        # Usually it's 'search' or similar.
-        # Let's assume there is a 'search' tool or we list tools first.
-        
-        # For now, to avoid blocking, I will return a message saying we need to implement the persistent client
-        # or use a library that handles this.
-        
-        # Let's try to use `mcp` package's client capabilities if possible.
-        # Since I cannot easily verify the `mcp` client usage without docs, I will implement a basic interaction.
-        
-        return "Context7 integration is partially configured. Please verify the tool name to call (e.g., 'search')."
+    if os.getenv("CONTEXT7_CACHE", "true").lower() == "false":
+        return None
+    return SQLiteTTLCache(
+        os.getenv("CONTEXT7_CACHE_PATH", DEFAULT_CACHE_PATH),
+        maxsize=int(os.getenv("CONTEXT7_CACHE_SIZE", "1000")),
+        ttl=float(os.getenv("CONTEXT7_CACHE_TTL", "21600")),
+        stale_ttl=float(os.getenv("CONTEXT7_CACHE_STALE_TTL", "86400")),
+    )
+
+
+def normalize_arguments(arguments: dict) -> dict:
+    """Lowercases string arguments and collapses their whitespace for cache keys."""
+    return {k: " ".join(v.lower().split()) if isinstance(v, str) else v for k, v in arguments.items()}
+
+
+async def _fetch(query: str, pool: MCPSessionPool, timeout: float) -> Tuple[str, bool]:
+    """Returns the answer and whether it may be cached (not an error)."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    tools = await pool.alist_tools(timeout)
+    search_tool_name = find_search_tool(tools)
+    if not search_tool_name:
+        return f"Could not find a search tool in Context7. Available tools: {[t.name for t in tools]}", False
+    result = await pool.acall_tool(search_tool_name, {"query": query}, max(0.0, deadline - loop.time()))
+    # isError in mcp 1.x, is_error in later releases
+    failed = getattr(result, "isError", None) or getattr(result, "is_error", False)
+    return _result_text(result), not failed
+
+
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+
+def _revalidate(query: str, pool: MCPSessionPool, cache: SQLiteTTLCache, key: str, timeout: float):
+    """Refreshes a stale entry on the pool's loop, once per key at a time."""
+    with _revalidating_lock:
+        if key in _revalidating:
+            return
+        _revalidating.add(key)
 
+    async def refresh():
+        try:
+            text, cacheable = await _fetch(query, pool, timeout)
+            if cacheable:
+                cache.set(key, text)
+        except Exception as e:
+            print(f"[Context7] Revalidation failed: {e}")
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(key)
+
+    pool.submit(refresh())
+
+
+async def query_context7(
+    query: str,
+    pool: MCPSessionPool = context7_pool,
+    timeout: float = CONTEXT7_TIMEOUT,
+    cache: Optional[SQLiteTTLCache] = None,
+) -> str:
+    """
+    Searches Context7 from the caller's event loop.
+
+    The session itself lives on the pool's loop; the caller only awaits the
+    result, so cancelling the caller cancels the MCP request as well. With a
+    cache, fresh answers are returned without a call and stale ones are
+    returned at once while a background call refreshes them.
+
+    Raises:
+        TimeoutError: If the lookup takes longer than timeout seconds.
+    """
+    key = cache_key(TOOL_NAME, normalize_arguments({"query": query}))
+    if cache is not None:
+        entry = cache.lookup(key)
+        if entry is not None:
+            text, fresh = entry
+            if not fresh:
+                _revalidate(query, pool, cache, key, timeout)
+            return text
+    text, cacheable = await _fetch(query, pool, timeout)
+    if cache is not None and cacheable:
+        cache.set(key, text)
+    return text
+
+
+def context7_sync_wrapper(
+    query: str,
+    pool: MCPSessionPool = context7_pool,
+    timeout: float = CONTEXT7_TIMEOUT,
+    cache: Optional[SQLiteTTLCache] = None,
+) -> str:
+    """Runs a Context7 query on the session pool from a sync caller"""
+    try:
+        return pool.submit(query_context7(query, pool, timeout, cache)).result()
     except Exception as e:
-        return f"Error querying Context7: {str(e)}"
+        return f"Error executing Context7 query: {str(e)}"
 
-# Redefining the tool to actually do something useful if possible.
-# Since I can't easily run the npx command and interact with it in a single tool call reliably without a proper client library,
-# I will implement a wrapper that uses `mcp` python client to connect to the stdio process.
 
-import asyncio
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
-
-async def query_context7(query: str):
-    server_params = StdioServerParameters(
-        command=CONTEXT7_COMMAND,
-        args=CONTEXT7_ARGS,
-        env=os.environ
-    )
-    
-    async with stdio_client(server_params) as (read, write):
-        async with ClientSession(read, write) as session:
-            await session.initialize()
-            
-            # List tools to find the search tool
-            tools = await session.list_tools()
-            search_tool_name = None
-            for t in tools.tools:
-                if "search" in t.name.lower() or "query" in t.name.lower():
-                    search_tool_name = t.name
-                    break
-            
-            if not search_tool_name:
-                return f"Could not find a search tool in Context7. Available tools: {[t.name for t in tools.tools]}"
-            
-            # Call the tool
-            result = await session.call_tool(search_tool_name, arguments={"query": query})
-            return result.content[0].text
-
-def context7_sync_wrapper(query: str) -> str:
-    """Wrapper to run async context7 query in sync tool"""
+def _search(query: str) -> str:
+    try:
+        timeout = bounded_timeout(CONTEXT7_TIMEOUT)
+    except TimeoutError as e:
+        return f"Error executing Context7 query: {str(e)}"
+    return context7_sync_wrapper(query, timeout=timeout, cache=get_context7_cache())
+
+
+async def context7_async_wrapper(query: str) -> str:
+    """Async variant of `context7_sync_wrapper`; cancellation propagates to the call"""
     try:
-        return asyncio.run(query_context7(query))
+        # CONTEXT7_TIMEOUT, or less when the run's deadline is closer
+        return await query_context7(query, timeout=bounded_timeout(CONTEXT7_TIMEOUT), cache=get_context7_cache())
     except Exception as e:
         return f"Error executing Context7 query: {str(e)}"
 
-@tool
-def context7_tool(query: str) -> str:
-    """
-    Uses Context7 MCP to search documentation for Apache, Nginx, and Tomcat.
-    
-    Args:
-        query: The search query.
-        
-    Returns:
-        The search results from Context7.
-    """
-    return context7_sync_wrapper(query)
+
+# The agent runs tools through their coroutine, so a lookup needs neither a
+# worker thread nor an event loop of its own; sync invocations still work
+context7_tool = StructuredTool.from_function(
+    func=_search,
+    coroutine=context7_async_wrapper,
+    name=TOOL_NAME,
+    description="Uses Context7 MCP to search documentation for Apache, Nginx, and Tomcat.",
+)
@@ -0,0 +1,91 @@
+"""
+Per-run deadline budget.
+
+The API and MCP servers give every agent run an absolute deadline (epoch
+seconds, `AgentState["deadline"]`). The agent node stops offering tools and
+writes a final answer once less than AGENT_FINAL_ANSWER_RESERVE seconds are
+left, and the tools node publishes the deadline in a context variable so
+each tool can cap its own timeout with `bounded_timeout`.
+"""
+import asyncio
+import concurrent.futures
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+RUN_TIMEOUT = float(os.getenv("AGENT_RUN_TIMEOUT", "120"))
+FINAL_ANSWER_RESERVE = float(os.getenv("AGENT_FINAL_ANSWER_RESERVE", "15"))
+
+# Before Python 3.11 asyncio and concurrent.futures raise their own timeout
+# classes instead of the builtin TimeoutError
+TIMEOUT_ERRORS = (TimeoutError, asyncio.TimeoutError, concurrent.futures.TimeoutError)
+
+# Slack after the deadline before a run that ignores it is cancelled
+CANCEL_GRACE = 5.0
+
+_deadline: ContextVar[Optional[float]] = ContextVar("run_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The run's time budget is used up."""
+
+
+def new_deadline(timeout: Optional[float] = None) -> float:
+    """Deadline for a run starting now (default: AGENT_RUN_TIMEOUT seconds)."""
+    return time.time() + (RUN_TIMEOUT if timeout is None else timeout)
+
+
+def seconds_left(deadline: Optional[float]) -> Optional[float]:
+    """Seconds until deadline, or None when the run has no deadline."""
+    return None if deadline is None else deadline - time.time()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[float]) -> Iterator[None]:
+    """Makes deadline the current run's deadline for the tools called inside."""
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left() -> Optional[float]:
+    """Seconds left in the current run, or None outside a run with a deadline."""
+    return seconds_left(_deadline.get())
+
+
+def bounded_timeout(timeout: float) -> float:
+    """
+    Caps a tool's own timeout by the time left in the current run.
+
+    Raises:
+        DeadlineExceeded: If the run's deadline has passed.
+    """
+    left = time_left()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("The request's time budget is used up")
+    return min(timeout, left)
+
+
+async def ainvoke_with_deadline(app, inputs: dict, timeout: Optional[float] = None) -> Any:
+    """
+    Runs the agent graph with a deadline in its state.
+
+    The nodes answer by the deadline on their own; a run still going
+    CANCEL_GRACE seconds after it is cancelled.
+
+    Raises:
+        TimeoutError: If the run was cancelled.
+    """
+    deadline = new_deadline(timeout)
+    try:
+        return await asyncio.wait_for(
+            app.ainvoke({**inputs, "deadline": deadline}), seconds_left(deadline) + CANCEL_GRACE
+        )
+    except asyncio.TimeoutError:
+        raise TimeoutError("The agent run was cancelled at its deadline") from None
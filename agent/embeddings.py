@@ -0,0 +1,233 @@
+"""
+Embedding layer for the RAG index.
+
+`CachedEmbeddings` wraps any LangChain embedding model with a persistent
+SQLite cache keyed by (model, text hash). Only cache misses are sent to the
+underlying model, in sized batches with bounded concurrency, so rebuilds and
+re-chunking experiments do not pay again for text that was already embedded.
+Queries (retrieval queries and user questions) are never written to disk:
+they are kept in a bounded in-memory LRU instead.
+
+`HashingEmbeddings` is a deterministic, offline embedding function for tests
+and benchmarks.
+"""
+import asyncio
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from .cache import TTLCache
+
+DEFAULT_CACHE_PATH = "./embedding_cache.sqlite"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed store of embedding vectors keyed by (model, text hash).
+
+    Uses WAL mode so several processes on the same host can share one file.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, hash))"
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(batch))})",
+                    [model, *batch],
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = array("f", blob).tolist()
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, List[float]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)",
+                [(model, h, array("f", v).tobytes()) for h, v in vectors.items()],
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves vectors from an `EmbeddingCache`.
+
+    Misses are de-duplicated, split into batches of `batch_size` texts and
+    sent to the underlying model with at most `max_concurrency` batches in
+    flight at once. Query embeddings go to an in-memory LRU of
+    `query_cache_size` entries (0 disables it) and never to `cache`.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        cache: Optional[EmbeddingCache] = None,
+        batch_size: int = 128,
+        max_concurrency: int = 4,
+        model: Optional[str] = None,
+        query_cache_size: int = 1024,
+    ):
+        self.underlying = underlying
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        # Exposed as `model` so index settings track the underlying model
+        self.model = model or getattr(underlying, "model", None) or type(underlying).__name__
+        self.queries = TTLCache(maxsize=query_cache_size, ttl=None)
+        self.hits = 0
+        self.misses = 0
+
+    def _plan(self, texts: List[str]):
+        """Returns (hashes, cached vectors, batches of missing texts)."""
+        hashes = [text_hash(t) for t in texts]
+        cached = self.cache.get_many(self.model, list(set(hashes)))
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in cached:
+                missing.setdefault(h, t)
+        self.hits += len(texts) - sum(1 for h in hashes if h not in cached)
+        self.misses += len(missing)
+        items = list(missing.items())
+        batches = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+        return hashes, cached, batches
+
+    def _store(self, cached: Dict[str, List[float]], batches, results):
+        fresh = {}
+        for batch, vectors in zip(batches, results):
+            for (h, _), vector in zip(batch, vectors):
+                fresh[h] = vector
+        if fresh:
+            self.cache.put_many(self.model, fresh)
+            cached.update(fresh)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes, cached, batches = self._plan(texts)
+        if len(batches) == 1 or self.max_concurrency <= 1:
+            results = [self.underlying.embed_documents([t for _, t in batch]) for batch in batches]
+        elif batches:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+                results = list(pool.map(lambda b: self.underlying.embed_documents([t for _, t in b]), batches))
+        else:
+            results = []
+        self._store(cached, batches, results)
+        return [cached[h] for h in hashes]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes, cached, batches = self._plan(texts)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(batch):
+            async with semaphore:
+                return await self.underlying.aembed_documents([t for _, t in batch])
+
+        results = await asyncio.gather(*(run(b) for b in batches))
+        self._store(cached, batches, results)
+        return [cached[h] for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = text_hash(text)
+        vector = self.queries.get(key)
+        if vector is None:
+            vector = self.underlying.embed_query(text)
+            self.queries.set(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = text_hash(text)
+        vector = self.queries.get(key)
+        if vector is None:
+            vector = await self.underlying.aembed_query(text)
+            self.queries.set(key, vector)
+        return vector
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic offline embeddings based on feature hashing.
+
+    Words and character trigrams are hashed into `size` buckets and the
+    result is L2-normalized, so texts sharing vocabulary get similar
+    vectors. Needs no network access or API key.
+    """
+
+    def __init__(self, size: int = 256):
+        self.size = size
+        self.model = f"hashing-{size}"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        for word in re.findall(r"\w+", text.lower()):
+            features = [word] + [word[i:i + 3] for i in range(max(0, len(word) - 2))]
+            for feature in features:
+                digest = hashlib.md5(feature.encode("utf-8")).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.size
+                vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def default_embeddings() -> Embeddings:
+    """
+    Returns the embedding model used by the RAG index.
+
+    OpenAIEmbeddings wrapped in a `CachedEmbeddings`, configured from
+    RAG_EMBEDDING_CACHE (set to "false" to disable caching),
+    RAG_EMBEDDING_CACHE_PATH, RAG_EMBED_BATCH_SIZE, RAG_EMBED_CONCURRENCY and
+    RAG_QUERY_CACHE_SIZE (in-memory query embeddings).
+    """
+    from langchain_openai import OpenAIEmbeddings
+
+    embedding = OpenAIEmbeddings()
+    if os.getenv("RAG_EMBEDDING_CACHE", "true").lower() == "false":
+        return embedding
+    return CachedEmbeddings(
+        embedding,
+        cache=EmbeddingCache(os.getenv("RAG_EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH)),
+        batch_size=int(os.getenv("RAG_EMBED_BATCH_SIZE", "128")),
+        max_concurrency=int(os.getenv("RAG_EMBED_CONCURRENCY", "4")),
+        query_cache_size=int(os.getenv("RAG_QUERY_CACHE_SIZE", "1024")),
+    )
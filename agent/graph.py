@@ -1,14 +1,21 @@
 from langgraph.graph import StateGraph, END
 from langchain_openai import ChatOpenAI
-from langchain_core.tools import Tool
-from langgraph.prebuilt import ToolNode
+from langchain_core.tools import StructuredTool
+from langchain_core.messages import AIMessage, SystemMessage
+from langchain_core.runnables import RunnableLambda
 from .state import AgentState
-from .rag import get_retriever
+from .deadline import FINAL_ANSWER_RESERVE, TIMEOUT_ERRORS, seconds_left
+from .tool_executor import ToolExecutor
+from .rag import IndexManager
+from .context import assemble_context
 from .tools import http_request_tool, tavily_search_tool
-from .context7 import context7_tool
+from .context7 import CONTEXT7_POOL_SIZE, CONTEXT7_TIMEOUT, context7_tool
+import asyncio
 import os
+import openai
+from functools import lru_cache
+from typing import Optional
 from dotenv import load_dotenv
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
 load_dotenv()
 
@@ -28,11 +35,13 @@ SYSTEM_PROMPT = """
 - 제공된 문서나 데이터셋을 기반으로 정보를 검색하고 답변한다.
 - 사용자가 특정한 문서를 제공한 경우, 우선적으로 해당 문서를 지식 근거로 활용한다.
 - 사용자가 제공한 문서에 내용이 없는 경우, 임의로 대답하지 않는다.
+- 특정 제품(LENA, Apache, Nginx, Tomcat)에 관한 질문은 search_documents의 product 인자로 검색 범위를 좁힌다.
 ---
 
 ### 2. HTTP 요청 (API 호출)
 - 외부 API 또는 시스템 엔드포인트에 정확한 형식으로 요청을 보낸다.
 - 메서드(GET, POST, PUT, DELETE 등)와 헤더, 파라미터를 반드시 지정한다.
+- 목록처럼 큰 JSON 응답은 path, fields, limit, offset 인자로 필요한 부분만 요청한다.
 
 #### LENA REST API
 - LENA 시스템 관련 요청은 **LENA 전용 REST API**를 사용할 수 있다.
@@ -74,51 +83,228 @@ SYSTEM_PROMPT = """
 - 인증 정보 출력 금지
 """
 
-# Load LENA API Spec
-try:
-    with open("config/lena_api_spec.md", "r", encoding="utf-8") as f:
-        api_spec = f.read()
-        SYSTEM_PROMPT += f"\n\n**LENA API Specification:**\n{api_spec}"
-except FileNotFoundError:
-    pass
+# Appended when the run's time budget is nearly used up
+FINAL_ANSWER_PROMPT = (
+    "응답 시간이 얼마 남지 않았다. 더 이상 도구를 호출하지 말고, 지금까지 수집한 정보만으로 최종 답변을 작성한다. "
+    "확인하지 못한 내용이 있으면 그 사실을 밝힌다."
+)
+# Returned when not even the final answer fits in the time budget
+TIMEOUT_ANSWER = "요청 처리 시간이 초과되어 답변을 완료하지 못했습니다. 질문 범위를 좁혀서 다시 시도해 주세요."
+
+# Heavy components (LLM client, API spec, RAG index) are built on first use or
+# by start_background_init(), so importing this module is cheap and the servers
+# can accept connections right away.
+
+# Answer without search_documents while the index is still building instead of
+# waiting for it
+DEGRADED_MODE = os.getenv("RAG_DEGRADED_MODE", "false").lower() == "true"
+# Longest a request waits for the index when degraded mode is off
+INDEX_READY_TIMEOUT = float(os.getenv("RAG_READY_TIMEOUT", "600"))
 
-# Initialize LLM
-llm = ChatOpenAI(model="gpt-4o-mini")
+@lru_cache(maxsize=1)
+def get_system_prompt() -> str:
+    # Load LENA API Spec
+    try:
+        with open("config/lena_api_spec.md", "r", encoding="utf-8") as f:
+            api_spec = f.read()
+            return SYSTEM_PROMPT + f"\n\n**LENA API Specification:**\n{api_spec}"
+    except FileNotFoundError:
+        return SYSTEM_PROMPT
+
+@lru_cache(maxsize=1)
+def get_llm() -> ChatOpenAI:
+    return ChatOpenAI(model="gpt-4o-mini")
 
 # Initialize Tools
 tools = [http_request_tool, tavily_search_tool, context7_tool]
 
 # Initialize RAG
-retriever = get_retriever(enable_rerank=os.getenv("RAG_ENABLE_RERANK", "false").lower() == "true")
-if retriever:
-    def retrieve_docs(query: str) -> str:
-        docs = retriever.invoke(query)
-        return "\n\n".join([d.page_content for d in docs])
-
-    retriever_tool = Tool(
-        name="search_documents",
-        func=retrieve_docs,
-        description="Searches and returns excerpts from the documentation."
-    )
-    tools.append(retriever_tool)
+# The index is built in the background; the index manager then swaps in a
+# rebuilt retriever when docs/ changes (RAG_WATCH_INTERVAL seconds, or
+# POST /admin/reindex on the API server)
+index_manager = IndexManager(enable_rerank=os.getenv("RAG_ENABLE_RERANK", "false").lower() == "true")
+
+def start_background_init():
+    """Starts building the document index in the background (idempotent)."""
+    index_manager.start_background(float(os.getenv("RAG_WATCH_INTERVAL", "0")))
+
+def documents_available(timeout: Optional[float] = None) -> bool:
+    """
+    True if search_documents can be offered for this request.
+
+    Starts the index build on first use. Unless degraded mode is on, waits
+    (up to RAG_READY_TIMEOUT seconds, or timeout if shorter) for the build
+    to finish.
+    """
+    start_background_init()
+    if index_manager.shards is None and not DEGRADED_MODE:
+        index_manager.wait_ready(INDEX_READY_TIMEOUT if timeout is None else min(timeout, INDEX_READY_TIMEOUT))
+    return index_manager.shards is not None
+
+def readiness() -> dict:
+    """Readiness of the agent: ready once requests can be served as configured."""
+    index_ready = index_manager.shards is not None
+    return {
+        "ready": index_ready or DEGRADED_MODE,
+        "degraded": DEGRADED_MODE and not index_ready,
+        "index": {
+            "state": index_manager.state,
+            "version": index_manager.version,
+            "error": index_manager.error,
+        },
+    }
+
+NO_DOCUMENTS = "No documents are indexed."
+
+def _select_shard(product: Optional[str]):
+    # Grab the current snapshot once; a concurrent swap does not affect this query
+    shards = index_manager.shards
+    if shards is None:
+        return None, NO_DOCUMENTS
+    if product and product.strip().lower() not in shards.products:
+        note = f"No documents for product '{product}' (indexed: {', '.join(shards.products)}); searched all products.\n\n"
+        return shards.get(), note
+    return shards.get(product), ""
+
+def retrieve_docs(query: str, product: Optional[str] = None) -> str:
+    """
+    Searches the internal documentation and returns relevant excerpts.
+
+    Args:
+        query: The search query.
+        product: Optional product to search only its documents, e.g. "lena",
+            "apache", "nginx" or "tomcat".
+    """
+    retriever, note = _select_shard(product)
+    if retriever is None:
+        return note
+    return note + assemble_context(retriever.invoke(query))
+
+async def aretrieve_docs(query: str, product: Optional[str] = None) -> str:
+    retriever, note = _select_shard(product)
+    if retriever is None:
+        return note
+    return note + assemble_context(await retriever.ainvoke(query))
+
+retriever_tool = StructuredTool.from_function(
+    func=retrieve_docs,
+    coroutine=aretrieve_docs,
+    name="search_documents",
+    description=(
+        "Searches and returns excerpts from the documentation. "
+        "Set product (e.g. lena, apache, nginx, tomcat) to search only that product's documents."
+    ),
+)
+tools.append(retriever_tool)
+
+@lru_cache(maxsize=4)
+def get_model(with_documents: bool = True, allow_tools: bool = True):
+    """
+    Returns the LLM bound to the tools, with or without search_documents.
 
-# Bind tools to LLM
-model = llm.bind_tools(tools)
+    With allow_tools=False the tools stay declared (the history may contain
+    tool calls) but the model must answer in text.
+    """
+    bound = tools if with_documents else [t for t in tools if t is not retriever_tool]
+    return get_llm().bind_tools(bound, tool_choice=None if allow_tools else "none")
 
 # Define Nodes
-def agent(state: AgentState):
+def cut_short(message) -> bool:
+    """True if the answer was forced or replaced because the run's deadline was near."""
+    return bool(message.response_metadata.get("deadline_reached"))
+
+# Answers built from these tools' output go stale and are not cached
+LIVE_DATA_TOOLS = frozenset({http_request_tool.name, tavily_search_tool.name})
+
+def cacheable(messages) -> bool:
+    """
+    True if a run's answer may go into the semantic cache: it was not cut
+    short and no tool returning live data (LENA API, web search) was called.
+    """
+    if not messages or cut_short(messages[-1]):
+        return False
+    return not any(
+        call["name"] in LIVE_DATA_TOOLS
+        for message in messages
+        for call in getattr(message, "tool_calls", None) or []
+    )
+
+def _timeout_answer() -> AIMessage:
+    return AIMessage(content=TIMEOUT_ANSWER, response_metadata={"deadline_reached": True})
+
+def _finish(response: AIMessage, left: Optional[float]) -> dict:
+    if _final_turn(left):
+        # Not worth caching: the tools it would have used were skipped
+        response.response_metadata["deadline_reached"] = True
+    return {"messages": [response]}
+
+def _prompt(state: AgentState, left: Optional[float]) -> list:
     messages = state['messages']
     # Prepend system prompt if it's not already there (or handled by ChatPromptTemplate)
     # For simplicity in this graph, we can just prepend it to the messages sent to the model
     # or use a prompt template. Let's use a prompt template approach effectively by inserting it.
-    
-    from langchain_core.messages import SystemMessage
-    
     if not isinstance(messages[0], SystemMessage):
-        messages = [SystemMessage(content=SYSTEM_PROMPT)] + messages
-    
-    response = model.invoke(messages)
-    return {"messages": [response]}
+        messages = [SystemMessage(content=get_system_prompt())] + messages
+    if _final_turn(left):
+        messages = messages + [SystemMessage(content=FINAL_ANSWER_PROMPT)]
+    return messages
+
+def _final_turn(left: Optional[float]) -> bool:
+    """True when the time left only suffices for answering (AGENT_FINAL_ANSWER_RESERVE)."""
+    return left is not None and left < FINAL_ANSWER_RESERVE
+
+def _select_model(left: Optional[float]):
+    if _final_turn(left):
+        # Answer with what the conversation has; do not wait for the index
+        return get_model(index_manager.shards is not None, allow_tools=False)
+    # Waiting for the index leaves at least the final answer's reserve
+    return get_model(documents_available(None if left is None else left - FINAL_ANSWER_RESERVE))
+
+def agent(state: AgentState):
+    left = seconds_left(state.get("deadline"))
+    if left is not None and left <= 0:
+        return {"messages": [_timeout_answer()]}
+    model = _select_model(left)
+    kwargs = {}
+    if left is not None:
+        # Waiting for the index may have used up the rest of the budget
+        remaining = seconds_left(state["deadline"])
+        if remaining <= 0:
+            return {"messages": [_timeout_answer()]}
+        kwargs["timeout"] = remaining
+    try:
+        response = model.invoke(_prompt(state, left), **kwargs)
+    except (*TIMEOUT_ERRORS, openai.APITimeoutError):
+        return {"messages": [_timeout_answer()]}
+    return _finish(response, left)
+
+async def aagent(state: AgentState):
+    """Async variant of `agent`; the LLM call is cut off at the deadline."""
+    left = seconds_left(state.get("deadline"))
+    if left is not None and left <= 0:
+        return {"messages": [_timeout_answer()]}
+    model = await asyncio.to_thread(_select_model, left)
+    messages = _prompt(state, left)
+    try:
+        if left is None:
+            response = await model.ainvoke(messages)
+        else:
+            # left still decides _finish: the prompt was chosen with it
+            remaining = max(0.0, seconds_left(state["deadline"]))
+            response = await asyncio.wait_for(model.ainvoke(messages, timeout=remaining), remaining)
+    except (*TIMEOUT_ERRORS, openai.APITimeoutError):
+        return {"messages": [_timeout_answer()]}
+    return _finish(response, left)
+
+# Runs a turn's tool calls concurrently. Context7 calls are capped at the
+# number of pooled server processes and Tavily calls at a few at a time;
+# TOOL_CONCURRENCY, TOOL_RATE_LIMITS and TOOL_TIMEOUTS override per tool.
+# Tools also cap their timeouts by the run's deadline.
+tool_executor = ToolExecutor.from_env(
+    tools,
+    concurrency={context7_tool.name: CONTEXT7_POOL_SIZE, tavily_search_tool.name: 4},
+    timeouts={context7_tool.name: CONTEXT7_TIMEOUT},
+)
 
 def should_continue(state: AgentState):
     messages = state['messages']
@@ -130,8 +316,8 @@ def should_continue(state: AgentState):
 # Define Graph
 workflow = StateGraph(AgentState)
 
-workflow.add_node("agent", agent)
-workflow.add_node("tools", ToolNode(tools))
+workflow.add_node("agent", RunnableLambda(agent, afunc=aagent, name="agent"))
+workflow.add_node("tools", RunnableLambda(tool_executor.invoke, afunc=tool_executor.ainvoke, name="tools"))
 
 workflow.set_entry_point("agent")
 
@@ -0,0 +1,248 @@
+"""
+HTTP response cache for safe LENA REST API calls.
+
+Only GET and HEAD requests to LENA_API_URL are cached. Freshness follows the
+response's Cache-Control (no-store, no-cache, max-age) and Expires headers,
+unless a per-path TTL overrides it. Stale entries that carry an ETag or
+Last-Modified are revalidated with a conditional request, and a 304 answer
+re-serves the stored body (or, if it was evicted meanwhile, the request is
+sent again unconditionally). The auto-injected `key=` parameter is not part of
+the cache key. Mutating calls are never stored and drop the cached responses
+of the path they change.
+"""
+import email.utils
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .cache import cache_key
+from .http_client import BoundedResponse
+
+SAFE_METHODS = ("GET", "HEAD")
+
+
+def parse_path_ttls(value: Optional[str]) -> Dict[str, float]:
+    """Parses "/path=seconds,/path=seconds" into a {path prefix: seconds} dict."""
+    ttls = {}
+    for item in (value or "").split(","):
+        if "=" in item:
+            path, seconds = item.rsplit("=", 1)
+            ttls[path.strip()] = float(seconds)
+    return ttls
+
+
+def _cache_control(headers) -> Dict[str, Optional[str]]:
+    directives = {}
+    for part in headers.get("cache-control", "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"') or None
+    return directives
+
+
+class CacheLookup(NamedTuple):
+    """Result of `HTTPResponseCache.lookup`."""
+    key: Optional[str]
+    # A fresh stored response: no request is needed
+    response: Optional[BoundedResponse] = None
+    # Validators to send when the stored response is stale
+    headers: Dict[str, str] = {}
+
+
+class _Entry:
+    def __init__(self, path: str, response: BoundedResponse, expires_at: float):
+        self.path = path
+        self.response = response
+        self.expires_at = expires_at
+        self.etag = response.headers.get("etag")
+        self.last_modified = response.headers.get("last-modified")
+
+
+class HTTPResponseCache:
+    """
+    In-memory LRU cache of LENA API responses, shared by all conversations.
+
+    Args:
+        base_url: API root whose responses are cached (default: LENA_API_URL
+            at call time); other URLs are never cached.
+        maxsize: Stored responses (0 disables caching).
+        default_ttl: Freshness of responses without caching headers.
+        path_ttls: TTLs by path prefix (relative to base_url), overriding
+            the response headers except no-store.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        maxsize: int = 256,
+        default_ttl: float = 0.0,
+        path_ttls: Optional[Dict[str, float]] = None,
+    ):
+        self.base_url = base_url
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self.path_ttls = path_ttls or {}
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    @classmethod
+    def from_env(cls) -> "HTTPResponseCache":
+        """
+        Configured from LENA_CACHE ("false" disables it), LENA_CACHE_SIZE,
+        LENA_CACHE_TTL and LENA_CACHE_PATH_TTLS.
+        """
+        enabled = os.getenv("LENA_CACHE", "true").lower() != "false"
+        return cls(
+            maxsize=int(os.getenv("LENA_CACHE_SIZE", "256")) if enabled else 0,
+            default_ttl=float(os.getenv("LENA_CACHE_TTL", "0")),
+            path_ttls=parse_path_ttls(os.getenv("LENA_CACHE_PATH_TTLS")),
+        )
+
+    def _relative_path(self, url: str) -> Optional[str]:
+        base_url = self.base_url or os.getenv("LENA_API_URL")
+        if self.maxsize <= 0 or not base_url or not url.startswith(base_url):
+            return None
+        base_path = urlsplit(base_url).path.rstrip("/")
+        path = urlsplit(url).path
+        return "/" + path[len(base_path):].lstrip("/")
+
+    @staticmethod
+    def _normalized_url(url: str) -> str:
+        """The URL without the API key, with sorted query parameters."""
+        parts = urlsplit(url)
+        query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != "key")
+        return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+    def _ttl(self, path: str, headers) -> Optional[float]:
+        """Seconds a response stays fresh, or None when it must not be stored."""
+        directives = _cache_control(headers)
+        if "no-store" in directives or headers.get("vary", "").strip() == "*":
+            return None
+        prefixes = [p for p in self.path_ttls if path.startswith(p)]
+        if prefixes:
+            return self.path_ttls[max(prefixes, key=len)]
+        if "no-cache" in directives:
+            return 0.0
+        for name in ("s-maxage", "max-age"):
+            if directives.get(name, "").isdigit():
+                return float(directives[name])
+        if headers.get("expires"):
+            try:
+                expires = email.utils.parsedate_to_datetime(headers["expires"]).timestamp()
+                date = headers.get("date")
+                now = email.utils.parsedate_to_datetime(date).timestamp() if date else time.time()
+                return max(0.0, expires - now)
+            except (TypeError, ValueError):
+                return 0.0
+        return self.default_ttl
+
+    def lookup(self, method: str, url: str, headers: Optional[dict], body: Optional[dict]) -> CacheLookup:
+        """Finds a stored response for a request (call `update` with the answer)."""
+        method = method.upper()
+        if method not in SAFE_METHODS or body or self._relative_path(url) is None:
+            return CacheLookup(None)
+        key = cache_key(
+            method, self._normalized_url(url), sorted((k.lower(), v) for k, v in (headers or {}).items())
+        )
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return CacheLookup(key)
+            self._entries.move_to_end(key)
+            if entry.expires_at > time.monotonic():
+                self.hits += 1
+                return CacheLookup(key, entry.response)
+            validators = {}
+            if entry.etag:
+                validators["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                validators["If-Modified-Since"] = entry.last_modified
+            if not validators:
+                del self._entries[key]
+                self.misses += 1
+            return CacheLookup(key, None, validators)
+
+    def update(self, method: str, url: str, lookup: CacheLookup, response: BoundedResponse) -> BoundedResponse:
+        """
+        Stores or revalidates with the server's answer; returns the response to use.
+
+        Returns None when a revalidation got a 304 but the stored response was
+        evicted in the meantime: the request must be sent again without the
+        validators. Unsafe methods invalidate the cached responses of their path.
+        """
+        path = self._relative_path(url)
+        if path is None:
+            return response
+        if method.upper() not in SAFE_METHODS:
+            if response.status_code < 400:
+                self.invalidate(path)
+            return response
+        if lookup.key is None:
+            return response
+
+        with self._lock:
+            entry = self._entries.get(lookup.key)
+            if response.status_code == 304 and entry is not None:
+                # Not modified: serve the stored body, fresh again (by the
+                # 304's caching headers, else by the stored ones)
+                fresh_headers = response.headers
+                if "cache-control" not in fresh_headers and "expires" not in fresh_headers:
+                    fresh_headers = entry.response.headers
+                ttl = self._ttl(path, fresh_headers)
+                entry.expires_at = time.monotonic() + (ttl or 0.0)
+                self.revalidated += 1
+                return entry.response
+            if response.status_code == 304 and lookup.headers:
+                # Our validators, but the body they refer to is gone
+                return None
+            if lookup.headers:
+                # Revalidation failed: the stored body changed
+                self.misses += 1
+            if response.status_code != 200 or response.truncated:
+                self._entries.pop(lookup.key, None)
+                return response
+            ttl = self._ttl(path, response.headers)
+            stored = _Entry(path, response, time.monotonic() + (ttl or 0.0))
+            if ttl is None or (ttl <= 0 and not (stored.etag or stored.last_modified)):
+                self._entries.pop(lookup.key, None)
+                return response
+            self._entries[lookup.key] = stored
+            self._entries.move_to_end(lookup.key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return response
+
+    def invalidate(self, path: str):
+        """Drops the stored responses of a path (any query string)."""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry.path == path]
+            for key in stale:
+                del self._entries[key]
+            self.invalidated += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.revalidated + self.misses
+            return {
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.revalidated) / total if total else 0.0,
+                "invalidated": self.invalidated,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "default_ttl": self.default_ttl,
+                "path_ttls": self.path_ttls,
+            }
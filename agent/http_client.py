@@ -0,0 +1,275 @@
+"""
+Shared, pooled HTTP clients for the agent's tools.
+
+Connections are kept alive across tool calls, so repeated LENA REST calls
+reuse their TCP/TLS connection instead of handshaking every time. Async
+callers get one `httpx.AsyncClient` per event loop (httpx clients cannot be
+shared between loops); sync callers share one `httpx.Client`. Limits,
+keep-alive, HTTP/2 and per-host timeouts are configurable, and `stats()`
+reports how many requests went out on an already open connection. `fetch`
+streams a body and stops reading at a byte cap.
+"""
+import asyncio
+import importlib.util
+import os
+import threading
+import weakref
+from typing import AsyncIterator, Dict, Iterator, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+# Trace events httpcore emits only when it opens a new connection
+_CONNECT_EVENTS = ("connection.connect_tcp.", "connection.connect_unix_socket.")
+
+
+class BoundedResponse(NamedTuple):
+    """A response whose body was read up to a byte cap."""
+    status_code: int
+    headers: httpx.Headers
+    content: bytes
+    truncated: bool
+    encoding: str = "utf-8"
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors="replace")
+
+    @property
+    def declared_length(self) -> Optional[int]:
+        """Content-Length of the full body, when the server sent one."""
+        value = self.headers.get("content-length")
+        return int(value) if value and value.isdigit() else None
+
+
+def _take(chunks: Iterator[bytes], max_bytes: int) -> Tuple[bytes, bool]:
+    body = bytearray()
+    for chunk in chunks:
+        body.extend(chunk)
+        if len(body) > max_bytes:
+            return bytes(body[:max_bytes]), True
+    return bytes(body), False
+
+
+async def _atake(chunks: AsyncIterator[bytes], max_bytes: int) -> Tuple[bytes, bool]:
+    body = bytearray()
+    async for chunk in chunks:
+        body.extend(chunk)
+        if len(body) > max_bytes:
+            return bytes(body[:max_bytes]), True
+    return bytes(body), False
+
+
+def parse_host_timeouts(value: Optional[str]) -> Dict[str, float]:
+    """Parses "host=seconds,host=seconds" into a {host: seconds} dict."""
+    timeouts = {}
+    for item in (value or "").split(","):
+        if "=" in item:
+            host, seconds = item.split("=", 1)
+            timeouts[host.strip().lower()] = float(seconds)
+    return timeouts
+
+
+class HTTPClientManager:
+    """
+    Owns the pooled HTTP clients and their connection-reuse counters.
+
+    Args:
+        max_connections: Open connections allowed per client.
+        max_keepalive: Idle connections kept open per client.
+        keepalive_expiry: Seconds an idle connection is kept.
+        timeout: Default request timeout in seconds.
+        host_timeouts: Timeout overrides by host name.
+        http2: Negotiate HTTP/2 where the server supports it (needs `h2`).
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 10.0,
+        host_timeouts: Optional[Dict[str, float]] = None,
+        http2: bool = False,
+    ):
+        if http2 and importlib.util.find_spec("h2") is None:
+            print("[HTTP] h2 is not installed (pip install httpx[http2]), using HTTP/1.1")
+            http2 = False
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout
+        self.host_timeouts = host_timeouts or {}
+        self.http2 = http2
+        self._client: Optional[httpx.Client] = None
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._new_connections = 0
+        self._errors = 0
+        self._hosts: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_env(cls) -> "HTTPClientManager":
+        """
+        Configured from HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE,
+        HTTP_KEEPALIVE_EXPIRY, HTTP_TIMEOUT, HTTP_HOST_TIMEOUTS and HTTP_HTTP2.
+        """
+        return cls(
+            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive=int(os.getenv("HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30")),
+            timeout=float(os.getenv("HTTP_TIMEOUT", "10")),
+            host_timeouts=parse_host_timeouts(os.getenv("HTTP_HOST_TIMEOUTS")),
+            http2=os.getenv("HTTP_HTTP2", "false").lower() == "true",
+        )
+
+    def timeout_for(self, url: str) -> float:
+        host = (urlsplit(url).hostname or "").lower()
+        return self.host_timeouts.get(host, self.timeout)
+
+    # Clients
+
+    @property
+    def client(self) -> httpx.Client:
+        """The shared client for sync callers."""
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(limits=self.limits, http2=self.http2, timeout=self.timeout)
+            return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """The shared client of the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(limits=self.limits, http2=self.http2, timeout=self.timeout)
+                self._async_clients[loop] = client
+            return client
+
+    # Requests
+
+    def _tracer(self):
+        opened = []
+
+        def trace(event: str, info: dict):
+            if event.startswith(_CONNECT_EVENTS) and event.endswith(".started"):
+                opened.append(True)
+
+        return opened, trace
+
+    def _record(self, url: str, new_connection: bool, failed: bool = False):
+        host = (urlsplit(url).hostname or "").lower()
+        with self._lock:
+            counters = self._hosts.setdefault(host, {"requests": 0, "new_connections": 0})
+            counters["requests"] += 1
+            self._requests += 1
+            if new_connection:
+                counters["new_connections"] += 1
+                self._new_connections += 1
+            if failed:
+                self._errors += 1
+
+    def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Sends a request on the shared sync client."""
+        opened, trace = self._tracer()
+        kwargs.setdefault("timeout", self.timeout_for(url))
+        try:
+            response = self.client.request(method, url, extensions={"trace": trace}, **kwargs)
+        except Exception:
+            self._record(url, bool(opened), failed=True)
+            raise
+        self._record(url, bool(opened))
+        return response
+
+    async def arequest(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Sends a request on the running loop's shared async client."""
+        opened, trace = self._tracer()
+
+        async def atrace(event: str, info: dict):
+            trace(event, info)
+
+        kwargs.setdefault("timeout", self.timeout_for(url))
+        try:
+            response = await self.async_client.request(method, url, extensions={"trace": atrace}, **kwargs)
+        except Exception:
+            self._record(url, bool(opened), failed=True)
+            raise
+        self._record(url, bool(opened))
+        return response
+
+    def fetch(self, method: str, url: str, max_bytes: int, **kwargs) -> BoundedResponse:
+        """
+        Streams a response on the shared sync client, reading at most max_bytes.
+
+        The rest of a larger body is never downloaded.
+        """
+        opened, trace = self._tracer()
+        kwargs.setdefault("timeout", self.timeout_for(url))
+        try:
+            with self.client.stream(method, url, extensions={"trace": trace}, **kwargs) as response:
+                content, truncated = _take(response.iter_bytes(), max_bytes)
+                fetched = BoundedResponse(
+                    response.status_code, response.headers, content, truncated, response.encoding or "utf-8"
+                )
+        except Exception:
+            self._record(url, bool(opened), failed=True)
+            raise
+        self._record(url, bool(opened))
+        return fetched
+
+    async def afetch(self, method: str, url: str, max_bytes: int, **kwargs) -> BoundedResponse:
+        """Async variant of `fetch` on the running loop's shared client."""
+        opened, trace = self._tracer()
+
+        async def atrace(event: str, info: dict):
+            trace(event, info)
+
+        kwargs.setdefault("timeout", self.timeout_for(url))
+        try:
+            async with self.async_client.stream(method, url, extensions={"trace": atrace}, **kwargs) as response:
+                content, truncated = await _atake(response.aiter_bytes(), max_bytes)
+                fetched = BoundedResponse(
+                    response.status_code, response.headers, content, truncated, response.encoding or "utf-8"
+                )
+        except Exception:
+            self._record(url, bool(opened), failed=True)
+            raise
+        self._record(url, bool(opened))
+        return fetched
+
+    # Lifecycle
+
+    def close(self):
+        """Closes the sync client; async clients are closed by `aclose`."""
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    async def aclose(self):
+        """Closes the running loop's async client and the sync client."""
+        with self._lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+        self.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            reused = self._requests - self._new_connections
+            return {
+                "requests": self._requests,
+                "new_connections": self._new_connections,
+                "reused_connections": reused,
+                "reuse_rate": reused / self._requests if self._requests else 0.0,
+                "errors": self._errors,
+                "http2": self.http2,
+                "hosts": {host: dict(counters) for host, counters in self._hosts.items()},
+            }
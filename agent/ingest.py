@@ -0,0 +1,373 @@
+"""
+Document ingestion helpers for the RAG index.
+
+Discovers files under the docs directory, loads and splits them into chunks
+with stable content-addressed ids and product/version tags, and tracks what
+has been indexed in a manifest stored next to the vector store so that only
+changed files need to be re-processed.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from langchain_core.documents import Document
+from langchain_community.document_loaders import TextLoader, PyPDFLoader, UnstructuredMarkdownLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+MANIFEST_FILE = "manifest.json"
+CHUNK_STORE_FILE = "chunks.json"
+MANIFEST_VERSION = 2
+
+# Product of files placed directly in the docs directory
+DEFAULT_PRODUCT = "general"
+# Directory names taken as a version: "v2", "1.3", "2.0.1"
+VERSION_DIR_PATTERN = re.compile(r"^v?\d+(\.\d+)*$", re.IGNORECASE)
+# Front matter is only looked for in text formats, within this many lines
+FRONT_MATTER_EXTENSIONS = (".md", ".txt")
+FRONT_MATTER_MAX_LINES = 50
+
+# Loader used for each supported extension
+LOADERS = {
+    ".txt": TextLoader,
+    ".md": UnstructuredMarkdownLoader,
+    ".pdf": PyPDFLoader,
+}
+
+
+def discover_files(docs_dir: str) -> List[str]:
+    """Returns the supported files under docs_dir, sorted for a stable order."""
+    found = []
+    for root, _dirs, files in os.walk(docs_dir):
+        for name in files:
+            if os.path.splitext(name)[1].lower() in LOADERS:
+                found.append(os.path.join(root, name))
+    return sorted(found)
+
+
+def read_front_matter(path: str) -> Dict[str, str]:
+    """Returns the `key: value` pairs of a leading `---` block, if the file has one."""
+    if os.path.splitext(path)[1].lower() not in FRONT_MATTER_EXTENSIONS:
+        return {}
+    values = {}
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            if f.readline().strip() != "---":
+                return {}
+            for _ in range(FRONT_MATTER_MAX_LINES):
+                line = f.readline()
+                if not line or line.strip() == "---":
+                    break
+                key, sep, value = line.partition(":")
+                if sep:
+                    values[key.strip().lower()] = value.strip().strip("\"'")
+    except OSError:
+        return {}
+    return values
+
+
+def file_tags(path: str, docs_dir: str) -> Dict[str, str]:
+    """
+    Returns the product/version metadata of a file.
+
+    The product is the first directory under docs_dir (DEFAULT_PRODUCT for
+    files at the top level) and the version the first deeper directory that
+    looks like one, e.g. docs/tomcat/9.0/connectors.md. `product:` and
+    `version:` front matter entries take precedence over the layout.
+    """
+    rel_dir = os.path.relpath(os.path.dirname(path), docs_dir)
+    parts = [] if rel_dir == os.curdir else rel_dir.split(os.sep)
+    front = read_front_matter(path)
+    product = front.get("product") or (parts[0] if parts else DEFAULT_PRODUCT)
+    tags = {"product": product.lower()}
+    version = front.get("version") or next((p for p in parts[1:] if VERSION_DIR_PATTERN.match(p)), None)
+    if version:
+        tags["version"] = version
+    return tags
+
+
+def file_sha256(path: str) -> str:
+    """Returns the SHA-256 hex digest of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(source: str, content: str, occurrence: int = 0) -> str:
+    """
+    Returns a stable id for a chunk.
+
+    The id depends only on the source path and the chunk text, so an unchanged
+    chunk keeps its id (and its embedding) when other parts of the file change.
+    `occurrence` disambiguates identical chunks within the same file.
+    """
+    digest = hashlib.sha256(f"{source}\x00{content}".encode("utf-8")).hexdigest()[:32]
+    return digest if occurrence == 0 else f"{digest}-{occurrence}"
+
+
+def load_file(path: str) -> List[Document]:
+    """Loads a single file with the loader registered for its extension."""
+    return list(lazy_load_file(path))
+
+
+def lazy_load_file(path: str) -> Iterator[Document]:
+    """Loads a single file lazily; PDFs are yielded one page at a time."""
+    loader_cls = LOADERS[os.path.splitext(path)[1].lower()]
+    return loader_cls(path).lazy_load()
+
+
+def iter_file_chunks(
+    path: str,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    tags: Optional[Dict[str, str]] = None,
+) -> Iterator[Document]:
+    """
+    Loads and splits a single file incrementally.
+
+    Each loaded document (PDF page) is split as soon as it is read, so only
+    one page and its chunks are held at a time. Every chunk gets a `chunk_id`
+    metadata entry (see `chunk_id`), the `start_index` of its text within
+    the loaded document (or PDF page) and the given tags (see `file_tags`).
+    """
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True
+    )
+    seen: Dict[str, int] = {}
+    for page in lazy_load_file(path):
+        for doc in text_splitter.split_documents([page]):
+            base = chunk_id(path, doc.page_content)
+            occurrence = seen.get(base, 0)
+            seen[base] = occurrence + 1
+            doc.metadata["chunk_id"] = chunk_id(path, doc.page_content, occurrence)
+            doc.metadata.update(tags or {})
+            yield doc
+
+
+def split_file(
+    path: str,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    tags: Optional[Dict[str, str]] = None,
+) -> List[Document]:
+    """Loads and splits a single file into chunks (see `iter_file_chunks`)."""
+    return list(iter_file_chunks(path, chunk_size, chunk_overlap, tags))
+
+
+def stream_min_bytes() -> int:
+    """
+    Size from which a file is streamed instead of parsed in the process pool.
+
+    Read from RAG_STREAM_MIN_MB (default: 8). Streamed files are split page
+    by page in the indexing process and flushed in fixed-size batches, so
+    memory stays bounded however large the file is.
+    """
+    return int(float(os.getenv("RAG_STREAM_MIN_MB", "8")) * 1024 * 1024)
+
+
+class ParsedFile(NamedTuple):
+    """Outcome of loading and splitting one file."""
+    path: str
+    chunks: List[Document]
+    seconds: float
+    error: Optional[str] = None
+
+
+def _parse_file(path: str, chunk_size: int, chunk_overlap: int, tags: Optional[Dict[str, str]]) -> ParsedFile:
+    start = time.perf_counter()
+    try:
+        chunks = split_file(path, chunk_size, chunk_overlap, tags)
+    except Exception as e:
+        return ParsedFile(path, [], time.perf_counter() - start, f"{type(e).__name__}: {e}")
+    return ParsedFile(path, chunks, time.perf_counter() - start)
+
+
+def ingest_workers() -> int:
+    """Number of parser processes, from RAG_INGEST_WORKERS (default: CPU count)."""
+    value = os.getenv("RAG_INGEST_WORKERS")
+    return max(1, int(value)) if value else (os.cpu_count() or 1)
+
+
+def parse_files(
+    paths: Iterable[str],
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    max_workers: Optional[int] = None,
+    tags: Optional[Dict[str, Dict[str, str]]] = None,
+) -> Iterator[ParsedFile]:
+    """
+    Loads and splits files across a process pool.
+
+    Results are yielded as soon as each file finishes, in completion order.
+    A file that fails to parse yields a ParsedFile with `error` set instead
+    of aborting the whole load.
+
+    Args:
+        paths: Files to parse.
+        chunk_size: Splitter chunk size.
+        chunk_overlap: Splitter chunk overlap.
+        max_workers: Pool size. Defaults to `ingest_workers()`; 1 parses inline.
+        tags: Metadata added to the chunks of each file, keyed by path.
+    """
+    paths = list(paths)
+    tags = tags or {}
+    max_workers = min(max_workers or ingest_workers(), len(paths))
+    if max_workers <= 1:
+        for path in paths:
+            yield _parse_file(path, chunk_size, chunk_overlap, tags.get(path))
+        return
+
+    # Reindexing runs on a background thread of a multi-threaded server, so
+    # workers are spawned rather than forked (a fork copies held locks)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+        futures = {pool.submit(_parse_file, path, chunk_size, chunk_overlap, tags.get(path)): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # The worker itself died (e.g. BrokenProcessPool)
+                yield ParsedFile(futures[future], [], 0.0, f"{type(e).__name__}: {e}")
+
+
+class IndexManifest:
+    """
+    Per-file record of what is currently in the index.
+
+    Stored as JSON next to the vector store. Each file entry keeps the file's
+    size, mtime and content hash plus the ids of the chunks it produced, so a
+    sync can tell which files changed and which chunk ids to add or delete.
+    """
+
+    def __init__(self, settings: Optional[dict] = None, files: Optional[Dict[str, dict]] = None):
+        self.settings = settings or {}
+        self.files = files or {}
+
+    @classmethod
+    def load(cls, persist_directory: str) -> Optional["IndexManifest"]:
+        """Loads the manifest, or returns None if it is missing or unreadable."""
+        path = os.path.join(persist_directory, MANIFEST_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != MANIFEST_VERSION:
+            return None
+        return cls(settings=data.get("settings", {}), files=data.get("files", {}))
+
+    def save(self, persist_directory: str):
+        """Writes the manifest atomically."""
+        os.makedirs(persist_directory, exist_ok=True)
+        path = os.path.join(persist_directory, MANIFEST_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "settings": self.settings, "files": self.files}, f, indent=1)
+        os.replace(tmp_path, path)
+
+    def chunk_ids(self) -> List[str]:
+        """Returns the ids of every chunk recorded in the manifest."""
+        return [cid for entry in self.files.values() for cid in entry.get("chunks", [])]
+
+    def changed_sha(self, path: str) -> Optional[str]:
+        """
+        Returns the file's current content hash if it differs from its
+        manifest entry, or None if the file is unchanged.
+
+        The hash is computed only when size or mtime differ.
+        """
+        entry = self.files.get(path)
+        stat = os.stat(path)
+        if entry and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+            return None
+        sha = file_sha256(path)
+        if entry and entry.get("sha256") == sha:
+            # Touched but not modified; just refresh the stat fields
+            entry["size"] = stat.st_size
+            entry["mtime"] = stat.st_mtime
+            return None
+        return sha
+
+    def record(self, path: str, sha: str, chunk_ids: List[str], tags: Optional[Dict[str, str]] = None):
+        """Records a file's current hash, stat info, tags and chunk ids."""
+        stat = os.stat(path)
+        self.files[path] = {
+            "sha256": sha,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "tags": tags or {},
+            "chunks": chunk_ids,
+        }
+
+    def products(self) -> List[str]:
+        """Returns the products (shards) present in the index."""
+        return sorted({entry.get("tags", {}).get("product", DEFAULT_PRODUCT) for entry in self.files.values()})
+
+    def fingerprint(self) -> str:
+        """Returns a hash of the indexed chunk ids and tags, identifying this index state."""
+        digest = hashlib.sha256()
+        for cid in sorted(self.chunk_ids()):
+            digest.update(cid.encode("utf-8"))
+        for path in sorted(self.files):
+            digest.update(json.dumps(self.files[path].get("tags", {}), sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+
+class ChunkStore:
+    """
+    On-disk store of the indexed chunks (text and metadata), keyed by chunk id.
+
+    Kept next to the vector store so keyword indexes can be rebuilt from it
+    without re-loading and re-splitting the source documents.
+    """
+
+    def __init__(self, persist_directory: str, chunks: Optional[Dict[str, dict]] = None):
+        self.persist_directory = persist_directory
+        self.chunks = chunks if chunks is not None else {}
+
+    @classmethod
+    def load(cls, persist_directory: str) -> "ChunkStore":
+        """Loads the store, or returns an empty one if it is missing or unreadable."""
+        try:
+            with open(os.path.join(persist_directory, CHUNK_STORE_FILE), "r", encoding="utf-8") as f:
+                chunks = json.load(f)
+        except (OSError, ValueError):
+            chunks = {}
+        return cls(persist_directory, chunks)
+
+    def save(self):
+        """Writes the store atomically."""
+        os.makedirs(self.persist_directory, exist_ok=True)
+        path = os.path.join(self.persist_directory, CHUNK_STORE_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.chunks, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def add(self, docs: List[Document]):
+        for doc in docs:
+            self.chunks[doc.metadata["chunk_id"]] = {"page_content": doc.page_content, "metadata": doc.metadata}
+
+    def delete(self, ids: List[str]):
+        for cid in ids:
+            self.chunks.pop(cid, None)
+
+    def get(self, chunk_id: str) -> Optional[Document]:
+        """Returns a stored chunk as a Document, or None."""
+        chunk = self.chunks.get(chunk_id)
+        if chunk is None:
+            return None
+        return Document(page_content=chunk["page_content"], metadata=chunk["metadata"])
+
+    def documents(self) -> List[Document]:
+        """Returns the stored chunks as Documents, in a stable order."""
+        return [
+            Document(page_content=self.chunks[cid]["page_content"], metadata=self.chunks[cid]["metadata"])
+            for cid in sorted(self.chunks)
+        ]
@@ -0,0 +1,260 @@
+"""
+Supervised pool of long-lived MCP client sessions over stdio.
+
+Each slot of the pool owns one server subprocess and its `ClientSession`,
+started once and kept open. The sessions live on a private event loop thread,
+so both sync tools (worker threads) and async tools (any event loop) can use
+them. Calls are multiplexed: a session carries several requests at once and
+each call goes to the least busy live session. A supervisor task per slot
+restarts the subprocess with exponential backoff when it crashes or stops
+answering pings. Tool discovery runs once and is cached for the pool.
+"""
+import asyncio
+import atexit
+import concurrent.futures
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+
+class _Slot:
+    def __init__(self, index: int):
+        self.index = index
+        self.session: Optional[ClientSession] = None
+        self.broken: Optional[asyncio.Event] = None
+        self.inflight = 0
+        self.restarts = 0
+
+
+class MCPSessionPool:
+    """
+    Long-lived MCP sessions to one stdio server.
+
+    Args:
+        server_params: Command that starts the MCP server.
+        size: Number of server processes (sessions).
+        name: Prefix of the log lines.
+        startup_timeout: Seconds allowed for a server to initialize.
+        health_interval: Seconds between pings of an idle session.
+        restart_delay: First delay before restarting a failed session;
+            doubles on each consecutive failure up to max_restart_delay.
+        max_restart_delay: Longest delay between restarts.
+    """
+
+    def __init__(
+        self,
+        server_params: StdioServerParameters,
+        size: int = 2,
+        name: str = "MCP",
+        startup_timeout: float = 60.0,
+        health_interval: float = 30.0,
+        restart_delay: float = 1.0,
+        max_restart_delay: float = 30.0,
+    ):
+        self.server_params = server_params
+        self.size = max(1, size)
+        self.name = name
+        self.startup_timeout = startup_timeout
+        self.health_interval = health_interval
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.calls = 0
+        self._tools = None
+        self._slots: List[_Slot] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._ready: Optional[asyncio.Event] = None
+        self._discovery: Optional[asyncio.Lock] = None
+        self._lock = threading.Lock()
+
+    # Lifecycle
+
+    def start(self) -> "MCPSessionPool":
+        """Starts the sessions in the background (idempotent); returns self."""
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self._loop = asyncio.new_event_loop()
+            started = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(self._loop)
+                self._loop.run_until_complete(self._main(started))
+                self._loop.close()
+
+            self._thread = threading.Thread(target=run, name=f"{self.name.lower()}-pool", daemon=True)
+            self._thread.start()
+            started.wait()
+            atexit.register(self.stop)
+        return self
+
+    def stop(self, timeout: float = 10.0):
+        """Closes every session and terminates the server processes."""
+        with self._lock:
+            if self._thread is None:
+                return
+            self._loop.call_soon_threadsafe(self._stopping.set)
+            self._thread.join(timeout)
+            self._thread = None
+            self._loop = None
+            print(f"[{self.name}] Session pool stopped")
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    async def _main(self, started: threading.Event):
+        self._stopping = asyncio.Event()
+        self._ready = asyncio.Event()
+        self._discovery = asyncio.Lock()
+        self._slots = [_Slot(i) for i in range(self.size)]
+        started.set()
+        await asyncio.gather(*(self._supervise(slot) for slot in self._slots))
+
+    # Supervision
+
+    def _update_ready(self):
+        if any(slot.session is not None and not slot.broken.is_set() for slot in self._slots):
+            self._ready.set()
+        else:
+            self._ready.clear()
+
+    async def _supervise(self, slot: _Slot):
+        delay = self.restart_delay
+        while not self._stopping.is_set():
+            slot.broken = asyncio.Event()
+            try:
+                async with stdio_client(self.server_params) as (read, write):
+                    async with ClientSession(read, write) as session:
+                        await asyncio.wait_for(session.initialize(), self.startup_timeout)
+                        async with self._discovery:
+                            if self._tools is None:
+                                self._tools = (await session.list_tools()).tools
+                        slot.session = session
+                        self._update_ready()
+                        print(f"[{self.name}] Session {slot.index} ready")
+                        delay = self.restart_delay
+                        await self._watch(slot, session)
+            except Exception as e:
+                if not self._stopping.is_set():
+                    print(f"[{self.name}] Session {slot.index} failed: {e}")
+            finally:
+                slot.session = None
+                self._update_ready()
+            if self._stopping.is_set():
+                break
+            slot.restarts += 1
+            print(f"[{self.name}] Restarting session {slot.index} in {delay:.1f}s")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, self.max_restart_delay)
+
+    async def _watch(self, slot: _Slot, session: ClientSession):
+        """Returns when the pool stops or the session has to be restarted."""
+        while True:
+            stopping = asyncio.ensure_future(self._stopping.wait())
+            broken = asyncio.ensure_future(slot.broken.wait())
+            done, pending = await asyncio.wait(
+                {stopping, broken}, timeout=self.health_interval, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in pending:
+                task.cancel()
+            if done:
+                return
+            if not await self._healthy(session):
+                print(f"[{self.name}] Session {slot.index} stopped answering")
+                return
+
+    @staticmethod
+    async def _healthy(session: ClientSession, timeout: float = 10.0) -> bool:
+        try:
+            await asyncio.wait_for(session.send_ping(), timeout)
+            return True
+        except Exception:
+            return False
+
+    # Calls
+
+    async def _acquire(self, deadline: float) -> _Slot:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"No {self.name} session became available")
+            try:
+                await asyncio.wait_for(self._ready.wait(), remaining)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"No {self.name} session became available") from None
+            live = [s for s in self._slots if s.session is not None and not s.broken.is_set()]
+            if live:
+                return min(live, key=lambda s: s.inflight)
+
+    async def _call(self, name: str, arguments: Dict[str, Any], timeout: float):
+        deadline = time.monotonic() + timeout
+        for attempt in range(2):
+            slot = await self._acquire(deadline)
+            session = slot.session
+            slot.inflight += 1
+            try:
+                result = await asyncio.wait_for(
+                    session.call_tool(name, arguments), max(0.0, deadline - time.monotonic())
+                )
+                self.calls += 1
+                return result
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"{self.name} call to {name} timed out after {timeout:.0f}s") from None
+            except Exception:
+                if attempt or await self._healthy(session):
+                    # A tool or server error, not a dead transport
+                    raise
+                # The process died under the call: restart it and retry on another session
+                slot.broken.set()
+                self._update_ready()
+            finally:
+                slot.inflight -= 1
+
+    async def _list_tools(self, timeout: float):
+        await self._acquire(time.monotonic() + timeout)
+        return self._tools
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """Runs a coroutine on the pool's event loop (starting the pool if needed)."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None, timeout: float = 60.0):
+        """
+        Calls a tool from a synchronous caller (not from the pool's own loop).
+
+        Raises:
+            TimeoutError: If no session is available or the call does not
+                finish within timeout seconds.
+        """
+        return self.submit(self._call(name, arguments or {}, timeout)).result()
+
+    async def acall_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None, timeout: float = 60.0):
+        """Calls a tool from any event loop; cancelling the caller cancels the call."""
+        return await asyncio.wrap_future(self.submit(self._call(name, arguments or {}, timeout)))
+
+    def list_tools(self, timeout: float = 60.0) -> list:
+        """Returns the server's tools, discovered once per pool."""
+        return self.submit(self._list_tools(timeout)).result()
+
+    async def alist_tools(self, timeout: float = 60.0) -> list:
+        return await asyncio.wrap_future(self.submit(self._list_tools(timeout)))
+
+    def stats(self) -> dict:
+        slots = list(self._slots)
+        return {
+            "running": self.running,
+            "size": self.size,
+            "ready": sum(1 for s in slots if s.session is not None),
+            "inflight": sum(s.inflight for s in slots),
+            "restarts": sum(s.restarts for s in slots),
+            "calls": self.calls,
+        }
@@ -0,0 +1,194 @@
+"""
+Compact views of JSON tool responses.
+
+`project` narrows a JSON document before it enters the message history: a
+JSONPath-like selector, a page of a list (offset/limit) and a subset of
+fields. `render` serializes the result within a character budget, cutting
+lists at item boundaries, and `summarize` describes what was left out so the
+agent can ask for a narrower view instead of reading the whole body.
+
+Selector syntax (a JSONPath subset):
+
+    $.data.apps            keys
+    apps[0], apps[-1]      list indexes
+    apps[*].name           every item
+    apps[?(@.status=='RUNNING')]   filter by ==, !=, >, <, >=, <= (or [?(@.key)])
+"""
+import json
+import re
+from typing import Any, List, Optional, Sequence, Tuple
+
+_SEGMENT = re.compile(
+    r"\.?(?P<key>[^.\[\]]+)"
+    r"|\[(?P<index>\*|-?\d+)\]"
+    r"|\[\?\(?@\.(?P<field>[^=!<>\s)]+)\s*(?:(?P<op>==|!=|>=|<=|>|<)\s*(?P<value>[^)\]]+?))?\s*\)?\]"
+    r"|\[['\"](?P<quoted>[^'\"]+)['\"]\]"
+)
+_OPS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    ">": lambda a, b: a > b,
+    "<": lambda a, b: a < b,
+    ">=": lambda a, b: a >= b,
+    "<=": lambda a, b: a <= b,
+}
+_MISSING = object()
+
+
+def _literal(text: str) -> Any:
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "'\"":
+        return text[1:-1]
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _get(node: Any, dotted: str) -> Any:
+    for key in dotted.split("."):
+        if isinstance(node, dict) and key in node:
+            node = node[key]
+        elif isinstance(node, list) and re.fullmatch(r"-?\d+", key) and -len(node) <= int(key) < len(node):
+            node = node[int(key)]
+        else:
+            return _MISSING
+    return node
+
+
+def _matches(item: Any, field: str, op: Optional[str], value: Any) -> bool:
+    actual = _get(item, field)
+    if actual is _MISSING:
+        return False
+    if op is None:
+        return True
+    try:
+        return _OPS[op](actual, value)
+    except TypeError:
+        return False
+
+
+def select(data: Any, path: str) -> Any:
+    """
+    Applies a JSONPath-like selector (see the module docstring).
+
+    Raises:
+        ValueError: If the selector does not parse.
+    """
+    path = path.strip()
+    if path.startswith("$"):
+        path = path[1:]
+    nodes, multiple, position = [data], False, 0
+    while position < len(path):
+        match = _SEGMENT.match(path, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Invalid selector at {path[position:]!r}")
+        position = match.end()
+        key = match.group("key") or match.group("quoted")
+        index, field = match.group("index"), match.group("field")
+        selected = []
+        for node in nodes:
+            if key is not None:
+                if isinstance(node, dict) and key in node:
+                    selected.append(node[key])
+            elif index == "*":
+                selected.extend(node if isinstance(node, list) else node.values() if isinstance(node, dict) else [])
+                multiple = True
+            elif index is not None:
+                if isinstance(node, list) and -len(node) <= int(index) < len(node):
+                    selected.append(node[int(index)])
+            else:
+                value = _literal(match.group("value")) if match.group("op") else None
+                items = node if isinstance(node, list) else [node]
+                selected.extend(item for item in items if _matches(item, field, match.group("op"), value))
+                multiple = True
+        nodes = selected
+    if multiple:
+        return nodes
+    return nodes[0] if nodes else None
+
+
+def _pick(item: Any, fields: Sequence[str]) -> Any:
+    if not isinstance(item, dict):
+        return item
+    picked = {}
+    for field in fields:
+        value = _get(item, field)
+        if value is not _MISSING:
+            picked[field] = value
+    return picked
+
+
+def project(
+    data: Any,
+    path: Optional[str] = None,
+    fields: Optional[Sequence[str]] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> Tuple[Any, List[str]]:
+    """
+    Narrows a JSON document; returns the result and notes on what was cut.
+
+    Args:
+        data: Parsed JSON.
+        path: JSONPath-like selector applied first.
+        fields: Keys (dotted for nested ones) kept from each object.
+        limit: Items kept from a list result.
+        offset: Items skipped from a list result.
+    """
+    notes = []
+    if path:
+        data = select(data, path)
+    if isinstance(data, list) and (limit is not None or offset):
+        total = len(data)
+        end = total if limit is None else offset + max(0, limit)
+        data = data[offset:end]
+        notes.append(f"Showing items {offset}-{offset + len(data)} of {total}.")
+    if fields:
+        data = [_pick(item, fields) for item in data] if isinstance(data, list) else _pick(data, fields)
+    return data, notes
+
+
+def dumps(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def summarize(data: Any) -> str:
+    """One-line description of a JSON value's shape."""
+    if isinstance(data, list):
+        keys = sorted({k for item in data[:50] if isinstance(item, dict) for k in item})
+        summary = f"JSON array of {len(data)} items"
+        return f"{summary}; item keys: {', '.join(keys)}" if keys else summary
+    if isinstance(data, dict):
+        parts = []
+        for key, value in data.items():
+            if isinstance(value, list):
+                parts.append(f"{key} (array of {len(value)})")
+            elif isinstance(value, dict):
+                parts.append(f"{key} (object)")
+            else:
+                parts.append(key)
+        return f"JSON object with keys: {', '.join(parts)}"
+    return f"JSON {type(data).__name__}"
+
+
+def render(data: Any, max_chars: int) -> Tuple[str, bool]:
+    """
+    Serializes compactly within max_chars; returns the text and whether it was cut.
+
+    Lists are cut at item boundaries, anything else at max_chars.
+    """
+    text = dumps(data)
+    if len(text) <= max_chars:
+        return text, False
+    if isinstance(data, list):
+        size, kept = 2, []
+        for item in data:
+            item_text = dumps(item)
+            if size + len(item_text) + 1 > max_chars:
+                break
+            kept.append(item_text)
+            size += len(item_text) + 1
+        if kept:
+            return "[" + ",".join(kept) + "]", True
+    return text[:max_chars], True
@@ -1,47 +1,152 @@
+import asyncio
 import os
-from typing import List, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional
 from langchain_core.documents import Document, BaseDocumentCompressor
 from langchain_core.retrievers import BaseRetriever
-from langchain_core.callbacks import CallbackManagerForRetrieverRun
-from langchain_community.document_loaders import DirectoryLoader, TextLoader, PyPDFLoader, UnstructuredMarkdownLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.embeddings import Embeddings
 from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.retrievers import BM25Retriever
-from langchain_community.document_compressors.flashrank_rerank import FlashrankRerank
+from .cache import TTLCache
+from .embeddings import default_embeddings
+from .ingest import (
+    DEFAULT_PRODUCT,
+    ChunkStore,
+    IndexManifest,
+    discover_files,
+    file_tags,
+    iter_file_chunks,
+    parse_files,
+    stream_min_bytes,
+)
+from .rerank import BatchedRerank, get_rerank_service
+from .sparse import SparseIndex, SparseRetriever, get_tokenizer, load_indexes, save_indexes
+from .vectorstore import FORMAT_VERSION as NUMPY_FORMAT_VERSION, NumpyVectorStore
 
-# Fallback implementations if imports fail
-try:
-    from langchain.retrievers import EnsembleRetriever
-except ImportError:
-    class EnsembleRetriever(BaseRetriever):
-        retrievers: List[BaseRetriever]
-        weights: List[float]
+class HybridRetriever(BaseRetriever):
+    """
+    Hybrid retriever that fuses several retrievers with Reciprocal Rank Fusion.
+
+    All retrievers are queried concurrently (threads on the sync path,
+    tasks on the async path) and each result list is folded into the RRF
+    scores as soon as it arrives, so a query costs the slowest retriever's
+    latency instead of the sum.
+    """
+    retrievers: List[BaseRetriever]
+    weights: List[float]
+    rrf_k: int = 60
+
+    @staticmethod
+    def _key(doc: Document) -> str:
+        # Chunk ids are unique per indexed chunk; fall back to content
+        return doc.metadata.get("chunk_id") or doc.page_content
+
+    def _fuse(self, scores: Dict[str, list], all_docs: Dict[str, Document], docs: List[Document], index: int):
+        # rrf_score = sum(weight * (1 / (rank + k)))
+        weight = self.weights[index]
+        for rank, doc in enumerate(docs):
+            key = self._key(doc)
+            if key not in all_docs:
+                all_docs[key] = doc
+                scores[key] = [0.0, (rank, index)]
+            scores[key][0] += weight * (1 / (rank + self.rrf_k))
+            scores[key][1] = min(scores[key][1], (rank, index))
+
+    @staticmethod
+    def _ranked(scores: Dict[str, list], all_docs: Dict[str, Document]) -> List[Document]:
+        # Ties are broken by best (rank, retriever) so the order does not
+        # depend on which retriever finished first
+        ranked = sorted(scores.items(), key=lambda x: (-x[1][0], x[1][1]))
+        return [all_docs[k] for k, _ in ranked]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun = None
+    ) -> List[Document]:
+        scores, all_docs = {}, {}
+        callbacks = run_manager.get_child() if run_manager else None
+        with ThreadPoolExecutor(max_workers=len(self.retrievers)) as pool:
+            futures = {
+                pool.submit(retriever.invoke, query, {"callbacks": callbacks}): index
+                for index, retriever in enumerate(self.retrievers)
+            }
+            for future in as_completed(futures):
+                self._fuse(scores, all_docs, future.result(), futures[future])
+        return self._ranked(scores, all_docs)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun = None
+    ) -> List[Document]:
+        scores, all_docs = {}, {}
+        callbacks = run_manager.get_child() if run_manager else None
+
+        async def run(index: int):
+            return await self.retrievers[index].ainvoke(query, {"callbacks": callbacks}), index
+
+        for next_done in asyncio.as_completed([run(i) for i in range(len(self.retrievers))]):
+            docs, index = await next_done
+            self._fuse(scores, all_docs, docs, index)
+        return self._ranked(scores, all_docs)
+
+
+def normalize_query(query: str) -> str:
+    """Normalizes a query for cache lookups (case and whitespace)."""
+    return " ".join(query.lower().split())
+
+
+# Shared by all retrievers so repeat queries are served across rebuilds of the
+# retriever object; entries are keyed by index version, so stale ones never hit
+retrieval_cache = TTLCache(
+    maxsize=int(os.getenv("RAG_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("RAG_CACHE_TTL", "600")),
+)
 
-        def _get_relevant_documents(
-            self, query: str, *, run_manager: CallbackManagerForRetrieverRun = None
-        ) -> List[Document]:
-            # Reciprocal Rank Fusion (RRF) Implementation
-            # rrf_score = sum(weight * (1 / (rank + k)))
-            rrf_k = 60
-            doc_scores = {}
-            all_docs = {}
-            
-            for i, retriever in enumerate(self.retrievers):
-                docs = retriever.invoke(query)
-                weight = self.weights[i]
-                for rank, doc in enumerate(docs):
-                    # Use content as key for deduplication
-                    key = doc.page_content
-                    if key not in all_docs:
-                        all_docs[key] = doc
-                        doc_scores[key] = 0.0
-                    doc_scores[key] += weight * (1 / (rank + rrf_k))
-            
-            # Sort by RRF score and return documents
-            sorted_docs = sorted(doc_scores.items(), key=lambda x: x[1], reverse=True)
-            return [all_docs[k] for k, v in sorted_docs]
 
+class CachedRetriever(BaseRetriever):
+    """
+    Serves repeat queries from a `TTLCache` instead of running the pipeline.
+
+    Entries are keyed by (index version, retriever configuration, normalized
+    query). A new index version (any sync that changes the index) therefore
+    invalidates every cached result automatically.
+    """
+    base_retriever: BaseRetriever
+    cache: TTLCache
+    index_version: str
+    config_key: str = ""
+
+    def _cache_key(self, query: str):
+        return (self.index_version, self.config_key, normalize_query(query))
+
+    @staticmethod
+    def _copy(docs: List[Document]) -> List[Document]:
+        return [doc.model_copy(deep=True) for doc in docs]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun = None
+    ) -> List[Document]:
+        key = self._cache_key(query)
+        docs = self.cache.get(key)
+        if docs is None:
+            docs = self.base_retriever.invoke(query, {"callbacks": run_manager.get_child() if run_manager else None})
+            self.cache.set(key, docs)
+        return self._copy(docs)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun = None
+    ) -> List[Document]:
+        key = self._cache_key(query)
+        docs = self.cache.get(key)
+        if docs is None:
+            docs = await self.base_retriever.ainvoke(
+                query, {"callbacks": run_manager.get_child() if run_manager else None}
+            )
+            self.cache.set(key, docs)
+        return self._copy(docs)
+
+
+# Fallback implementation if import fails
 try:
     from langchain.retrievers import ContextualCompressionRetriever
 except ImportError:
@@ -56,121 +161,581 @@ except ImportError:
             compressed_docs = self.base_compressor.compress_documents(docs, query)
             return list(compressed_docs)
 
-def get_retriever(docs_dir: str = "docs", enable_rerank: bool = False, force_rebuild: bool = False):
+        async def _aget_relevant_documents(
+            self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun = None
+        ) -> List[Document]:
+            docs = await self.base_retriever.ainvoke(query)
+            compressed_docs = await self.base_compressor.acompress_documents(docs, query)
+            return list(compressed_docs)
+
+PERSIST_DIRECTORY = "./chroma_db"
+NUMPY_INDEX_DIR = "numpy_index"
+BM25_DIR = "bm25"
+# Shard name of the keyword index over all products
+ALL_PRODUCTS = "*"
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# Chunks are embedded and written to the index in batches of this size
+INDEX_BATCH_SIZE = 256
+# Documents scored by the reranker, and documents kept after reranking
+RERANK_CANDIDATES = int(os.getenv("RAG_RERANK_CANDIDATES", "20"))
+RERANK_TOP_N = int(os.getenv("RAG_RERANK_TOP_N", "5"))
+
+
+def _ensure_docs_dir(docs_dir: str):
+    """Creates docs_dir with a placeholder document if it does not exist."""
+    if not os.path.exists(docs_dir):
+        os.makedirs(docs_dir)
+        with open(os.path.join(docs_dir, "readme.txt"), "w") as f:
+            f.write("This is a placeholder document for the RAG system.")
+
+
+def _embedding_model_name(embedding: Embeddings) -> str:
+    return getattr(embedding, "model", None) or type(embedding).__name__
+
+
+def _vector_settings(vector_backend: Optional[str]) -> dict:
+    backend = (vector_backend or os.getenv("RAG_VECTOR_BACKEND", "chroma")).lower()
+    if backend not in ("chroma", "numpy"):
+        raise ValueError(f"Unknown RAG_VECTOR_BACKEND {backend!r} (expected 'chroma' or 'numpy')")
+    settings = {"vector_backend": backend}
+    if backend == "numpy":
+        settings["vector_dtype"] = os.getenv("RAG_VECTOR_DTYPE", "float32")
+        settings["vector_format"] = NUMPY_FORMAT_VERSION
+    return settings
+
+
+def _open_vectorstore(settings: dict, persist_directory: str, embedding: Embeddings):
+    """Opens the vector store selected by RAG_VECTOR_BACKEND ("chroma" or "numpy")."""
+    if settings["vector_backend"] == "numpy":
+        return NumpyVectorStore(
+            os.path.join(persist_directory, NUMPY_INDEX_DIR), embedding, dtype=settings["vector_dtype"]
+        )
+    return Chroma(persist_directory=persist_directory, embedding_function=embedding)
+
+
+def sync_index(
+    docs_dir: str = "docs",
+    persist_directory: str = PERSIST_DIRECTORY,
+    embedding: Optional[Embeddings] = None,
+    force_rebuild: bool = False,
+    vector_backend: Optional[str] = None,
+):
     """
-    Initializes and returns a retriever from the documents in the specified directory.
+    Brings the vector database in line with the documents in docs_dir.
+
+    Only files whose content changed since the last sync are re-loaded and
+    re-split (in parallel, see `parse_files`; files of RAG_STREAM_MIN_MB and
+    more are streamed page by page instead), and only chunks that are not
+    already in the index are embedded, in batches of INDEX_BATCH_SIZE. A file that fails to parse is reported
+    in stats["failures"] and keeps its previously indexed chunks.
+    Chunks of removed files and stale chunks of changed files are deleted.
+
+    Args:
+        docs_dir: Directory containing documents.
+        persist_directory: Directory of the vector database and its manifest.
+        embedding: Embedding model. Defaults to cached OpenAIEmbeddings
+            (see `default_embeddings`).
+        force_rebuild: If True, drop the existing index and rebuild it.
+        vector_backend: "chroma" or "numpy". Defaults to RAG_VECTOR_BACKEND.
+
+    Returns:
+        A (vectorstore, stats) tuple where stats counts added/removed chunks
+        and carries the fingerprint of the resulting index state.
+    """
+    embedding = embedding or default_embeddings()
+    _ensure_docs_dir(docs_dir)
+
+    settings = {
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "embedding_model": _embedding_model_name(embedding),
+        **_vector_settings(vector_backend),
+    }
+    manifest = None if force_rebuild else IndexManifest.load(persist_directory)
+    if manifest is not None and manifest.settings != settings:
+        print("[RAG] Index settings changed, rebuilding")
+        manifest = None
+
+    vectorstore = _open_vectorstore(settings, persist_directory, embedding)
+    rebuilt = manifest is None
+    if rebuilt:
+        # Without a (matching) manifest we cannot tell what is in the collection
+        if force_rebuild:
+            print("[RAG] Force rebuild requested")
+        vectorstore.reset_collection()
+        manifest = IndexManifest(settings=settings)
+
+    stats = {
+        "files_changed": 0,
+        "files_removed": 0,
+        "chunks_added": 0,
+        "chunks_removed": 0,
+        "failures": {},
+        "parse_seconds": {},
+    }
+    current_files = discover_files(docs_dir)
+
+    stale_ids = []
+    for path in set(manifest.files) - set(current_files):
+        stale_ids.extend(manifest.files.pop(path).get("chunks", []))
+        stats["files_removed"] += 1
+
+    changed = {}
+    for path in current_files:
+        sha = manifest.changed_sha(path)
+        if sha is not None:
+            changed[path] = sha
+
+    chunk_store = None
+    if stale_ids or changed or rebuilt:
+        chunk_store = ChunkStore(persist_directory) if rebuilt else ChunkStore.load(persist_directory)
+
+    # Chunks waiting to be embedded; never more than INDEX_BATCH_SIZE
+    pending = []
+
+    def flush():
+        if pending:
+            print(f"[RAG] Embedding {len(pending)} new or changed chunks...")
+            vectorstore.add_documents(pending, ids=[d.metadata["chunk_id"] for d in pending])
+            chunk_store.add(pending)
+            stats["chunks_added"] += len(pending)
+            pending.clear()
+
+    def index_file(path: str, chunks: Iterable[Document]) -> int:
+        """Feeds one file's chunks into the batches and records the file."""
+        entry = manifest.files.get(path, {})
+        old_ids = set(entry.get("chunks", []))
+        # Retagged chunks are written again (upsert) so their metadata follows
+        reusable = old_ids if entry.get("tags", {}) == tags[path] else set()
+        new_ids, added = [], set()
+        try:
+            for doc in chunks:
+                new_ids.append(doc.metadata["chunk_id"])
+                if new_ids[-1] not in reusable:
+                    if new_ids[-1] not in old_ids:
+                        added.add(new_ids[-1])
+                    pending.append(doc)
+                    if len(pending) >= INDEX_BATCH_SIZE:
+                        flush()
+        except Exception:
+            # Drop what this file already contributed; its old chunks stay
+            pending[:] = [d for d in pending if d.metadata["chunk_id"] not in added]
+            stale_ids.extend(added)
+            raise
+        stale_ids.extend(old_ids - set(new_ids))
+        manifest.record(path, changed[path], new_ids, tags[path])
+        stats["files_changed"] += 1
+        return len(new_ids)
+
+    tags = {path: file_tags(path, docs_dir) for path in changed}
+    if changed:
+        min_bytes = stream_min_bytes()
+        streamed = [path for path in changed if os.path.getsize(path) >= min_bytes]
+        pooled = [path for path in changed if path not in streamed]
+        print(f"[RAG] Parsing {len(changed)} new or changed files...")
+        if pooled:
+            for parsed in parse_files(pooled, CHUNK_SIZE, CHUNK_OVERLAP, tags=tags):
+                if parsed.error:
+                    print(f"[RAG] Failed to load {parsed.path} ({parsed.seconds:.2f}s): {parsed.error}")
+                    stats["failures"][parsed.path] = parsed.error
+                    continue
+                print(f"[RAG] Parsed {parsed.path}: {len(parsed.chunks)} chunks in {parsed.seconds:.2f}s")
+                stats["parse_seconds"][parsed.path] = parsed.seconds
+                index_file(parsed.path, parsed.chunks)
+        # Large files are split page by page and flushed as they go
+        for path in streamed:
+            start = time.perf_counter()
+            try:
+                count = index_file(path, iter_file_chunks(path, CHUNK_SIZE, CHUNK_OVERLAP, tags[path]))
+            except Exception as e:
+                print(f"[RAG] Failed to load {path} ({time.perf_counter() - start:.2f}s): {e}")
+                stats["failures"][path] = f"{type(e).__name__}: {e}"
+                continue
+            seconds = time.perf_counter() - start
+            print(f"[RAG] Streamed {path}: {count} chunks in {seconds:.2f}s")
+            stats["parse_seconds"][path] = seconds
+        flush()
+
+    if stale_ids:
+        vectorstore.delete(ids=stale_ids)
+        chunk_store.delete(stale_ids)
+        stats["chunks_removed"] = len(stale_ids)
+    if chunk_store is not None:
+        chunk_store.save()
+    if isinstance(vectorstore, NumpyVectorStore):
+        vectorstore.persist()
+
+    manifest.save(persist_directory)
+    stats["fingerprint"] = manifest.fingerprint()
+    print(
+        f"[RAG] Index synced: {stats['files_changed']} changed, {stats['files_removed']} removed files; "
+        f"+{stats['chunks_added']}/-{stats['chunks_removed']} chunks"
+    )
+    return vectorstore, stats
+
+
+def load_bm25(persist_directory: str, fingerprint: str, tokenizer: str) -> Optional[Dict[Optional[str], SparseIndex]]:
+    """
+    Loads the persisted keyword indexes if they were built for the given index state.
+
+    Returns:
+        Sparse indexes keyed by product, plus the one over all chunks under
+        None; or None if there is no usable persisted index.
+    """
+    loaded = load_indexes(os.path.join(persist_directory, BM25_DIR))
+    if loaded is None:
+        return None
+    metadata, indexes = loaded
+    if metadata.get("fingerprint") != fingerprint or metadata.get("tokenizer") != tokenizer:
+        return None
+    return {None if name == ALL_PRODUCTS else name: index for name, index in indexes.items()}
+
+
+def save_bm25(persist_directory: str, shards: Dict[Optional[str], SparseIndex], fingerprint: str, tokenizer: str):
+    """Persists the keyword indexes, tagged with the index state and tokenizer they were built with."""
+    save_indexes(
+        os.path.join(persist_directory, BM25_DIR),
+        {ALL_PRODUCTS if name is None else name: index for name, index in shards.items()},
+        {"fingerprint": fingerprint, "tokenizer": tokenizer},
+    )
+
+
+def build_bm25_shards(docs: List[Document], tokenizer: Callable[[str], List[str]]) -> Dict[Optional[str], SparseIndex]:
+    """
+    Builds one keyword index per product, plus one over all documents under None.
+
+    Document numbers are positions in docs, shared by all the indexes.
+    """
+    tokens = [tokenizer(doc.page_content) for doc in docs]
+    members: Dict[str, List[int]] = {}
+    for number, doc in enumerate(docs):
+        members.setdefault(doc.metadata.get("product", DEFAULT_PRODUCT), []).append(number)
+    shards = {None: SparseIndex.build(tokens)}
+    for product, numbers in members.items():
+        shards[product] = SparseIndex.build([tokens[n] for n in numbers], doc_numbers=numbers)
+    return shards
+
+
+class ShardedRetriever:
+    """
+    Retrieval pipelines over the product shards of one index state.
+
+    Every product has its own BM25 index and a vector retriever filtered on
+    the `product` metadata, so a query for one product only scores that
+    shard. The unfiltered pipeline searches all chunks. Pipelines are built
+    on first use.
+
+    Args:
+        build_pipeline: Builds the pipeline for a product (None: all products).
+        products: Products present in the index.
+    """
+
+    def __init__(self, build_pipeline: Callable[[Optional[str]], BaseRetriever], products: List[str]):
+        self.products = products
+        self._build_pipeline = build_pipeline
+        self._pipelines: Dict[Optional[str], BaseRetriever] = {}
+        self._lock = threading.Lock()
+
+    def get(self, product: Optional[str] = None) -> BaseRetriever:
+        """Returns the pipeline for a product; unknown products get the unfiltered one."""
+        product = product.strip().lower() if product else None
+        if product not in self.products:
+            product = None
+        with self._lock:
+            if product not in self._pipelines:
+                self._pipelines[product] = self._build_pipeline(product)
+            return self._pipelines[product]
+
+
+def build_sharded_retriever(
+    docs_dir: str = "docs",
+    enable_rerank: bool = False,
+    force_rebuild: bool = False,
+    embedding: Optional[Embeddings] = None,
+    persist_directory: str = PERSIST_DIRECTORY,
+):
+    """
+    Initializes the per-product retrieval pipelines from the documents in docs_dir.
     Supports .txt, .md, and .pdf files.
-    
+
+    The vector database is synced incrementally (see `sync_index`), so only
+    new or changed chunks are embedded. The per-product BM25 indexes are
+    persisted next to it and loaded directly when the index did not change.
+    Results are cached per query in `retrieval_cache` until the index changes.
+
     Args:
         docs_dir: Directory containing documents.
         enable_rerank: Whether to enable re-ranking using Flashrank.
         force_rebuild: If True, rebuild the vector database even if it exists.
+        embedding: Embedding model. Defaults to cached OpenAIEmbeddings
+            (see `default_embeddings`).
+        persist_directory: Directory of the vector database and keyword index.
+
+    Returns:
+        A (ShardedRetriever, stats) tuple; see `sync_index` for stats. The
+        retriever is None if there are no documents.
     """
-    persist_directory = "./chroma_db"
-    
-    # Check if we can load existing vector database
-    if not force_rebuild and os.path.exists(persist_directory) and os.listdir(persist_directory):
-        print(f"[RAG] Loading existing vector database from {persist_directory}")
-        try:
-            vectorstore = Chroma(
-                persist_directory=persist_directory,
-                embedding_function=OpenAIEmbeddings()
-            )
-            vector_retriever = vectorstore.as_retriever(search_kwargs={"k": 5})
-            print("[RAG] Successfully loaded cached vector database")
-            
-            # Note: BM25 retriever still needs documents to be loaded
-            # We need to load documents for BM25 anyway
-            if not os.path.exists(docs_dir):
-                os.makedirs(docs_dir)
-                with open(os.path.join(docs_dir, "readme.txt"), "w") as f:
-                    f.write("This is a placeholder document for the RAG system.")
-            
-            all_docs = []
-            txt_loader = DirectoryLoader(docs_dir, glob="**/*.txt", loader_cls=TextLoader)
-            all_docs.extend(txt_loader.load())
-            md_loader = DirectoryLoader(docs_dir, glob="**/*.md", loader_cls=UnstructuredMarkdownLoader)
-            all_docs.extend(md_loader.load())
-            pdf_loader = DirectoryLoader(docs_dir, glob="**/*.pdf", loader_cls=PyPDFLoader)
-            all_docs.extend(pdf_loader.load())
-            
-            if not all_docs:
-                return None
-            
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-            splits = text_splitter.split_documents(all_docs)
-            
-        except Exception as e:
-            print(f"[RAG] Failed to load existing database: {e}")
-            print("[RAG] Rebuilding vector database...")
-            force_rebuild = True
+    vectorstore, stats = sync_index(docs_dir, persist_directory, embedding=embedding, force_rebuild=force_rebuild)
+
+    chunk_store = ChunkStore.load(persist_directory)
+    splits = chunk_store.documents()
+    if not splits:
+        return None, stats
+    if isinstance(vectorstore, NumpyVectorStore):
+        # Vector hits are resolved to the chunk texts the BM25 side already holds
+        by_id = {doc.metadata["chunk_id"]: doc for doc in splits}
+        vectorstore.attach_documents(by_id.get)
+
+    # Keyword Search (BM25) - loaded from disk unless the index changed
+    tokenizer = get_tokenizer()
+    bm25_shards = load_bm25(persist_directory, stats["fingerprint"], tokenizer.name)
+    if bm25_shards is None:
+        print(f"[RAG] Initializing BM25 keyword search ({tokenizer.name} tokenizer)...")
+        bm25_shards = build_bm25_shards(splits, tokenizer)
+        save_bm25(persist_directory, bm25_shards, stats["fingerprint"], tokenizer.name)
     else:
-        if force_rebuild:
-            print("[RAG] Force rebuild requested")
-        else:
-            print(f"[RAG] No existing vector database found at {persist_directory}")
-        print("[RAG] Building new vector database...")
-    
-    # Build new vector database if needed
-    if force_rebuild or not os.path.exists(persist_directory) or not os.listdir(persist_directory):
-        if not os.path.exists(docs_dir):
-            os.makedirs(docs_dir)
-            with open(os.path.join(docs_dir, "readme.txt"), "w") as f:
-                f.write("This is a placeholder document for the RAG system.")
-
-        # Load documents from multiple file types
-        all_docs = []
-        
-        print(f"[RAG] Loading documents from {docs_dir}...")
-        txt_loader = DirectoryLoader(docs_dir, glob="**/*.txt", loader_cls=TextLoader)
-        all_docs.extend(txt_loader.load())
-        
-        md_loader = DirectoryLoader(docs_dir, glob="**/*.md", loader_cls=UnstructuredMarkdownLoader)
-        all_docs.extend(md_loader.load())
-        
-        pdf_loader = DirectoryLoader(docs_dir, glob="**/*.pdf", loader_cls=PyPDFLoader)
-        all_docs.extend(pdf_loader.load())
-        
-        if not all_docs:
-            return None
+        print("[RAG] Loaded cached BM25 index")
 
-        print(f"[RAG] Loaded {len(all_docs)} documents, splitting into chunks...")
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        splits = text_splitter.split_documents(all_docs)
-        print(f"[RAG] Created {len(splits)} chunks")
-        
-        print("[RAG] Creating vector embeddings (this may take a while)...")
-        vectorstore = Chroma.from_documents(
-            documents=splits, 
-            embedding=OpenAIEmbeddings(),
-            persist_directory=persist_directory
-        )
-        vector_retriever = vectorstore.as_retriever(search_kwargs={"k": 5})
-        print("[RAG] Vector database created and saved")
-    
-    # 2. Keyword Search (BM25) - always needs to be rebuilt from documents
-    print("[RAG] Initializing BM25 keyword search...")
-    bm25_retriever = BM25Retriever.from_documents(splits)
-    bm25_retriever.k = 5
-    
-    # 3. Hybrid Search (Ensemble)
-    print("[RAG] Creating Hybrid Search (BM25 + Vector)...")
-    ensemble_retriever = EnsembleRetriever(
-        retrievers=[bm25_retriever, vector_retriever],
-        weights=[0.5, 0.5]
-    )
-    
-    final_retriever = ensemble_retriever
-    
-    # 4. Optional Re-ranking
+    compressor = None
     if enable_rerank:
         print("[RAG] Enabling Re-ranking with Flashrank...")
-        compressor = FlashrankRerank()
-        compression_retriever = ContextualCompressionRetriever(
-            base_compressor=compressor, 
-            base_retriever=ensemble_retriever
+        # Load and warm up the shared model now rather than on the first query
+        compressor = BatchedRerank(
+            service=get_rerank_service().load(),
+            max_candidates=RERANK_CANDIDATES,
+            top_n=RERANK_TOP_N,
+        )
+    config_key = (
+        f"k=5;weights=0.5,0.5;bm25={tokenizer.name};"
+        f"rerank={f'{RERANK_CANDIDATES}/{RERANK_TOP_N}' if enable_rerank else 'off'}"
+    )
+
+    def build_pipeline(product: Optional[str]) -> BaseRetriever:
+        search_kwargs = {"k": 5}
+        if product:
+            search_kwargs["filter"] = {"product": product}
+        # Hybrid Search (BM25 + Vector)
+        retriever = HybridRetriever(
+            retrievers=[
+                SparseRetriever(index=bm25_shards[product], documents=splits, tokenizer=tokenizer, k=5),
+                vectorstore.as_retriever(search_kwargs=search_kwargs),
+            ],
+            weights=[0.5, 0.5]
+        )
+        # Optional Re-ranking
+        if compressor is not None:
+            retriever = ContextualCompressionRetriever(base_compressor=compressor, base_retriever=retriever)
+        return CachedRetriever(
+            base_retriever=retriever,
+            cache=retrieval_cache,
+            index_version=stats["fingerprint"],
+            config_key=f"{config_key};product={product or 'all'}",
         )
-        final_retriever = compression_retriever
-    
-    print("[RAG] Retriever ready")
-    return final_retriever
+
+    products = sorted(p for p in bm25_shards if p is not None)
+    print(f"[RAG] Retriever ready (products: {', '.join(products)})")
+    return ShardedRetriever(build_pipeline, products), stats
+
+
+def build_retriever(
+    docs_dir: str = "docs",
+    enable_rerank: bool = False,
+    force_rebuild: bool = False,
+    embedding: Optional[Embeddings] = None,
+    persist_directory: str = PERSIST_DIRECTORY,
+):
+    """
+    Initializes and returns a retriever over all documents in docs_dir.
+
+    See `build_sharded_retriever` for the arguments.
+
+    Returns:
+        A (retriever, stats) tuple; see `sync_index` for stats. The retriever
+        is None if there are no documents.
+    """
+    sharded, stats = build_sharded_retriever(docs_dir, enable_rerank, force_rebuild, embedding, persist_directory)
+    return (sharded.get() if sharded else None), stats
+
+
+def get_retriever(
+    docs_dir: str = "docs",
+    enable_rerank: bool = False,
+    force_rebuild: bool = False,
+    embedding: Optional[Embeddings] = None,
+    persist_directory: str = PERSIST_DIRECTORY,
+):
+    """
+    Initializes and returns a retriever from the documents in the specified directory.
+
+    See `build_retriever` for the arguments. Returns None if there are no documents.
+    """
+    retriever, _ = build_retriever(docs_dir, enable_rerank, force_rebuild, embedding, persist_directory)
+    return retriever
+
+
+class IndexManager:
+    """
+    Owns the live retriever and rebuilds it off the request path.
+
+    `refresh()` syncs the index and builds a new retriever, then swaps it in
+    with a single reference assignment: queries that already grabbed the old
+    retriever finish on it, new queries use the new one. An optional watcher
+    thread polls docs_dir and refreshes when files are added, changed or
+    removed.
+
+    With the numpy backend the old retriever keeps reading its own memory-
+    mapped snapshot; with Chroma the vector side is updated in place and only
+    the BM25 index and cached results are snapshot-isolated.
+
+    `start_background()` builds the first retriever off the startup path;
+    `state` moves from "idle" to "building" and then "ready" or "failed".
+
+    `shards` holds the per-product pipelines (see `ShardedRetriever`);
+    `retriever` is the unfiltered one.
+    """
+
+    def __init__(
+        self,
+        docs_dir: str = "docs",
+        enable_rerank: bool = False,
+        embedding: Optional[Embeddings] = None,
+        persist_directory: str = PERSIST_DIRECTORY,
+    ):
+        self.docs_dir = docs_dir
+        self.enable_rerank = enable_rerank
+        self.embedding = embedding
+        self.persist_directory = persist_directory
+        self.shards: Optional[ShardedRetriever] = None
+        self.version: Optional[str] = None
+        self.last_refresh: Optional[float] = None
+        self.last_stats: Optional[dict] = None
+        self.state = "idle"
+        self.error: Optional[str] = None
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._initialized = threading.Event()
+        self._init_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    @property
+    def retriever(self) -> Optional[BaseRetriever]:
+        """The pipeline over all products, or None before the first build."""
+        shards = self.shards
+        return shards.get() if shards else None
+
+    def refresh(self, force_rebuild: bool = False) -> dict:
+        """Syncs the index and swaps in a retriever built from it."""
+        with self._refresh_lock:
+            try:
+                shards, stats = build_sharded_retriever(
+                    self.docs_dir, self.enable_rerank, force_rebuild, self.embedding, self.persist_directory
+                )
+            except Exception as e:
+                # A failed refresh keeps serving the previous retriever, if any
+                if self.shards is None:
+                    self.state = "failed"
+                self.error = str(e)
+                raise
+            self.shards = shards
+            self.version = stats["fingerprint"]
+            self.last_refresh = time.time()
+            self.last_stats = stats
+            self.state = "ready"
+            self.error = None
+            self._initialized.set()
+            return stats
+
+    def start_background(self, watch_interval: float = 0.0):
+        """
+        Builds the first retriever in a background thread, then starts the watcher.
+
+        Safe to call more than once; only the first call starts the build.
+
+        Args:
+            watch_interval: Passed to `start_watcher` once the build finishes.
+        """
+        with self._start_lock:
+            if self._init_thread is not None:
+                return
+            self.state = "building"
+
+            def build():
+                start = time.perf_counter()
+                try:
+                    self.refresh()
+                    print(f"[RAG] Index ready in {time.perf_counter() - start:.1f}s")
+                except Exception as e:
+                    print(f"[RAG] Initial index build failed: {e}")
+                finally:
+                    self._initialized.set()
+                # After a failure the watcher retries once docs/ changes
+                self.start_watcher(watch_interval)
+
+            self._init_thread = threading.Thread(target=build, name="index-init", daemon=True)
+            self._init_thread.start()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until the first build finishes (or fails) or the timeout expires.
+
+        Returns:
+            True if a retriever is available.
+        """
+        self._initialized.wait(timeout)
+        return self.shards is not None
+
+    def _docs_signature(self):
+        signature = []
+        for path in discover_files(self.docs_dir):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature.append((path, stat.st_size, stat.st_mtime))
+        return signature
+
+    def start_watcher(self, interval: float):
+        """Polls docs_dir every `interval` seconds and refreshes on change (0 disables)."""
+        if interval <= 0 or self._watcher is not None:
+            return
+        self._stop.clear()
+        # Taken before the thread starts so changes made right after this call are seen
+        initial = self._docs_signature()
+
+        def watch():
+            signature = initial
+            while not self._stop.wait(interval):
+                current = self._docs_signature()
+                if current == signature:
+                    continue
+                print("[RAG] Change detected in docs, refreshing index...")
+                # Recorded even if the refresh fails: the next attempt waits for
+                # another change (or POST /admin/reindex) instead of every poll
+                signature = current
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"[RAG] Index refresh failed: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="docs-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def status(self) -> dict:
+        return {
+            "ready": self.shards is not None,
+            "state": self.state,
+            "error": self.error,
+            "version": self.version,
+            "products": self.shards.products if self.shards else [],
+            "last_refresh": self.last_refresh,
+            "watching": self._watcher is not None,
+            "cache": retrieval_cache.stats(),
+        }
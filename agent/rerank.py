@@ -0,0 +1,204 @@
+"""
+Re-ranking stage for the RAG pipeline.
+
+A single `RerankService` owns the Flashrank cross-encoder for the whole
+process. It is loaded and warmed up eagerly, and concurrent rerank requests
+are queued and scored together in micro-batches by one worker thread.
+`BatchedRerank` is the document compressor that plugs the service into the
+retriever, capping candidates before scoring and keeping the top N after.
+"""
+import asyncio
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+
+# Scores a list of (query, passage) pairs
+PairScorer = Callable[[List[Tuple[str, str]]], Sequence[float]]
+
+
+def flashrank_scorer(model_name: Optional[str] = None) -> PairScorer:
+    """Returns a pair scorer backed by a Flashrank cross-encoder."""
+    from flashrank import Ranker
+
+    return ranker_scorer(Ranker(model_name=model_name) if model_name else Ranker())
+
+
+def ranker_scorer(ranker) -> PairScorer:
+    """Returns a pair scorer over a loaded Flashrank `Ranker`."""
+    from flashrank import RerankRequest
+
+    def score(pairs: List[Tuple[str, str]]) -> Sequence[float]:
+        # Flashrank only creates an ONNX session for pairwise models
+        if getattr(ranker, "session", None) is None:
+            # Listwise (LLM) models only order a query's whole passage list and
+            # give no per-passage score: rank each query's passages together and
+            # score them by position (1.0 for the first, down towards 0)
+            by_query = {}
+            for i, (q, _) in enumerate(pairs):
+                by_query.setdefault(q, []).append(i)
+            scores = [0.0] * len(pairs)
+            for q, indexes in by_query.items():
+                passages = [{"id": i, "text": pairs[i][1]} for i in indexes]
+                ranked = ranker.rerank(RerankRequest(query=q, passages=passages))
+                for position, passage in enumerate(ranked):
+                    scores[passage["id"]] = 1.0 - position / len(indexes)
+            return scores
+
+        # Same pairwise cross-encoder pass as Ranker.rerank, but over pairs
+        # from several queries at once
+        encoded = ranker.tokenizer.encode_batch([list(pair) for pair in pairs])
+        onnx_input = {
+            "input_ids": np.array([e.ids for e in encoded], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encoded], dtype=np.int64),
+        }
+        token_type_ids = np.array([e.type_ids for e in encoded], dtype=np.int64)
+        if not np.all(token_type_ids == 0):
+            onnx_input["token_type_ids"] = token_type_ids
+        logits = ranker.session.run(None, onnx_input)[0]
+        if logits.shape[1] == 1:
+            return (1 / (1 + np.exp(-logits.flatten()))).tolist()
+        exp_logits = np.exp(logits)
+        return (exp_logits[:, 1] / np.sum(exp_logits, axis=1)).tolist()
+
+    return score
+
+
+class RerankService:
+    """
+    Shared reranker that scores concurrent requests in micro-batches.
+
+    Requests are queued; the worker takes the first one, then keeps
+    collecting requests for up to `max_wait` seconds or until `max_batch`
+    pairs are pending, and scores them all in a single model call.
+
+    Args:
+        scorer_factory: Builds the pair scorer (called once, by `load`).
+        max_batch: Maximum number of (query, passage) pairs per model call.
+        max_wait: Seconds to wait for more requests to join a batch.
+    """
+
+    def __init__(self, scorer_factory: Callable[[], PairScorer], max_batch: int = 64, max_wait: float = 0.005):
+        self.scorer_factory = scorer_factory
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._scorer: Optional[PairScorer] = None
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self.batches = 0
+
+    def load(self) -> "RerankService":
+        """Loads and warms up the model and starts the worker (idempotent)."""
+        with self._lock:
+            if self._scorer is None:
+                scorer = self.scorer_factory()
+                scorer([("warm up", "warm up")])
+                self._scorer = scorer
+                self._worker = threading.Thread(target=self._run, name="rerank-worker", daemon=True)
+                self._worker.start()
+        return self
+
+    def submit(self, query: str, texts: List[str]) -> Future:
+        """Queues texts for scoring against query; the future resolves to their scores."""
+        self.load()
+        future = Future()
+        if not texts:
+            future.set_result([])
+        else:
+            self._queue.put((query, texts, future))
+        return future
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        return self.submit(query, texts).result()
+
+    async def ascore(self, query: str, texts: List[str]) -> List[float]:
+        return await asyncio.wrap_future(self.submit(query, texts))
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            pairs = len(batch[0][1])
+            while pairs < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=self.max_wait)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                pairs += len(item[1])
+            self._score_batch(batch)
+
+    def _score_batch(self, batch):
+        all_pairs = [(query, text) for query, texts, _ in batch for text in texts]
+        try:
+            scores = list(self._scorer(all_pairs))
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        offset = 0
+        for _, texts, future in batch:
+            future.set_result(scores[offset:offset + len(texts)])
+            offset += len(texts)
+
+
+_service: Optional[RerankService] = None
+_service_lock = threading.Lock()
+
+
+def get_rerank_service() -> RerankService:
+    """
+    Returns the process-wide rerank service, configured from RAG_RERANK_MODEL,
+    RAG_RERANK_BATCH (pairs per model call) and RAG_RERANK_WAIT_MS.
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            model_name = os.getenv("RAG_RERANK_MODEL")
+            _service = RerankService(
+                lambda: flashrank_scorer(model_name),
+                max_batch=int(os.getenv("RAG_RERANK_BATCH", "64")),
+                max_wait=float(os.getenv("RAG_RERANK_WAIT_MS", "5")) / 1000,
+            )
+        return _service
+
+
+class BatchedRerank(BaseDocumentCompressor):
+    """
+    Document compressor that reranks retrieved documents with a `RerankService`.
+
+    Only the first `max_candidates` documents are scored; the best `top_n`
+    are returned with a `relevance_score` metadata entry.
+    """
+    service: RerankService
+    max_candidates: int = 20
+    top_n: int = 5
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def _select(self, documents: Sequence[Document], scores: List[float]) -> List[Document]:
+        ranked = sorted(zip(scores, range(len(scores))), key=lambda x: x[0], reverse=True)[:self.top_n]
+        results = []
+        for score, i in ranked:
+            doc = documents[i].model_copy()
+            doc.metadata = {**doc.metadata, "relevance_score": float(score)}
+            results.append(doc)
+        return results
+
+    def compress_documents(
+        self, documents: Sequence[Document], query: str, callbacks: Callbacks = None
+    ) -> Sequence[Document]:
+        candidates = list(documents)[:self.max_candidates]
+        return self._select(candidates, self.service.score(query, [d.page_content for d in candidates]))
+
+    async def acompress_documents(
+        self, documents: Sequence[Document], query: str, callbacks: Callbacks = None
+    ) -> Sequence[Document]:
+        candidates = list(documents)[:self.max_candidates]
+        return self._select(candidates, await self.service.ascore(query, [d.page_content for d in candidates]))
@@ -0,0 +1,185 @@
+"""
+Semantic answer cache for single-turn questions.
+
+Questions are embedded and compared (cosine similarity) against previously
+answered ones held in a small in-memory vector index. A match above the
+threshold returns the stored answer without running the agent graph.
+The cache never fails a request: when the question cannot be embedded, a
+lookup is a miss and storing is skipped.
+"""
+import os
+import threading
+import time
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class SemanticCacheHit(NamedTuple):
+    answer: str
+    question: str
+    similarity: float
+
+
+class SemanticCache:
+    """
+    Bounded in-memory cache of (question embedding, answer) pairs.
+
+    Entries expire after `ttl` seconds; when full, the least recently used
+    entry is evicted. Storing an answer for a question that already has an
+    entry (a lookup would hit it) replaces that entry.
+
+    Args:
+        embedding: Model used to embed questions.
+        threshold: Minimum cosine similarity for a hit.
+        maxsize: Maximum number of cached answers (0 stores nothing).
+        ttl: Seconds an answer stays valid.
+    """
+
+    def __init__(self, embedding: Embeddings, threshold: float = 0.95, maxsize: int = 1000, ttl: float = 3600.0):
+        self.embedding = embedding
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._questions: List[str] = []
+        self._answers: List[str] = []
+        self._created: List[float] = []
+        self._used: List[float] = []
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _remove(self, indexes: List[int]):
+        drop = set(indexes)
+        keep = [i for i in range(len(self._questions)) if i not in drop]
+        self._vectors = self._vectors[keep] if keep else None
+        for values in (self._questions, self._answers, self._created, self._used):
+            values[:] = [values[i] for i in keep]
+
+    def _lookup(self, vector: np.ndarray) -> Optional[SemanticCacheHit]:
+        with self._lock:
+            now = time.time()
+            expired = [i for i, created in enumerate(self._created) if now - created > self.ttl]
+            if expired:
+                self._remove(expired)
+            if self._vectors is not None:
+                similarities = self._vectors @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self._used[best] = now
+                    self.hits += 1
+                    return SemanticCacheHit(self._answers[best], self._questions[best], float(similarities[best]))
+            self.misses += 1
+            return None
+
+    def _store(self, question: str, vector: np.ndarray, answer: str):
+        with self._lock:
+            now = time.time()
+            if self._vectors is not None:
+                similarities = self._vectors @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    # Same question again: refresh its entry
+                    self._vectors[best] = vector
+                    self._questions[best] = question
+                    self._answers[best] = answer
+                    self._created[best] = now
+                    self._used[best] = now
+                    return
+            if len(self._questions) >= self.maxsize:
+                self._remove([int(np.argmin(self._used))])
+            row = vector[np.newaxis, :]
+            self._vectors = row if self._vectors is None else np.vstack([self._vectors, row])
+            self._questions.append(question)
+            self._answers.append(answer)
+            self._created.append(now)
+            self._used.append(now)
+
+    def _failed(self, action: str, error: Exception):
+        with self._lock:
+            self.errors += 1
+        print(f"[Cache] Could not embed the question to {action} the semantic cache: {error}")
+
+    def get(self, question: str) -> Optional[SemanticCacheHit]:
+        try:
+            vector = self.embedding.embed_query(question)
+        except Exception as e:
+            self._failed("search", e)
+            return None
+        return self._lookup(self._normalize(vector))
+
+    def put(self, question: str, answer: str):
+        if self.maxsize <= 0:
+            return
+        try:
+            vector = self.embedding.embed_query(question)
+        except Exception as e:
+            self._failed("update", e)
+            return
+        self._store(question, self._normalize(vector), answer)
+
+    async def aget(self, question: str) -> Optional[SemanticCacheHit]:
+        try:
+            vector = await self.embedding.aembed_query(question)
+        except Exception as e:
+            self._failed("search", e)
+            return None
+        return self._lookup(self._normalize(vector))
+
+    async def aput(self, question: str, answer: str):
+        if self.maxsize <= 0:
+            return
+        try:
+            vector = await self.embedding.aembed_query(question)
+        except Exception as e:
+            self._failed("update", e)
+            return
+        self._store(question, self._normalize(vector), answer)
+
+    def clear(self):
+        with self._lock:
+            self._vectors = None
+            for values in (self._questions, self._answers, self._created, self._used):
+                values.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "size": len(self._questions),
+                "maxsize": self.maxsize,
+                "threshold": self.threshold,
+                "ttl": self.ttl,
+            }
+
+
+def build_semantic_cache() -> Optional[SemanticCache]:
+    """
+    Returns the semantic cache configured from the environment, or None.
+
+    Enabled with SEMANTIC_CACHE_ENABLED=true; tuned with
+    SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE (0 disables it) and
+    SEMANTIC_CACHE_TTL.
+    """
+    maxsize = int(os.getenv("SEMANTIC_CACHE_SIZE", "1000"))
+    if os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() != "true" or maxsize <= 0:
+        return None
+    from .embeddings import default_embeddings
+
+    return SemanticCache(
+        default_embeddings(),
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+        maxsize=maxsize,
+        ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "3600")),
+    )
@@ -0,0 +1,307 @@
+"""
+Sparse keyword index: BM25 over an inverted index.
+
+Every term maps to a postings list of (document number, impact) pairs, where
+the impact is the BM25 term-frequency component computed at build time, so a
+query only reads the postings of its own terms. Terms are scored from the
+highest to the lowest score upper bound; once the bounds of the remaining
+terms can no longer lift an unseen document into the top k (MaxScore), those
+terms are only looked up for the surviving candidates instead of scanned.
+
+Postings are flat NumPy arrays written next to a JSON header and opened
+memory-mapped, like the vectors of `NumpyVectorStore`.
+"""
+import json
+import math
+import os
+import re
+import uuid
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+HEADER_FILE = "index.json"
+FORMAT_VERSION = 1
+ARRAYS = ("offsets", "postings", "impacts", "idf", "upper_bounds")
+
+_WORD = re.compile(r"\w+")
+_HANGUL = re.compile(r"[가-힣]+")
+_SCRIPT_RUNS = re.compile(r"[가-힣]+|[^가-힣]+")
+# Kiwi part-of-speech tags kept as index terms: nouns, verb/adjective stems,
+# roots, foreign words, numbers and hanja
+_KIWI_TAGS = ("NN", "VV", "VA", "XR", "SL", "SN", "SH")
+
+
+class WordTokenizer:
+    """Lowercased `\\w+` words."""
+    name = "word"
+
+    def __call__(self, text: str) -> List[str]:
+        return _WORD.findall(text.lower())
+
+
+class KoreanNgramTokenizer:
+    """
+    Words, with Hangul runs split into character n-grams.
+
+    Korean attaches particles and endings to words ("서버의", "설정하면"), so
+    whole-word matching rarely hits; overlapping bigrams match the stem
+    without a morpheme dictionary. Other scripts are kept as whole words.
+
+    Args:
+        n: Length of the Hangul n-grams.
+    """
+
+    def __init__(self, n: int = 2):
+        self.n = n
+        self.name = "ngram" if n == 2 else f"ngram{n}"
+
+    def __call__(self, text: str) -> List[str]:
+        tokens = []
+        for word in _WORD.findall(text.lower()):
+            for run in _SCRIPT_RUNS.findall(word):
+                if not _HANGUL.fullmatch(run) or len(run) <= self.n:
+                    tokens.append(run)
+                else:
+                    tokens.extend(run[i:i + self.n] for i in range(len(run) - self.n + 1))
+        return tokens
+
+
+class KiwiTokenizer:
+    """Korean morphemes from the kiwipiepy analyzer (optional dependency)."""
+    name = "kiwi"
+
+    def __init__(self):
+        from kiwipiepy import Kiwi
+
+        self._kiwi = Kiwi()
+
+    def __call__(self, text: str) -> List[str]:
+        return [t.form.lower() for t in self._kiwi.tokenize(text) if t.tag.startswith(_KIWI_TAGS)]
+
+
+def get_tokenizer(name: Optional[str] = None) -> Callable[[str], List[str]]:
+    """
+    Returns a tokenizer by name: "word", "ngram" (Korean bigrams) or "kiwi".
+
+    Defaults to RAG_BM25_TOKENIZER ("ngram"). "kiwi" falls back to "ngram"
+    when kiwipiepy is not installed.
+    """
+    name = (name or os.getenv("RAG_BM25_TOKENIZER", "ngram")).lower()
+    if name == "word":
+        return WordTokenizer()
+    if name == "kiwi":
+        try:
+            return KiwiTokenizer()
+        except ImportError:
+            print("[RAG] kiwipiepy is not installed, using the n-gram tokenizer")
+            return KoreanNgramTokenizer()
+    if name.startswith("ngram"):
+        return KoreanNgramTokenizer(int(name[5:] or 2))
+    raise ValueError(f"Unknown tokenizer {name!r}, expected word, ngram or kiwi")
+
+
+class SparseIndex:
+    """
+    BM25 inverted index over numbered documents.
+
+    Postings of term t are postings[offsets[t]:offsets[t + 1]] (document
+    numbers, ascending) with matching impacts; a document's score is the sum
+    of idf[t] * impact over the query terms it contains.
+    """
+
+    def __init__(
+        self,
+        vocabulary: Dict[str, int],
+        arrays: Dict[str, np.ndarray],
+        num_docs: int,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.vocabulary = vocabulary
+        self.offsets = arrays["offsets"]
+        self.postings = arrays["postings"]
+        self.impacts = arrays["impacts"]
+        self.idf = arrays["idf"]
+        self.upper_bounds = arrays["upper_bounds"]
+        self.num_docs = num_docs
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def build(
+        cls,
+        token_lists: Iterable[List[str]],
+        doc_numbers: Optional[Sequence[int]] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ) -> "SparseIndex":
+        """
+        Builds the index from tokenized documents.
+
+        Args:
+            token_lists: Tokens of each document.
+            doc_numbers: Number reported for each document (ascending).
+                Defaults to 0, 1, 2, ...
+            k1: BM25 term-frequency saturation.
+            b: BM25 length normalization.
+        """
+        vocabulary: Dict[str, int] = {}
+        term_ids, docs, tfs, lengths = [], [], [], []
+        for position, tokens in enumerate(token_lists):
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                docs.append(position)
+                tfs.append(tf)
+            lengths.append(len(tokens))
+
+        numbers = np.arange(len(lengths)) if doc_numbers is None else np.asarray(doc_numbers)
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        docs = np.asarray(docs, dtype=np.int64)
+        tfs = np.asarray(tfs, dtype=np.float32)
+        lengths = np.asarray(lengths, dtype=np.float32)
+        avgdl = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+
+        norms = k1 * (1 - b + b * lengths / avgdl)
+        impacts = tfs * (k1 + 1) / (tfs + norms[docs]) if len(docs) else tfs
+        order = np.lexsort((docs, term_ids))
+        df = np.bincount(term_ids, minlength=len(vocabulary))
+        offsets = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+        impacts = impacts[order].astype(np.float32)
+        # Lucene-style idf: always positive, which keeps the upper bounds valid
+        idf = np.log1p((len(lengths) - df + 0.5) / (df + 0.5)).astype(np.float32)
+        max_impacts = np.maximum.reduceat(impacts, offsets[:-1]) if len(impacts) else np.zeros(0, np.float32)
+        arrays = {
+            "offsets": offsets,
+            "postings": numbers[docs[order]].astype(np.int32),
+            "impacts": impacts,
+            "idf": idf,
+            "upper_bounds": (idf * max_impacts).astype(np.float32),
+        }
+        return cls(vocabulary, arrays, len(lengths), k1, b)
+
+    def search(self, tokens: List[str], k: int = 5) -> List[Tuple[int, float]]:
+        """
+        Returns the top k (document number, score) pairs for the query tokens.
+
+        Documents without any query term are never touched.
+        """
+        weights = Counter(t for t in tokens if t in self.vocabulary)
+        if not weights or k <= 0:
+            return []
+        terms = sorted(
+            ((self.vocabulary[t], w) for t, w in weights.items()),
+            key=lambda tw: -float(self.upper_bounds[tw[0]]) * tw[1],
+        )
+        # Padded so float32 rounding never makes a bound too tight
+        bounds = [float(self.upper_bounds[t]) * w * (1 + 1e-6) for t, w in terms]
+        # remaining[i]: best score a document can still gain from terms i..end
+        remaining = [math.fsum(bounds[i:]) for i in range(len(bounds))]
+
+        ids = np.empty(0, dtype=np.int64)
+        scores = np.empty(0, dtype=np.float64)
+        threshold = 0.0
+        for i, (term, weight) in enumerate(terms):
+            start, end = int(self.offsets[term]), int(self.offsets[term + 1])
+            docs = self.postings[start:end]
+            scale = float(self.idf[term]) * weight
+            if len(ids) >= k and remaining[i] < threshold:
+                # No unseen document can reach the top k any more: drop
+                # candidates that cannot either, then look the rest up
+                alive = scores + remaining[i] >= threshold
+                ids, scores = ids[alive], scores[alive]
+                positions = np.minimum(np.searchsorted(docs, ids), len(docs) - 1)
+                hit = docs[positions] == ids
+                scores[hit] += np.asarray(self.impacts[start + positions[hit]], dtype=np.float64) * scale
+            else:
+                merged = np.concatenate([ids, docs])
+                values = np.concatenate([scores, np.asarray(self.impacts[start:end], dtype=np.float64) * scale])
+                ids, inverse = np.unique(merged, return_inverse=True)
+                scores = np.bincount(inverse, weights=values, minlength=len(ids))
+            if len(ids) >= k:
+                threshold = float(np.partition(scores, len(scores) - k)[len(scores) - k])
+
+        # Ties are broken by document number
+        top = np.lexsort((ids, -scores))[:k]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def header(self) -> dict:
+        terms = [""] * len(self.vocabulary)
+        for term, term_id in self.vocabulary.items():
+            terms[term_id] = term
+        return {"vocabulary": terms, "num_docs": self.num_docs, "k1": self.k1, "b": self.b}
+
+
+def save_indexes(directory: str, indexes: Dict[str, SparseIndex], metadata: dict):
+    """
+    Writes a set of named indexes as a new generation of array files.
+
+    The header is replaced atomically, then older generations are removed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    generation = uuid.uuid4().hex[:12]
+    shards = {}
+    for number, (name, index) in enumerate(sorted(indexes.items())):
+        prefix = f"shard{number}"
+        for field in ARRAYS:
+            np.save(os.path.join(directory, f"{prefix}-{field}-{generation}.npy"), getattr(index, field))
+        shards[name] = {"prefix": prefix, **index.header()}
+    header = {"version": FORMAT_VERSION, "generation": generation, "metadata": metadata, "shards": shards}
+    path = os.path.join(directory, HEADER_FILE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False)
+    os.replace(f"{path}.tmp", path)
+
+    for name in os.listdir(directory):
+        if name.endswith(".npy") and generation not in name:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def load_indexes(directory: str) -> Optional[Tuple[dict, Dict[str, SparseIndex]]]:
+    """Loads the indexes written by `save_indexes` (postings memory-mapped), or None."""
+    try:
+        with open(os.path.join(directory, HEADER_FILE), "r", encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("version") != FORMAT_VERSION:
+            return None
+        indexes = {}
+        for name, shard in header["shards"].items():
+            arrays = {
+                field: np.load(
+                    os.path.join(directory, f"{shard['prefix']}-{field}-{header['generation']}.npy"), mmap_mode="r"
+                )
+                for field in ARRAYS
+            }
+            vocabulary = {term: term_id for term_id, term in enumerate(shard["vocabulary"])}
+            indexes[name] = SparseIndex(vocabulary, arrays, shard["num_docs"], shard["k1"], shard["b"])
+    except (OSError, ValueError, KeyError):
+        return None
+    return header["metadata"], indexes
+
+
+class SparseRetriever(BaseRetriever):
+    """
+    Keyword retriever over a `SparseIndex`.
+
+    Document numbers in the index are positions in `documents`, which may be
+    shared by several shard indexes.
+    """
+    index: SparseIndex
+    documents: List[Document]
+    tokenizer: Callable[[str], List[str]]
+    k: int = 5
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun = None
+    ) -> List[Document]:
+        return [
+            Document(page_content=self.documents[n].page_content, metadata=dict(self.documents[n].metadata))
+            for n, _ in self.index.search(self.tokenizer(query), self.k)
+        ]
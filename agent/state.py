@@ -1,6 +1,10 @@
-from typing import TypedDict, Annotated, List, Union
+from typing import TypedDict, Annotated, List
 from langchain_core.messages import BaseMessage
 import operator
 
-class AgentState(TypedDict):
+class _RunBudget(TypedDict, total=False):
+    # Epoch seconds by which the run must answer (agent.deadline.new_deadline)
+    deadline: float
+
+class AgentState(_RunBudget):
     messages: Annotated[List[BaseMessage], operator.add]
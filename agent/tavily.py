@@ -0,0 +1,201 @@
+"""
+Tavily web search with request coalescing and a result cache.
+
+`TavilyClient` calls the Tavily search API (TAVILY_API_URL, so tests can point
+it at a local fake) on the shared pooled HTTP clients. `CoalescingSearch`
+sits in front of it: results are cached for a TTL, keyed by the normalized
+query and the domain restriction, and identical queries that arrive while a
+search is in flight wait for that search instead of sending their own
+(singleflight). Both work for sync threads and async callers.
+"""
+import asyncio
+import concurrent.futures
+import os
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Sequence
+
+from .cache import TTLCache, cache_key
+from .http_client import HTTPClientManager
+
+DEFAULT_API_URL = "https://api.tavily.com"
+
+
+class TavilyClient:
+    """
+    Minimal Tavily search client; returns title/url/content/score results.
+
+    Args:
+        http: Pooled HTTP clients to send the requests on.
+        include_domains: Domains the search is restricted to.
+        max_results: Results per query.
+        search_depth: "basic" or "advanced".
+        api_url: API root (default: TAVILY_API_URL or the public API).
+        api_key: API key (default: TAVILY_API_KEY at call time).
+    """
+
+    def __init__(
+        self,
+        http: HTTPClientManager,
+        include_domains: Optional[Sequence[str]] = None,
+        max_results: int = 5,
+        search_depth: str = "advanced",
+        api_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+    ):
+        self.http = http
+        self.include_domains = list(include_domains or [])
+        self.max_results = max_results
+        self.search_depth = search_depth
+        self.api_url = (api_url or os.getenv("TAVILY_API_URL", DEFAULT_API_URL)).rstrip("/")
+        self.api_key = api_key
+
+    def _payload(self, query: str) -> dict:
+        api_key = self.api_key or os.getenv("TAVILY_API_KEY")
+        if not api_key:
+            raise ValueError("TAVILY_API_KEY is not set")
+        return {
+            "api_key": api_key,
+            "query": query,
+            "max_results": self.max_results,
+            "search_depth": self.search_depth,
+            "include_domains": self.include_domains,
+        }
+
+    @staticmethod
+    def _results(response) -> List[Dict]:
+        response.raise_for_status()
+        results = []
+        for result in response.json().get("results", []):
+            cleaned = {key: result.get(key) for key in ("title", "url", "content", "score")}
+            if result.get("raw_content"):
+                cleaned["raw_content"] = result["raw_content"]
+            results.append(cleaned)
+        return results
+
+    def search(self, query: str, timeout: Optional[float] = None) -> List[Dict]:
+        kwargs = {} if timeout is None else {"timeout": timeout}
+        return self._results(self.http.request("POST", f"{self.api_url}/search", json=self._payload(query), **kwargs))
+
+    async def asearch(self, query: str, timeout: Optional[float] = None) -> List[Dict]:
+        kwargs = {} if timeout is None else {"timeout": timeout}
+        response = await self.http.arequest("POST", f"{self.api_url}/search", json=self._payload(query), **kwargs)
+        return self._results(response)
+
+
+class CoalescingSearch:
+    """
+    Singleflight and TTL cache in front of a `TavilyClient`.
+
+    Args:
+        client: The search client.
+        maxsize: Cached queries (0 disables the cache; coalescing still applies).
+        ttl: Seconds a cached result stays valid.
+    """
+
+    def __init__(self, client: TavilyClient, maxsize: int = 256, ttl: float = 600.0):
+        self.client = client
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.coalesced = 0
+        self.upstream = 0
+        self.errors = 0
+
+    def key(self, query: str) -> str:
+        return cache_key(" ".join(query.lower().split()), sorted(self.client.include_domains))
+
+    def _join(self, key: str):
+        """Returns (cached result, None), (None, in-flight future) or (None, None) for the leader."""
+        with self._lock:
+            self.requests += 1
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached, None
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return None, future
+            self._inflight[key] = Future()
+            self.upstream += 1
+            return None, None
+
+    def _finish(self, key: str, result=None, error: Optional[BaseException] = None):
+        with self._lock:
+            future = self._inflight.pop(key)
+            if error is None:
+                self.cache.set(key, result)
+            else:
+                self.errors += 1
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def search(self, query: str, timeout: Optional[float] = None) -> List[Dict]:
+        """
+        Searches, or waits for an identical search in flight.
+
+        Args:
+            query: The search query.
+            timeout: Longest wait in seconds (default: the HTTP client's timeout).
+
+        Raises:
+            TimeoutError: If a coalesced search does not finish within timeout.
+        """
+        key = self.key(query)
+        cached, future = self._join(key)
+        if cached is not None:
+            return cached
+        if future is not None:
+            try:
+                return future.result(timeout)
+            except concurrent.futures.TimeoutError:
+                # A separate class before Python 3.11
+                raise TimeoutError("The coalesced search did not finish in time") from None
+        try:
+            result = self.client.search(query, timeout)
+        except Exception as e:
+            self._finish(key, error=e)
+            raise
+        self._finish(key, result)
+        return result
+
+    async def asearch(self, query: str, timeout: Optional[float] = None) -> List[Dict]:
+        """Async variant of `search`"""
+        key = self.key(query)
+        cached, future = self._join(key)
+        if cached is not None:
+            return cached
+        if future is not None:
+            # Shielded: a cancelled (or timed out) follower must not cancel the shared search
+            try:
+                return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError("The coalesced search did not finish in time") from None
+        try:
+            result = await self.client.asearch(query, timeout)
+        except asyncio.CancelledError:
+            # Followers must not wait for a search nobody finishes
+            self._finish(key, error=RuntimeError("The search was cancelled"))
+            raise
+        except Exception as e:
+            self._finish(key, error=e)
+            raise
+        self._finish(key, result)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            cache = self.cache.stats()
+            return {
+                "requests": self.requests,
+                "cache_hits": cache["hits"],
+                "coalesced": self.coalesced,
+                "upstream": self.upstream,
+                "errors": self.errors,
+                "size": cache["size"],
+                "maxsize": cache["maxsize"],
+                "ttl": cache["ttl"],
+            }
@@ -0,0 +1,277 @@
+"""
+Concurrent tool execution for the agent graph.
+
+`ToolExecutor` replaces langgraph's ToolNode. All tool calls of one model
+turn start at once, on the event loop through the tools' coroutines (or on
+worker threads when the graph is invoked synchronously), so a turn takes
+about as long as its slowest call rather than the sum. Each tool can have a
+concurrency cap, a rate limit (call starts per second) and a timeout, which
+is further capped by the run's deadline. Results come back as ToolMessages
+in the order of the calls; failures and timeouts become error ToolMessages
+instead of failing the turn.
+"""
+import asyncio
+import os
+import threading
+import time
+import weakref
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from langchain_core.tools import BaseTool
+
+from .deadline import TIMEOUT_ERRORS, bounded_timeout, deadline_scope, time_left
+
+
+def parse_tool_settings(value: Optional[str]) -> Dict[str, float]:
+    """Parses "tool=number,tool=number" into a {tool name: number} dict."""
+    settings = {}
+    for item in (value or "").split(","):
+        if "=" in item:
+            name, number = item.rsplit("=", 1)
+            settings[name.strip()] = float(number)
+    return settings
+
+
+class _RateLimiter:
+    """Spaces call starts 1/rate seconds apart, across threads and event loops."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Books the next start slot; returns the seconds to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+            return start - now
+
+
+class _Started:
+    """Handoff between a sync worker thread and the thread waiting for its result."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.timeout: Optional[float] = None
+        self.at = 0.0
+
+
+class ToolExecutor:
+    """
+    Graph node that runs a turn's tool calls concurrently.
+
+    Args:
+        tools: The tools the model may call.
+        concurrency: Calls of a tool that may run at once, by tool name
+            (unlisted tools are not capped).
+        rate_limits: Call starts per second, by tool name.
+        timeouts: Seconds a call may run, by tool name.
+        default_timeout: Timeout of tools without their own.
+        max_threads: Worker threads for synchronous invocations.
+    """
+
+    def __init__(
+        self,
+        tools: Sequence[BaseTool],
+        concurrency: Optional[Dict[str, float]] = None,
+        rate_limits: Optional[Dict[str, float]] = None,
+        timeouts: Optional[Dict[str, float]] = None,
+        default_timeout: float = 60.0,
+        max_threads: int = 32,
+    ):
+        self.tools = {tool.name: tool for tool in tools}
+        self.concurrency = {name: int(n) for name, n in (concurrency or {}).items() if n > 0}
+        self.rate_limits = {name: rate for name, rate in (rate_limits or {}).items() if rate > 0}
+        self.timeouts = dict(timeouts or {})
+        self.default_timeout = default_timeout
+        self._limiters = {name: _RateLimiter(rate) for name, rate in self.rate_limits.items()}
+        # Sync calls share thread semaphores; async ones get semaphores per event loop
+        self._thread_slots = {name: threading.BoundedSemaphore(n) for name, n in self.concurrency.items()}
+        self._loop_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._threads = ContextThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="tool")
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_env(
+        cls,
+        tools: Sequence[BaseTool],
+        concurrency: Optional[Dict[str, float]] = None,
+        rate_limits: Optional[Dict[str, float]] = None,
+        timeouts: Optional[Dict[str, float]] = None,
+    ) -> "ToolExecutor":
+        """
+        The given defaults, overridden by TOOL_CONCURRENCY, TOOL_RATE_LIMITS
+        and TOOL_TIMEOUTS ("tool=number,..."); TOOL_TIMEOUT sets the default timeout.
+        """
+        return cls(
+            tools,
+            concurrency={**(concurrency or {}), **parse_tool_settings(os.getenv("TOOL_CONCURRENCY"))},
+            rate_limits={**(rate_limits or {}), **parse_tool_settings(os.getenv("TOOL_RATE_LIMITS"))},
+            timeouts={**(timeouts or {}), **parse_tool_settings(os.getenv("TOOL_TIMEOUTS"))},
+            default_timeout=float(os.getenv("TOOL_TIMEOUT", "60")),
+        )
+
+    def timeout_for(self, name: str) -> float:
+        return self.timeouts.get(name, self.default_timeout)
+
+    # Graph node
+
+    @staticmethod
+    def _tool_calls(state) -> List[dict]:
+        return state["messages"][-1].tool_calls
+
+    def invoke(self, state, config: Optional[RunnableConfig] = None) -> dict:
+        """Runs the last message's tool calls on worker threads."""
+        with deadline_scope(state.get("deadline")):
+            calls = self._tool_calls(state)
+            jobs = [(call, _Started()) for call in calls]
+            futures = [self._threads.submit(self._run_call, call, config, started) for call, started in jobs]
+            return {"messages": [self._wait(call, started, future) for (call, started), future in zip(jobs, futures)]}
+
+    async def ainvoke(self, state, config: Optional[RunnableConfig] = None) -> dict:
+        """Runs the last message's tool calls concurrently on the running event loop."""
+        with deadline_scope(state.get("deadline")):
+            calls = self._tool_calls(state)
+            # gather keeps the order of the calls
+            return {"messages": list(await asyncio.gather(*(self._arun_call(call, config) for call in calls)))}
+
+    # Calls
+
+    def _unknown(self, call: dict) -> Optional[ToolMessage]:
+        if call["name"] in self.tools:
+            return None
+        return _error(call, f"Error: {call['name']} is not a valid tool, try one of [{', '.join(self.tools)}].")
+
+    async def _arun_call(self, call: dict, config: Optional[RunnableConfig]) -> ToolMessage:
+        unknown = self._unknown(call)
+        if unknown is not None:
+            return unknown
+        name = call["name"]
+        self._count(name, "calls")
+        slot = self._async_slots().get(name)
+        timeout = None
+        try:
+            if slot is not None:
+                # Waiting for a slot is bounded by the run's deadline only
+                await asyncio.wait_for(slot.acquire(), time_left())
+            try:
+                if name in self._limiters:
+                    await asyncio.sleep(self._limiters[name].reserve())
+                timeout = bounded_timeout(self.timeout_for(name))
+                self._enter(name)
+                try:
+                    return await asyncio.wait_for(self.tools[name].ainvoke({**call, "type": "tool_call"}, config), timeout)
+                finally:
+                    self._leave(name)
+            finally:
+                if slot is not None:
+                    slot.release()
+        except TIMEOUT_ERRORS as e:
+            return self._timed_out(call, timeout, e)
+        except Exception as e:
+            self._count(name, "errors")
+            return _error(call, f"Error: {repr(e)}\n Please fix your mistakes.")
+
+    def _run_call(self, call: dict, config: Optional[RunnableConfig], started: _Started) -> ToolMessage:
+        """Worker thread side of a sync call; `_wait` enforces its timeout."""
+        unknown = self._unknown(call)
+        if unknown is not None:
+            started.event.set()
+            return unknown
+        name = call["name"]
+        self._count(name, "calls")
+        slot = self._thread_slots.get(name)
+        left = time_left()
+        if slot is not None and not slot.acquire(timeout=None if left is None else max(left, 0.0)):
+            started.event.set()
+            raise TimeoutError("The request's time budget is used up")
+        try:
+            if name in self._limiters:
+                time.sleep(self._limiters[name].reserve())
+            try:
+                started.timeout = bounded_timeout(self.timeout_for(name))
+            finally:
+                started.at = time.monotonic()
+                started.event.set()
+            self._enter(name)
+            try:
+                return self.tools[name].invoke({**call, "type": "tool_call"}, config)
+            finally:
+                self._leave(name)
+        finally:
+            # Released when the tool returns, even after its caller gave up
+            if slot is not None:
+                slot.release()
+
+    def _wait(self, call: dict, started: _Started, future) -> ToolMessage:
+        """Waits for a sync call to start and then for at most its timeout."""
+        try:
+            started.event.wait(time_left())
+            if not started.event.is_set():
+                raise TimeoutError("The request's time budget is used up")
+            if started.timeout is None:
+                # Failed before it started (deadline or slot wait)
+                return future.result()
+            return future.result(max(0.0, started.timeout - (time.monotonic() - started.at)))
+        except TIMEOUT_ERRORS as e:
+            return self._timed_out(call, started.timeout, e)
+        except Exception as e:
+            self._count(call["name"], "errors")
+            return _error(call, f"Error: {repr(e)}\n Please fix your mistakes.")
+
+    def _timed_out(self, call: dict, timeout: Optional[float], error: Exception) -> ToolMessage:
+        self._count(call["name"], "timeouts")
+        if timeout is None or str(error):
+            return _error(call, f"Error: {call['name']} was not run: {error or 'the time budget is used up'}")
+        return _error(call, f"Error: {call['name']} did not finish within {timeout:.1f} seconds")
+
+    def _async_slots(self) -> Dict[str, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            slots = self._loop_slots.get(loop)
+            if slots is None:
+                slots = {name: asyncio.Semaphore(n) for name, n in self.concurrency.items()}
+                self._loop_slots[loop] = slots
+            return slots
+
+    # Stats
+
+    def _tool_stats(self, name: str) -> Dict[str, int]:
+        return self._stats.setdefault(name, {"calls": 0, "errors": 0, "timeouts": 0, "active": 0, "peak": 0})
+
+    def _count(self, name: str, counter: str):
+        with self._lock:
+            self._tool_stats(name)[counter] += 1
+
+    def _enter(self, name: str):
+        with self._lock:
+            stats = self._tool_stats(name)
+            stats["active"] += 1
+            stats["peak"] = max(stats["peak"], stats["active"])
+
+    def _leave(self, name: str):
+        with self._lock:
+            self._tool_stats(name)["active"] -= 1
+
+    def stats(self) -> dict:
+        """Per tool: calls, errors, timeouts, running calls and the most that ran at once."""
+        with self._lock:
+            return {
+                "tools": {name: dict(stats) for name, stats in self._stats.items()},
+                "concurrency": self.concurrency,
+                "rate_limits": self.rate_limits,
+                "timeouts": self.timeouts,
+                "default_timeout": self.default_timeout,
+            }
+
+
+def _error(call: dict, content: str) -> ToolMessage:
+    return ToolMessage(content=content, name=call["name"], tool_call_id=call["id"], status="error")
@@ -1,43 +1,220 @@
-import httpx
-from langchain_core.tools import tool
-from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
-from langchain_community.tools.tavily_search import TavilySearchResults
+import asyncio
+import json
+import os
+from functools import lru_cache
+from typing import List
+from langchain_core.tools import StructuredTool
 from dotenv import load_dotenv
+from .deadline import TIMEOUT_ERRORS, bounded_timeout
+from .http_cache import HTTPResponseCache
+from .http_client import BoundedResponse, HTTPClientManager
+from .projection import project, render, summarize
+from .tavily import CoalescingSearch, TavilyClient
 
 load_dotenv()
 
-@tool
-def http_request_tool(method: str, url: str, headers: dict = None, body: dict = None) -> str:
+# Shared keep-alive connection pool for http_request_tool
+http_client = HTTPClientManager.from_env()
+# Bytes read from a response body, and characters of it put into the history
+MAX_RESPONSE_BYTES = int(os.getenv("HTTP_MAX_RESPONSE_BYTES", str(1024 * 1024)))
+MAX_RESPONSE_CHARS = int(os.getenv("HTTP_MAX_RESPONSE_CHARS", "8000"))
+# Safe LENA API responses, revalidated with ETag/Last-Modified
+response_cache = HTTPResponseCache.from_env()
+
+def _with_lena_key(url: str) -> str:
+    """Auto-injects the LENA API key into requests to LENA_API_URL."""
+    lena_url = os.getenv("LENA_API_URL")
+    lena_key = os.getenv("LENA_API_KEY")
+
+    if lena_url and url.startswith(lena_url) and lena_key:
+        # Append key parameter
+        separator = "&" if "?" in url else "?"
+        url = f"{url}{separator}key={lena_key}"
+    return url
+
+def format_response(
+    response: BoundedResponse,
+    path: str = None,
+    fields: List[str] = None,
+    limit: int = None,
+    offset: int = 0,
+) -> str:
+    """Renders a response for the message history, projected and size-capped."""
+    notes = []
+    projecting = bool(path or fields or limit is not None or offset)
+    text = response.text
+    data = None
+    if not response.truncated and text.lstrip()[:1] in ("{", "["):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = None
+
+    if data is not None:
+        try:
+            data, notes = project(data, path, fields, limit, offset)
+        except ValueError as e:
+            notes.append(f"Projection ignored: {e}.")
+        text, cut = render(data, MAX_RESPONSE_CHARS)
+        if cut:
+            notes.append(
+                f"Truncated to {MAX_RESPONSE_CHARS} characters. {summarize(data)}. "
+                "Use path, fields, limit and offset to narrow the response."
+            )
+    else:
+        if response.truncated:
+            total = response.declared_length
+            notes.append(
+                f"Body truncated after {len(response.content)} bytes" + (f" of {total}" if total else "") + "."
+            )
+            if projecting:
+                notes.append("Projection needs the complete JSON body.")
+        elif projecting:
+            notes.append("Projection ignored: the response is not JSON.")
+        if len(text) > MAX_RESPONSE_CHARS:
+            notes.append(f"Showing the first {MAX_RESPONSE_CHARS} of {len(text)} characters.")
+            text = text[:MAX_RESPONSE_CHARS]
+
+    result = f"Status Code: {response.status_code}\nResponse: {text}"
+    if notes:
+        result += "\n[" + " ".join(notes) + "]"
+    return result
+
+def http_request(
+    method: str,
+    url: str,
+    headers: dict = None,
+    body: dict = None,
+    path: str = None,
+    fields: List[str] = None,
+    limit: int = None,
+    offset: int = 0,
+) -> str:
     """
     Executes an HTTP request.
+
+    Large responses are cut; for JSON responses, ask only for what you need
+    with path, fields, limit and offset.
     
     Args:
         method: The HTTP method (GET, POST, PUT, DELETE, etc.).
         url: The URL to send the request to.
         headers: Optional dictionary of headers.
         body: Optional dictionary for the JSON body.
+        path: Optional JSONPath-like selector, e.g. "$.apps[*]" or
+            "$.apps[?(@.status=='RUNNING')]".
+        fields: Optional keys to keep from each JSON object, e.g. ["name", "status"].
+        limit: Optional number of list items to return.
+        offset: List items to skip (for paging with limit).
         
     Returns:
         The response text or error message.
     """
     try:
-        # Auto-inject LENA API Key if applicable
-        lena_url = os.getenv("LENA_API_URL")
-        lena_key = os.getenv("LENA_API_KEY")
-        
-        if lena_url and url.startswith(lena_url) and lena_key:
-            # Append key parameter
-            separator = "&" if "?" in url else "?"
-            url = f"{url}{separator}key={lena_key}"
-            
-        response = httpx.request(method, url, headers=headers, json=body, timeout=10.0)
-        return f"Status Code: {response.status_code}\nResponse: {response.text}"
+        url = _with_lena_key(url)
+        lookup = response_cache.lookup(method, url, headers, body)
+        response = lookup.response
+        if response is None:
+            def fetch(validators):
+                # The host's timeout, or less when the run's deadline is closer
+                return http_client.fetch(
+                    method, url, MAX_RESPONSE_BYTES, headers={**(headers or {}), **validators}, json=body,
+                    timeout=bounded_timeout(http_client.timeout_for(url)),
+                )
+
+            response = response_cache.update(method, url, lookup, fetch(lookup.headers))
+            if response is None:
+                # 304 for a stored response evicted meanwhile: ask once more without validators
+                lookup = lookup._replace(headers={})
+                response = response_cache.update(method, url, lookup, fetch({}))
+        return format_response(response, path, fields, limit, offset)
     except Exception as e:
         return f"Error executing request: {str(e)}"
 
-# Initialize Tavily Search Tool with domain restrictions
-tavily_wrapper = TavilySearchAPIWrapper()
-tavily_search_tool = TavilySearchResults(
-    api_wrapper=tavily_wrapper,
-    include_domains=["docs.lenalab.org", "solution.lgcns.com"]
+async def ahttp_request(
+    method: str,
+    url: str,
+    headers: dict = None,
+    body: dict = None,
+    path: str = None,
+    fields: List[str] = None,
+    limit: int = None,
+    offset: int = 0,
+) -> str:
+    """Async variant of `http_request` on the running loop's pooled client"""
+    try:
+        url = _with_lena_key(url)
+        lookup = response_cache.lookup(method, url, headers, body)
+        response = lookup.response
+        if response is None:
+            async def fetch(validators):
+                timeout = bounded_timeout(http_client.timeout_for(url))
+                # httpx timeouts apply per read; wait_for bounds the whole exchange
+                return await asyncio.wait_for(
+                    http_client.afetch(
+                        method, url, MAX_RESPONSE_BYTES, headers={**(headers or {}), **validators}, json=body,
+                        timeout=timeout,
+                    ),
+                    timeout,
+                )
+
+            response = response_cache.update(method, url, lookup, await fetch(lookup.headers))
+            if response is None:
+                # 304 for a stored response evicted meanwhile: ask once more without validators
+                lookup = lookup._replace(headers={})
+                response = response_cache.update(method, url, lookup, await fetch({}))
+        return format_response(response, path, fields, limit, offset)
+    except TIMEOUT_ERRORS as e:
+        # asyncio.wait_for raises it without a message
+        return f"Error executing request: {str(e) or 'timed out'}"
+    except Exception as e:
+        return f"Error executing request: {str(e)}"
+
+http_request_tool = StructuredTool.from_function(
+    func=http_request,
+    coroutine=ahttp_request,
+    name="http_request_tool",
+)
+
+# Tavily Search Tool with domain restrictions, created on first use so that
+# importing the tools does not need TAVILY_API_KEY. Identical concurrent
+# queries share one API call and results are cached for TAVILY_CACHE_TTL.
+TAVILY_INCLUDE_DOMAINS = ["docs.lenalab.org", "solution.lgcns.com"]
+
+@lru_cache(maxsize=1)
+def get_tavily_search() -> CoalescingSearch:
+    return CoalescingSearch(
+        TavilyClient(http_client, include_domains=TAVILY_INCLUDE_DOMAINS),
+        maxsize=int(os.getenv("TAVILY_CACHE_SIZE", "256")),
+        ttl=float(os.getenv("TAVILY_CACHE_TTL", "600")),
+    )
+
+def tavily_search(query: str) -> str:
+    """
+    A search engine optimized for comprehensive, accurate, and trusted results.
+    Useful for answering questions about LENA and its release notes.
+
+    Args:
+        query: The search query.
+
+    Returns:
+        The search results as JSON.
+    """
+    try:
+        return json.dumps(get_tavily_search().search(query, bounded_timeout(http_client.timeout)), ensure_ascii=False)
+    except Exception as e:
+        return f"Error executing search: {str(e)}"
+
+async def atavily_search(query: str) -> str:
+    """Async variant of `tavily_search`"""
+    try:
+        search = get_tavily_search()
+        return json.dumps(await search.asearch(query, bounded_timeout(http_client.timeout)), ensure_ascii=False)
+    except Exception as e:
+        return f"Error executing search: {str(e)}"
+
+tavily_search_tool = StructuredTool.from_function(
+    func=tavily_search,
+    coroutine=atavily_search,
+    name="tavily_search_results_json",
 )
@@ -0,0 +1,407 @@
+"""
+Built-in vector index backed by a memory-mapped NumPy matrix.
+
+Embeddings are L2-normalized and stored as one contiguous row-major matrix
+(float32, float16 or int8 with per-row scales) in a flat file that is opened
+read-only with `np.memmap`, so several worker processes share the same pages.
+A JSON sidecar holds the chunk id of every row (null for deleted rows); texts
+and metadata are not duplicated here but read through a `documents` lookup,
+normally the chunk store. Search is a vectorized dot product (cosine
+similarity) followed by an `argpartition` top-k. An equality `filter` on
+metadata (e.g. {"product": "nginx"}) restricts scoring to the matching rows,
+whose positions are cached per filter.
+
+Writes never load the matrix into memory. The first change after a load
+starts a new generation of the matrix file (a file copy of the published
+one) and added rows are appended to it; deletes only mark rows dead.
+`persist()` compacts the file when dead rows outnumber live ones (streaming
+the live rows in blocks) and then atomically replaces the sidecar that points
+to the generation, so readers always see a consistent pair. Stores map their
+generation as soon as they load it, and `persist()` keeps the previous
+generation on disk, so a reader that has just read the old sidecar can still
+open its files.
+"""
+import json
+import os
+import shutil
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+SIDECAR_FILE = "index.json"
+# Version of the file layout; indexes written in another layout are rebuilt
+FORMAT_VERSION = 2
+DTYPES = ("float32", "float16", "int8")
+# Rows scored (or copied while compacting) per block, bounds the temporary
+# float32 copy for float16/int8
+SEARCH_BLOCK_ROWS = 65536
+
+DocumentLookup = Callable[[str], Optional[Document]]
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    VectorStore over a memory-mapped embedding matrix.
+
+    Args:
+        persist_directory: Directory holding the matrix files and sidecar.
+        embedding_function: Model used to embed texts and queries.
+        dtype: Storage type of the matrix: "float32", "float16" or "int8".
+        documents: Returns the text and metadata of a chunk id (e.g.
+            `ChunkStore.get`); results and metadata filters need it.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str,
+        embedding_function: Embeddings,
+        dtype: str = "float32",
+        documents: Optional[DocumentLookup] = None,
+    ):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported dtype {dtype!r}, expected one of {DTYPES}")
+        self.persist_directory = persist_directory
+        self.embedding_function = embedding_function
+        self.dtype = dtype
+        self.documents = documents
+        # Chunk id of every row of the matrix file, None for deleted rows
+        self._row_ids: List[Optional[str]] = []
+        self._positions: Dict[str, int] = {}
+        self._dim = 0
+        self._generation = None
+        # Generation being written since the last persist()
+        self._write_generation = None
+        self._matrix: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._live: Optional[np.ndarray] = None
+        self._dirty = False
+        self._filter_rows = {}
+        self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    def attach_documents(self, documents: DocumentLookup):
+        """Sets the lookup that resolves chunk ids to their text and metadata."""
+        self.documents = documents
+        self._filter_rows = {}
+
+    # Storage
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.persist_directory, name)
+
+    def _load(self):
+        try:
+            with open(self._path(SIDECAR_FILE), "r", encoding="utf-8") as f:
+                sidecar = json.load(f)
+        except (OSError, ValueError):
+            return
+        if sidecar.get("dtype") != self.dtype or sidecar.get("format") != FORMAT_VERSION:
+            # Stored with another dtype or layout; the index will be rebuilt
+            return
+        self._row_ids = sidecar["rows"]
+        self._positions = {cid: row for row, cid in enumerate(self._row_ids) if cid is not None}
+        self._dim = sidecar["dim"]
+        self._generation = sidecar["generation"]
+        self._write_generation = None
+        self._changed()
+        # Map now: persist() in another process only keeps the previous generation
+        try:
+            self._map()
+        except OSError as e:
+            print(f"[RAG] Could not map vector index generation {self._generation}, it will be rebuilt: {e}")
+            self._row_ids = []
+            self._positions = {}
+            self._generation = None
+            self._changed()
+
+    def _changed(self):
+        """Drops the mapping and row caches after the rows changed."""
+        self._matrix = None
+        self._scales = None
+        self._live = None
+        self._filter_rows = {}
+
+    def _map(self):
+        """Maps the current rows read-only (the generation being written, if any)."""
+        if self._matrix is None and self._row_ids:
+            generation = self._write_generation or self._generation
+            shape = (len(self._row_ids), self._dim)
+            self._matrix = np.memmap(
+                self._path(f"vectors-{generation}.bin"), dtype=self.dtype, mode="r", shape=shape
+            )
+            if self.dtype == "int8":
+                self._scales = np.memmap(
+                    self._path(f"scales-{generation}.bin"), dtype="float32", mode="r", shape=(shape[0],)
+                )
+        if self._live is None:
+            self._live = np.fromiter((cid is not None for cid in self._row_ids), dtype=bool, count=len(self._row_ids))
+
+    def _start_generation(self, copy: bool = True):
+        """Starts writing a new generation, from a copy of the published files."""
+        if self._write_generation is not None:
+            return
+        os.makedirs(self.persist_directory, exist_ok=True)
+        generation = uuid.uuid4().hex[:12]
+        for prefix in ("vectors", "scales"):
+            source = self._path(f"{prefix}-{self._generation}.bin")
+            target = self._path(f"{prefix}-{generation}.bin")
+            if copy and self._row_ids and os.path.exists(source):
+                shutil.copyfile(source, target)
+            elif prefix == "vectors" or self.dtype == "int8":
+                open(target, "wb").close()
+        self._write_generation = generation
+        self._changed()
+
+    def _compact(self):
+        """Rewrites the live rows into a new generation, block by block."""
+        self._map()
+        live_rows = np.flatnonzero(self._live)
+        generation = uuid.uuid4().hex[:12]
+        with open(self._path(f"vectors-{generation}.bin"), "wb") as f:
+            for start in range(0, len(live_rows), SEARCH_BLOCK_ROWS):
+                np.ascontiguousarray(self._matrix[live_rows[start:start + SEARCH_BLOCK_ROWS]]).tofile(f)
+        if self._scales is not None:
+            with open(self._path(f"scales-{generation}.bin"), "wb") as f:
+                np.asarray(self._scales[live_rows]).tofile(f)
+        self._row_ids = [self._row_ids[row] for row in live_rows]
+        self._positions = {cid: row for row, cid in enumerate(self._row_ids)}
+        self._write_generation = generation
+        self._changed()
+
+    def persist(self):
+        """Publishes pending changes as a new generation of the index files."""
+        if not self._dirty:
+            return
+        os.makedirs(self.persist_directory, exist_ok=True)
+        dead = len(self._row_ids) - len(self._positions)
+        if dead and dead >= len(self._positions):
+            self._compact()
+        if not self._positions:
+            self._row_ids = []
+        generation = self._write_generation or self._generation or uuid.uuid4().hex[:12]
+        sidecar = {
+            "format": FORMAT_VERSION,
+            "dtype": self.dtype,
+            "dim": self._dim,
+            "generation": generation,
+            "rows": self._row_ids,
+        }
+        tmp_path = self._path(f"{SIDECAR_FILE}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(sidecar, f)
+        os.replace(tmp_path, self._path(SIDECAR_FILE))
+
+        # Keep the previous generation for readers that loaded its sidecar but
+        # have not mapped it yet; older ones are only held open by readers
+        # that already mapped them
+        keep = {generation, self._generation}
+        for name in os.listdir(self.persist_directory):
+            prefix, _, rest = name.partition("-")
+            if prefix in ("vectors", "scales") and name.endswith(".bin") and rest[:-len(".bin")] not in keep:
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    pass
+        self._generation = generation
+        self._write_generation = None
+        self._dirty = False
+        self._changed()
+        self._map()
+
+    def reset_collection(self):
+        """Removes every vector (published on the next `persist()`)."""
+        self._row_ids = []
+        self._positions = {}
+        self._dim = 0
+        self._write_generation = None
+        self._dirty = True
+        self._changed()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    # Mutation
+
+    def _encode(self, vectors: List[List[float]]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        rows = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        rows = rows / np.where(norms == 0, 1, norms)
+        if self.dtype == "int8":
+            scales = np.abs(rows).max(axis=1) / 127
+            scales = np.where(scales == 0, 1, scales).astype(np.float32)
+            return np.round(rows / scales[:, None]).astype(np.int8), scales
+        return rows.astype(self.dtype), None
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        """
+        Embeds texts and appends their rows to the matrix file.
+
+        Only the vectors are stored; results carry the text and metadata
+        returned by the `documents` lookup.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+        # Re-adding an id replaces it
+        self.delete([i for i in ids if i in self._positions])
+
+        rows, scales = self._encode(self.embedding_function.embed_documents(texts))
+        if not self._positions:
+            # Nothing live to keep: start over instead of copying dead rows
+            self._row_ids = []
+            self._write_generation = None
+            self._start_generation(copy=False)
+        else:
+            self._start_generation()
+        self._dim = rows.shape[1]
+        with open(self._path(f"vectors-{self._write_generation}.bin"), "ab") as f:
+            rows.tofile(f)
+        if scales is not None:
+            with open(self._path(f"scales-{self._write_generation}.bin"), "ab") as f:
+                scales.tofile(f)
+        for cid in ids:
+            self._positions[cid] = len(self._row_ids)
+            self._row_ids.append(cid)
+        self._dirty = True
+        self._changed()
+        return ids
+
+    def add_documents(self, documents: List[Document], **kwargs: Any) -> List[str]:
+        return self.add_texts(
+            [d.page_content for d in documents], [d.metadata for d in documents], ids=kwargs.get("ids")
+        )
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Marks the rows of ids dead; `persist()` compacts them away eventually."""
+        dropped = [self._positions.pop(cid) for cid in ids or [] if cid in self._positions]
+        if not dropped:
+            return True
+        for row in dropped:
+            self._row_ids[row] = None
+        self._dirty = True
+        self._live = None
+        self._filter_rows = {}
+        return True
+
+    # Search
+
+    def _document(self, cid: str) -> Document:
+        doc = self.documents(cid) if self.documents else None
+        if doc is None:
+            return Document(id=cid, page_content="", metadata={})
+        return Document(id=cid, page_content=doc.page_content, metadata=dict(doc.metadata))
+
+    def _rows(self, filter: Optional[dict]) -> Optional[np.ndarray]:
+        """Positions of the live rows whose metadata matches every filter entry (None: all rows)."""
+        if not filter:
+            return None
+        key = tuple(sorted(filter.items()))
+        rows = self._filter_rows.get(key)
+        if rows is None:
+            matches = []
+            for row, cid in enumerate(self._row_ids):
+                doc = self.documents(cid) if cid is not None and self.documents else None
+                if doc is not None and all(doc.metadata.get(k) == v for k, v in key):
+                    matches.append(row)
+            rows = np.array(matches, dtype=np.int64)
+            self._filter_rows[key] = rows
+        return rows
+
+    def _scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        if rows is not None:
+            # Only the matching rows are read from the memory map
+            block = np.asarray(self._matrix[rows], dtype=np.float32)
+            scores = block @ query
+            return scores * self._scales[rows] if self._scales is not None else scores
+        if self.dtype == "float32":
+            scores = np.asarray(self._matrix @ query)
+        else:
+            scores = np.empty(len(self._row_ids), dtype=np.float32)
+            for start in range(0, len(self._row_ids), SEARCH_BLOCK_ROWS):
+                block = np.asarray(self._matrix[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+                scores[start:start + len(block)] = block @ query
+            if self._scales is not None:
+                scores *= self._scales
+        # Deleted rows never rank
+        scores[~self._live] = -np.inf
+        return scores
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None
+    ) -> List[Tuple[Document, float]]:
+        if not self._positions:
+            return []
+        self._map()
+        rows = self._rows(filter)
+        if rows is not None and not len(rows):
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        scores = self._scores(query, rows)
+        k = min(k, len(self._positions) if rows is None else len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        positions = top if rows is None else rows[top]
+        return [
+            (self._document(self._row_ids[row]), float(score)) for row, score in zip(positions, scores[top])
+        ]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k, filter)
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities in [-1, 1]
+        return lambda score: (score + 1) / 2
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        persist_directory: str = "./vector_index",
+        dtype: str = "float32",
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        """Builds an index; without a `documents` lookup the texts are kept in memory to resolve results."""
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+        documents = kwargs.get("documents")
+        if documents is None:
+            by_id = {
+                cid: Document(page_content=text, metadata=meta)
+                for cid, text, meta in zip(ids, texts, metadatas or [{} for _ in texts])
+            }
+            documents = by_id.get
+        store = cls(persist_directory, embedding, dtype=dtype, documents=documents)
+        store.add_texts(texts, metadatas, ids=ids)
+        store.persist()
+        return store
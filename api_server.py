@@ -1,22 +1,46 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
-from agent.graph import app as agent_app
+from agent.graph import app as agent_app, cacheable, index_manager, readiness, start_background_init, tool_executor
+from agent.deadline import ainvoke_with_deadline
+from agent.context7 import context7_pool, get_context7_cache
+from agent.tools import get_tavily_search, http_client, response_cache
+from agent.semantic_cache import build_semantic_cache
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 import uvicorn
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
+import asyncio
+import hmac
+import os
 import time
 
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The document index builds in the background; the server accepts
+    # connections immediately and reports readiness on / and /ready
+    start_background_init()
+    # Context7 MCP servers start once and are shared by every request
+    context7_pool.start()
+    yield
+    context7_pool.stop()
+    await http_client.aclose()
+    index_manager.stop_watcher()
+
 # Initialize FastAPI
 api = FastAPI(
     title="LENA Agent API",
     description="OpenAI-compatible API for LENA Agent",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Optional semantic answer cache (SEMANTIC_CACHE_ENABLED=true)
+semantic_cache = build_semantic_cache()
+
 # Enable CORS
 api.add_middleware(
     CORSMiddleware,
@@ -45,16 +69,70 @@ class ChatCompletionResponse(BaseModel):
     model: str
     choices: List[dict]
     usage: dict
+    cache: Optional[dict] = None
+
+
+def single_turn_question(messages: List[Message]) -> Optional[str]:
+    """Returns the question if the conversation is a single user message."""
+    if len(messages) == 1 and messages[0].role == "user":
+        return messages[0].content
+    return None
+
+
+def cache_bypassed(http_request: Request) -> bool:
+    """True if the client asked to skip the semantic cache."""
+    bypass = http_request.headers.get("x-cache-bypass", "").lower() in ("1", "true", "yes")
+    return bypass or "no-cache" in http_request.headers.get("cache-control", "").lower()
+
+
+def build_completion(model: str, content: str, cache: Optional[dict] = None) -> ChatCompletionResponse:
+    """Builds an OpenAI-compatible chat completion response."""
+    return ChatCompletionResponse(
+        id=f"chatcmpl-{int(time.time())}",
+        created=int(time.time()),
+        model=model,
+        choices=[
+            {
+                "index": 0,
+                "message": {
+                    "role": "assistant",
+                    "content": content
+                },
+                "finish_reason": "stop"
+            }
+        ],
+        usage={
+            "prompt_tokens": 0,  # Not tracked in this implementation
+            "completion_tokens": 0,
+            "total_tokens": 0
+        },
+        cache=cache,
+    )
 
 @api.get("/")
 async def root():
-    """Health check endpoint"""
+    """
+    Health check endpoint.
+
+    `live` is true whenever the process answers; `ready` turns true once the
+    document index is built (or right away in degraded mode, RAG_DEGRADED_MODE).
+    """
     return {
         "status": "ok",
         "service": "LENA Agent API",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "live": True,
+        **readiness()
     }
 
+@api.get("/ready")
+async def ready(response: Response):
+    """Readiness probe: 200 once requests can be served, 503 before"""
+    state = readiness()
+    if not state["ready"]:
+        response.status_code = 503
+    return state
+
 @api.get("/v1/models")
 async def list_models():
     """List available models (OpenAI-compatible)"""
@@ -70,10 +148,65 @@ async def list_models():
         ]
     }
 
+def check_admin_token(token: Optional[str]):
+    """Rejects admin calls without the ADMIN_TOKEN; admin routes are off when it is unset."""
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not token or not hmac.compare_digest(token.encode("utf-8"), expected.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@api.get("/admin/index")
+async def index_status(x_admin_token: Optional[str] = Header(None)):
+    """Document index status: version, last refresh and retrieval cache stats"""
+    check_admin_token(x_admin_token)
+    return index_manager.status()
+
+@api.get("/admin/context7")
+async def context7_status(x_admin_token: Optional[str] = Header(None)):
+    """Context7 session pool and answer cache stats"""
+    check_admin_token(x_admin_token)
+    cache = get_context7_cache()
+    return {"pool": context7_pool.stats(), "cache": cache.stats() if cache else None}
+
+@api.get("/admin/http")
+async def http_status(x_admin_token: Optional[str] = Header(None)):
+    """http_request_tool stats: reused connections and the LENA response cache"""
+    check_admin_token(x_admin_token)
+    return {**http_client.stats(), "cache": response_cache.stats()}
+
+@api.get("/admin/tavily")
+async def tavily_status(x_admin_token: Optional[str] = Header(None)):
+    """Tavily search stats: cache hits, coalesced queries and upstream calls"""
+    check_admin_token(x_admin_token)
+    return get_tavily_search().stats()
+
+@api.get("/admin/tools")
+async def tools_status(x_admin_token: Optional[str] = Header(None)):
+    """Tool executor stats: calls, errors, timeouts and peak concurrency per tool"""
+    check_admin_token(x_admin_token)
+    return tool_executor.stats()
+
+@api.post("/admin/reindex")
+async def reindex(force_rebuild: bool = False, x_admin_token: Optional[str] = Header(None)):
+    """
+    Picks up changes in docs/ without a restart.
+
+    The index is synced in a worker thread and the live retriever is swapped
+    atomically; in-flight queries finish on the previous one.
+    """
+    check_admin_token(x_admin_token)
+    stats = await asyncio.to_thread(index_manager.refresh, force_rebuild)
+    return {"status": "ok", **stats}
+
 @api.post("/v1/chat/completions")
-async def chat_completions(request: ChatCompletionRequest):
+async def chat_completions(request: ChatCompletionRequest, http_request: Request, http_response: Response):
     """
     OpenAI-compatible chat completions endpoint.
+
+    Single-turn questions may be answered from the semantic cache; such
+    responses carry `"cache": {"hit": true, ...}` and an `X-Semantic-Cache: hit`
+    header. Send `X-Cache-Bypass: true` (or `Cache-Control: no-cache`) to skip it.
     
     Example request:
     {
@@ -83,6 +216,19 @@ async def chat_completions(request: ChatCompletionRequest):
     }
     """
     try:
+        question = single_turn_question(request.messages)
+        use_cache = semantic_cache is not None and question is not None and not cache_bypassed(http_request)
+        if use_cache:
+            hit = await semantic_cache.aget(question)
+            if hit:
+                http_response.headers["X-Semantic-Cache"] = "hit"
+                return build_completion(
+                    request.model,
+                    hit.answer,
+                    cache={"hit": True, "similarity": round(hit.similarity, 4)},
+                )
+            http_response.headers["X-Semantic-Cache"] = "miss"
+
         # Convert request messages to LangChain format
         lc_messages = []
         for msg in request.messages:
@@ -93,39 +239,25 @@ async def chat_completions(request: ChatCompletionRequest):
             elif msg.role == "assistant":
                 lc_messages.append(AIMessage(content=msg.content))
         
-        # Invoke the agent
+        # Invoke the agent; it answers within AGENT_RUN_TIMEOUT seconds
         inputs = {"messages": lc_messages}
-        result = await agent_app.ainvoke(inputs)
+        try:
+            result = await ainvoke_with_deadline(agent_app, inputs)
+        except TimeoutError:
+            raise HTTPException(status_code=504, detail="The agent did not answer in time")
         
         # Extract the final response
         final_message = result["messages"][-1]
         response_content = final_message.content
         
-        # Build OpenAI-compatible response
-        completion_id = f"chatcmpl-{int(time.time())}"
-        response = ChatCompletionResponse(
-            id=completion_id,
-            created=int(time.time()),
-            model=request.model,
-            choices=[
-                {
-                    "index": 0,
-                    "message": {
-                        "role": "assistant",
-                        "content": response_content
-                    },
-                    "finish_reason": "stop"
-                }
-            ],
-            usage={
-                "prompt_tokens": 0,  # Not tracked in this implementation
-                "completion_tokens": 0,
-                "total_tokens": 0
-            }
-        )
-        
-        return response
+        # Answers cut short by the deadline or built from live data are not cached
+        if use_cache and response_content and cacheable(result["messages"]):
+            await semantic_cache.aput(question, response_content)
+
+        return build_completion(request.model, response_content)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,242 @@
+"""
+Offline retrieval benchmark for the RAG pipeline.
+
+Builds the index from a synthetic corpus (or a fixture directory) with the
+deterministic HashingEmbeddings, replays a labeled query set and reports
+per-stage latency percentiles (BM25, vector, fusion, rerank), index build
+time, memory and retrieval quality (recall@k, MRR) as JSON.
+
+Usage:
+    python bench_rag.py                               # synthetic corpus
+    python bench_rag.py --docs 2000 --backend numpy   # larger, numpy backend
+    python bench_rag.py --corpus-dir fixtures/ --output bench.json
+    python bench_rag.py --bm25 rank_bm25              # previous keyword engine (pip install -e .[bench])
+
+A fixture directory holds the documents plus a queries.json file:
+    [{"query": "...", "relevant": ["relative/path/of/doc.txt", ...]}, ...]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from langchain_community.retrievers import BM25Retriever
+
+from agent.embeddings import HashingEmbeddings
+from agent.ingest import ChunkStore
+from agent.rag import HybridRetriever, build_bm25_shards, sync_index
+from agent.rerank import BatchedRerank, RerankService
+from agent.sparse import SparseRetriever, get_tokenizer
+from agent.vectorstore import NumpyVectorStore
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PRODUCTS = ["lena", "apache", "nginx", "tomcat"]
+TOPICS = [
+    "install", "upgrade", "cluster", "session", "ssl", "logging", "monitoring", "license",
+    "connector", "thread", "proxy", "cache", "security", "backup", "deploy", "memory",
+]
+FILLER = (
+    "the server configuration file controls how requests are handled and which modules "
+    "are loaded at startup while administrators review settings before applying changes "
+    "to production systems and verify the results in the management console"
+).split()
+
+
+def _pseudo_word(rng: random.Random) -> str:
+    return "".join(rng.choice("bcdfghjklmnprstvz") + rng.choice("aeiou") for _ in range(3))
+
+
+def build_synthetic_corpus(docs_dir: str, num_docs: int, seed: int = 42) -> List[dict]:
+    """Writes num_docs synthetic documents and returns one labeled query per document."""
+    rng = random.Random(seed)
+    queries = []
+    for i in range(num_docs):
+        product = PRODUCTS[i % len(PRODUCTS)]
+        topic = rng.choice(TOPICS)
+        key = _pseudo_word(rng)
+        path = os.path.join(product, f"{topic}_{i}.txt")
+        body = [f"{product} {topic} guide for {key}."]
+        for _ in range(rng.randint(5, 30)):
+            body.append(" ".join(rng.choice(FILLER) for _ in range(rng.randint(8, 20))) + ".")
+        body.insert(rng.randint(1, len(body)), f"The {key} option of {product} affects {topic} behaviour.")
+        os.makedirs(os.path.join(docs_dir, product), exist_ok=True)
+        with open(os.path.join(docs_dir, path), "w", encoding="utf-8") as f:
+            f.write("\n".join(body))
+        queries.append({"query": f"how to set {key} for {product} {topic}", "relevant": [path]})
+    return queries
+
+
+def lexical_scorer_factory():
+    """Offline stand-in for the cross-encoder: word-overlap scoring."""
+    def score(pairs):
+        return [len(set(q.lower().split()) & set(t.lower().split())) / (1 + len(q.split())) for q, t in pairs]
+    return score
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    return {
+        "p50_ms": round(pick(50), 3),
+        "p95_ms": round(pick(95), 3),
+        "p99_ms": round(pick(99), 3),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+
+
+def max_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor, 1)
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def run_benchmark(args) -> dict:
+    work_dir = tempfile.mkdtemp(prefix="lena-bench-")
+    try:
+        if args.corpus_dir:
+            docs_dir = args.corpus_dir
+            with open(os.path.join(docs_dir, "queries.json"), "r", encoding="utf-8") as f:
+                queries = json.load(f)
+        else:
+            docs_dir = os.path.join(work_dir, "docs")
+            queries = build_synthetic_corpus(docs_dir, args.docs, args.seed)
+        persist_dir = os.path.join(work_dir, "index")
+        embedding = HashingEmbeddings(size=args.dim)
+
+        # Index build
+        start = time.perf_counter()
+        vectorstore, stats = sync_index(docs_dir, persist_dir, embedding=embedding, vector_backend=args.backend)
+        vector_build = time.perf_counter() - start
+        start = time.perf_counter()
+        documents = ChunkStore.load(persist_dir).documents()
+        if args.bm25 == "rank_bm25":
+            bm25 = BM25Retriever.from_documents(documents)
+            bm25.k = args.k
+        else:
+            tokenizer = get_tokenizer(args.tokenizer)
+            index = build_bm25_shards(documents, tokenizer)[None]
+            bm25 = SparseRetriever(index=index, documents=documents, tokenizer=tokenizer, k=args.k)
+        bm25_build = time.perf_counter() - start
+
+        if isinstance(vectorstore, NumpyVectorStore):
+            # The numpy backend resolves hits through the chunk store
+            by_id = {doc.metadata["chunk_id"]: doc for doc in documents}
+            vectorstore.attach_documents(by_id.get)
+        vector = vectorstore.as_retriever(search_kwargs={"k": args.k})
+        hybrid = HybridRetriever(retrievers=[bm25, vector], weights=[0.5, 0.5])
+        reranker = None
+        if args.rerank:
+            service = RerankService(lexical_scorer_factory).load()
+            reranker = BatchedRerank(service=service, max_candidates=args.rerank_candidates, top_n=args.k)
+
+        # Query replay
+        timings = {"bm25": [], "vector": [], "fusion": [], "rerank": [], "total": []}
+        recall_hits, reciprocal_ranks = 0.0, 0.0
+        for item in queries[:args.queries] if args.queries else queries:
+            query = item["query"]
+            relevant = {os.path.join(docs_dir, r) for r in item["relevant"]}
+
+            t0 = time.perf_counter()
+            bm25_docs = bm25.invoke(query)
+            t1 = time.perf_counter()
+            vector_docs = vector.invoke(query)
+            t2 = time.perf_counter()
+            scores, all_docs = {}, {}
+            hybrid._fuse(scores, all_docs, bm25_docs, 0)
+            hybrid._fuse(scores, all_docs, vector_docs, 1)
+            docs = hybrid._ranked(scores, all_docs)
+            t3 = time.perf_counter()
+            if reranker:
+                docs = list(reranker.compress_documents(docs, query))
+            t4 = time.perf_counter()
+
+            timings["bm25"].append(t1 - t0)
+            timings["vector"].append(t2 - t1)
+            timings["fusion"].append(t3 - t2)
+            if reranker:
+                timings["rerank"].append(t4 - t3)
+            timings["total"].append(t4 - t0)
+
+            sources = [d.metadata.get("source") for d in docs[:args.k]]
+            found = [i for i, s in enumerate(sources) if s in relevant]
+            recall_hits += len(relevant & set(sources)) / len(relevant)
+            reciprocal_ranks += 1 / (found[0] + 1) if found else 0.0
+
+        num_queries = len(timings["total"])
+        return {
+            "config": {
+                "backend": args.backend,
+                "bm25": args.bm25 if args.bm25 == "rank_bm25" else f"sparse:{bm25.tokenizer.name}",
+                "vector_dtype": os.getenv("RAG_VECTOR_DTYPE", "float32") if args.backend == "numpy" else None,
+                "k": args.k,
+                "rerank": args.rerank,
+                "embedding_dim": args.dim,
+                "corpus": args.corpus_dir or f"synthetic:{args.docs}:seed={args.seed}",
+            },
+            "index": {
+                "files": stats["files_changed"],
+                "chunks": stats["chunks_added"],
+                "vector_build_s": round(vector_build, 3),
+                "bm25_build_s": round(bm25_build, 3),
+                "disk_bytes": directory_size(persist_dir),
+            },
+            "latency": {stage: percentiles(samples) for stage, samples in timings.items() if samples},
+            "quality": {
+                "queries": num_queries,
+                f"recall@{args.k}": round(recall_hits / num_queries, 4) if num_queries else 0.0,
+                "mrr": round(reciprocal_ranks / num_queries, 4) if num_queries else 0.0,
+            },
+            "memory": {"max_rss_mb": max_rss_mb()},
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline RAG retrieval benchmark")
+    parser.add_argument("--docs", type=int, default=200, help="Synthetic documents to generate (default: 200)")
+    parser.add_argument("--queries", type=int, default=0, help="Replay only the first N queries (default: all)")
+    parser.add_argument("--corpus-dir", type=str, default=None, help="Fixture corpus with queries.json")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="chroma", help="Vector backend")
+    parser.add_argument("--bm25", choices=["sparse", "rank_bm25"], default="sparse", help="Keyword engine")
+    parser.add_argument("--tokenizer", type=str, default=None, help="Sparse tokenizer: word, ngram or kiwi")
+    parser.add_argument("--k", type=int, default=5, help="Results per retriever and for recall@k (default: 5)")
+    parser.add_argument("--dim", type=int, default=256, help="Fake embedding dimension (default: 256)")
+    parser.add_argument("--rerank", action="store_true", help="Include an (offline, lexical) rerank stage")
+    parser.add_argument("--rerank-candidates", type=int, default=20, help="Candidates scored by the reranker")
+    parser.add_argument("--seed", type=int, default=42, help="Synthetic corpus seed")
+    parser.add_argument("--output", type=str, default=None, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
 from mcp.server.fastmcp import FastMCP
-from agent.graph import app
+from agent.graph import TIMEOUT_ANSWER, app, cacheable, start_background_init
+from agent.context7 import context7_pool
+from agent.deadline import ainvoke_with_deadline
+from agent.semantic_cache import build_semantic_cache
 from langchain_core.messages import HumanMessage
+import logging
 import os
 from dotenv import load_dotenv
 
@@ -8,26 +12,52 @@ load_dotenv()
 
 # Initialize FastMCP server
 mcp = FastMCP("LENA Agent")
+logger = logging.getLogger(__name__)
+
+# Optional semantic answer cache (SEMANTIC_CACHE_ENABLED=true)
+semantic_cache = build_semantic_cache()
 
 @mcp.tool()
-async def ask_agent(query: str) -> str:
+async def ask_agent(query: str, bypass_cache: bool = False) -> str:
     """
     Asks the LangGraph agent a question. The agent has access to documentation (RAG) and HTTP tools.
     
     Args:
         query: The question or command for the agent.
+        bypass_cache: If True, skip the semantic answer cache.
         
     Returns:
         The agent's final response.
     """
+    use_cache = semantic_cache is not None and not bypass_cache
+    if use_cache:
+        hit = await semantic_cache.aget(query)
+        if hit:
+            logger.debug("Semantic cache hit (similarity %.3f)", hit.similarity)
+            return f"[Cached answer, similarity {hit.similarity:.3f}]\n\n{hit.answer}"
+
     inputs = {"messages": [HumanMessage(content=query)]}
-    result = await app.ainvoke(inputs)
-    return result["messages"][-1].content
+    try:
+        # The agent answers within AGENT_RUN_TIMEOUT seconds
+        result = await ainvoke_with_deadline(app, inputs)
+    except TimeoutError:
+        return TIMEOUT_ANSWER
+    final_message = result["messages"][-1]
+    answer = final_message.content
+    # Answers cut short by the deadline or built from live data are not cached
+    if use_cache and answer and cacheable(result["messages"]):
+        await semantic_cache.aput(query, answer)
+    return answer
 
 if __name__ == "__main__":
+    # Build the document index in the background while the server starts
+    start_background_init()
+    context7_pool.start()
     mcp.run()
 
 def main():
     """Entry point for CLI command: lena-agent"""
+    start_background_init()
+    context7_pool.start()
     mcp.run()
 
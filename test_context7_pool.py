@@ -0,0 +1,235 @@
+"""
+Offline tests for the MCP session pool used by the Context7 tool.
+
+The pool talks to a stub MCP server: this file run with --stub-server, a
+minimal newline-delimited JSON-RPC loop over stdio.
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+
+def run_stub_server():
+    """Answers initialize, tools/list, ping and tools/call ("slow" sleeps, "crash" exits)."""
+    log = os.environ.get("STUB_LOG")
+    write_lock = threading.Lock()
+
+    def emit(message):
+        with write_lock:
+            sys.stdout.write(json.dumps(message) + "\n")
+            sys.stdout.flush()
+
+    def call(request):
+        query = request["params"]["arguments"]["query"]
+        if query == "crash":
+            os._exit(1)
+        if query.startswith("slow"):
+            time.sleep(0.5)
+        content = [{"type": "text", "text": f"echo {query}"}]
+        emit({"jsonrpc": "2.0", "id": request["id"], "result": {"content": content, "isError": False}})
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        method = request.get("method")
+        if log:
+            with open(log, "a") as f:
+                f.write(f"{os.getpid()} {method}\n")
+        if "id" not in request:
+            continue
+        if method == "initialize":
+            result = {
+                "protocolVersion": request["params"]["protocolVersion"],
+                "capabilities": {"tools": {}},
+                "serverInfo": {"name": "stub", "version": "0"},
+            }
+        elif method == "tools/list":
+            schema = {"type": "object", "properties": {"query": {"type": "string"}}}
+            result = {"tools": [{"name": "search-docs", "description": "Stub search", "inputSchema": schema}]}
+        elif method == "tools/call":
+            # Calls are answered concurrently, like a real server
+            threading.Thread(target=call, args=(request,), daemon=True).start()
+            continue
+        elif method == "ping":
+            result = {}
+        else:
+            emit({"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32601, "message": method}})
+            continue
+        emit({"jsonrpc": "2.0", "id": request["id"], "result": result})
+
+
+def _pool(log_path, size=1):
+    from mcp import StdioServerParameters
+    from agent.mcp_pool import MCPSessionPool
+
+    params = StdioServerParameters(
+        command=sys.executable,
+        args=[os.path.abspath(__file__), "--stub-server"],
+        env={**os.environ, "STUB_LOG": log_path},
+    )
+    return MCPSessionPool(params, size=size, name="Stub", restart_delay=0.1)
+
+
+def _log(log_path):
+    with open(log_path) as f:
+        return [line.split() for line in f]
+
+
+def test_pool_reuses_sessions_and_multiplexes_calls():
+    from agent.context7 import context7_sync_wrapper, query_context7
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "stub.log")
+        pool = _pool(log_path, size=1).start()
+        try:
+            assert context7_sync_wrapper("apache", pool) == "echo apache"
+            assert asyncio.run(query_context7("nginx", pool)) == "echo nginx"
+
+            # Eight slow calls share the single session concurrently
+            async def many():
+                return await asyncio.gather(*(pool.acall_tool("search-docs", {"query": f"slow{i}"}) for i in range(8)))
+
+            start = time.perf_counter()
+            results = asyncio.run(many())
+            assert time.perf_counter() - start < 2.0
+            assert [r.content[0].text for r in results] == [f"echo slow{i}" for i in range(8)]
+            assert pool.stats()["calls"] == 10
+        finally:
+            pool.stop()
+
+        entries = _log(log_path)
+        # One process, initialized and asked for its tools exactly once
+        assert len({pid for pid, _ in entries}) == 1
+        assert sum(1 for _, method in entries if method == "initialize") == 1
+        assert sum(1 for _, method in entries if method == "tools/list") == 1
+
+
+def test_async_lookup_timeout_and_cancellation():
+    from agent.context7 import query_context7
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = _pool(os.path.join(tmp, "stub.log")).start()
+        try:
+            async def scenario():
+                # Runs on this loop; the slow call is abandoned at the deadline
+                timed_out = False
+                try:
+                    await query_context7("slow", pool, timeout=0.2)
+                except TimeoutError:
+                    timed_out = True
+                assert timed_out
+
+                # Cancelling the caller cancels the in-flight MCP request
+                task = asyncio.create_task(query_context7("slow", pool))
+                await asyncio.sleep(0.1)
+                assert pool.stats()["inflight"] == 1
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                await asyncio.sleep(0.05)
+                assert pool.stats()["inflight"] == 0
+                return await query_context7("fast", pool)
+
+            assert asyncio.run(scenario()) == "echo fast"
+        finally:
+            pool.stop()
+
+
+def test_pool_restarts_crashed_server():
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "stub.log")
+        pool = _pool(log_path, size=2).start()
+        try:
+            assert pool.call_tool("search-docs", {"query": "before"}).content[0].text == "echo before"
+            # The call kills its server, and the retry kills the other one
+            failed = False
+            try:
+                pool.call_tool("search-docs", {"query": "crash"}, timeout=10)
+            except Exception:
+                failed = True
+            assert failed
+            # The crashed processes are replaced and serve new calls
+            assert pool.call_tool("search-docs", {"query": "after"}, timeout=10).content[0].text == "echo after"
+            assert pool.stats()["restarts"] >= 1
+        finally:
+            pool.stop()
+        assert not pool.running
+
+        # Both servers died and were replaced
+        assert len({pid for pid, _ in _log(log_path)}) >= 3
+
+
+def test_sqlite_cache_ttl_lru_and_sharing():
+    from agent.cache import SQLiteTTLCache, cache_key
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.sqlite")
+        cache = SQLiteTTLCache(path, maxsize=2, ttl=0.2, stale_ttl=0.3)
+        assert cache_key("t", {"a": 1, "b": 2}) == cache_key("t", {"b": 2, "a": 1})
+        cache.set("a", "1")
+        cache.set("b", "2")
+        assert cache.lookup("a") == ("1", True)
+        # "b" is least recently used and gets evicted
+        cache.set("c", "3")
+        assert cache.lookup("b") is None
+        # Another process opening the same file sees the entries
+        other = SQLiteTTLCache(path, maxsize=2, ttl=0.2, stale_ttl=0.3)
+        assert other.get("c") == "3"
+
+        time.sleep(0.25)
+        assert cache.lookup("a") == ("1", False)
+        assert cache.get("a") is None
+        time.sleep(0.3)
+        assert cache.lookup("a") is None
+        assert cache.stats()["stale_hits"] == 2
+        other.close()
+        cache.close()
+
+
+def test_context7_cache_hits_and_revalidates():
+    from agent.cache import SQLiteTTLCache
+    from agent.context7 import context7_sync_wrapper, query_context7
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "stub.log")
+        cache = SQLiteTTLCache(os.path.join(tmp, "context7.sqlite"), ttl=0.3, stale_ttl=60)
+        pool = _pool(log_path).start()
+        try:
+            assert asyncio.run(query_context7("Apache  Config", pool, cache=cache)) == "echo Apache  Config"
+            # Normalized arguments hit the cache, from sync and async callers
+            assert context7_sync_wrapper("apache config", pool, cache=cache) == "echo Apache  Config"
+            assert asyncio.run(query_context7(" APACHE config ", pool, cache=cache)) == "echo Apache  Config"
+            assert pool.stats()["calls"] == 1
+
+            # A stale answer is returned at once and refreshed in the background
+            time.sleep(0.35)
+            assert context7_sync_wrapper("apache config", pool, cache=cache) == "echo Apache  Config"
+            deadline = time.time() + 5
+            while pool.stats()["calls"] < 2 and time.time() < deadline:
+                time.sleep(0.05)
+            time.sleep(0.05)
+            assert pool.stats()["calls"] == 2
+            assert context7_sync_wrapper("apache config", pool, cache=cache) == "echo apache config"
+            assert cache.stats()["stale_hits"] == 1
+        finally:
+            pool.stop()
+            cache.close()
+
+
+if __name__ == "__main__":
+    if "--stub-server" in sys.argv:
+        run_stub_server()
+        sys.exit(0)
+    test_pool_reuses_sessions_and_multiplexes_calls()
+    test_async_lookup_timeout_and_cancellation()
+    test_pool_restarts_crashed_server()
+    test_sqlite_cache_ttl_lru_and_sharing()
+    test_context7_cache_hits_and_revalidates()
+    print("✓ MCP session pool tests passed")
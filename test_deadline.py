@@ -0,0 +1,179 @@
+"""Offline tests for the per-run deadline: bounded tool timeouts and the forced final answer"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+import agent.graph as graph
+from agent.deadline import DeadlineExceeded, ainvoke_with_deadline, bounded_timeout, deadline_scope, new_deadline
+from agent.tools import ahttp_request, http_request
+
+
+class _SlowHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    delay = 0.3
+
+    def do_GET(self):
+        time.sleep(type(self).delay)
+        data = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve(delay: float):
+    _SlowHandler.delay = delay
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SlowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/slow"
+
+
+class _FakeModel:
+    """Always asks for the slow URL while tools are allowed, answers otherwise."""
+
+    def __init__(self, url: str, allow_tools: bool, calls: list):
+        self.url = url
+        self.allow_tools = allow_tools
+        self.calls = calls
+
+    def invoke(self, messages, timeout=None):
+        self.calls.append((self.allow_tools, messages, timeout))
+        if not self.allow_tools:
+            return AIMessage(content="final answer")
+        call = {"name": "http_request_tool", "args": {"method": "GET", "url": self.url}, "id": f"call_{len(self.calls)}"}
+        return AIMessage(content="", tool_calls=[call])
+
+    async def ainvoke(self, messages, timeout=None):
+        return self.invoke(messages, timeout)
+
+
+def _patch_graph(url: str, reserve: float):
+    calls = []
+    saved = graph.get_model, graph.documents_available, graph.FINAL_ANSWER_RESERVE
+    graph.get_model = lambda with_documents=True, allow_tools=True: _FakeModel(url, allow_tools, calls)
+    graph.documents_available = lambda timeout=None: False
+    graph.FINAL_ANSWER_RESERVE = reserve
+    return calls, saved
+
+
+def _restore(saved):
+    graph.get_model, graph.documents_available, graph.FINAL_ANSWER_RESERVE = saved
+
+
+def test_bounded_timeout():
+    assert bounded_timeout(10.0) == 10.0
+    with deadline_scope(new_deadline(2.0)):
+        assert 1.5 < bounded_timeout(10.0) <= 2.0
+        assert bounded_timeout(0.5) == 0.5
+    with deadline_scope(time.time() - 1):
+        try:
+            bounded_timeout(10.0)
+            assert False, "DeadlineExceeded expected"
+        except DeadlineExceeded:
+            pass
+    # Outside a scope the deadline is gone again
+    assert bounded_timeout(10.0) == 10.0
+
+
+def test_http_tool_gets_the_time_left():
+    server, url = _serve(delay=2.0)
+    try:
+        with deadline_scope(new_deadline(0.4)):
+            start = time.perf_counter()
+            assert http_request("GET", url).startswith("Error executing request")
+            assert time.perf_counter() - start < 1.5
+
+        async def run():
+            with deadline_scope(new_deadline(0.4)):
+                return await ahttp_request("GET", url)
+
+        start = time.perf_counter()
+        assert asyncio.run(run()).startswith("Error executing request")
+        assert time.perf_counter() - start < 1.5
+
+        # Past the deadline no request is sent at all
+        with deadline_scope(time.time() - 1):
+            assert "time budget" in http_request("GET", url)
+    finally:
+        server.shutdown()
+
+
+def test_agent_answers_before_the_deadline():
+    server, url = _serve(delay=0.3)
+    calls, saved = _patch_graph(url, reserve=0.8)
+    try:
+        start = time.perf_counter()
+        result = asyncio.run(ainvoke_with_deadline(graph.app, {"messages": [HumanMessage(content="q")]}, timeout=2.0))
+        assert time.perf_counter() - start < 2.0
+
+        final = result["messages"][-1]
+        assert final.content == "final answer" and graph.cut_short(final)
+        # The agent looped through the tools until only the reserve was left
+        allowed = [allow for allow, _, _ in calls]
+        assert allowed[-1] is False and allowed.count(False) == 1 and len(allowed) >= 3
+        messages, timeout = calls[-1][1], calls[-1][2]
+        assert isinstance(messages[-1], SystemMessage) and messages[-1].content == graph.FINAL_ANSWER_PROMPT
+        assert 0 < timeout <= 0.8
+        # Without a deadline nothing is forced (the graph is sync-invoked here)
+        calls.clear()
+        graph.get_model = lambda with_documents=True, allow_tools=True: _FakeModel(url, False, calls)
+        result = graph.app.invoke({"messages": [HumanMessage(content="q")]})
+        assert not graph.cut_short(result["messages"][-1]) and calls[0][2] is None
+    finally:
+        _restore(saved)
+        server.shutdown()
+
+
+class _SlowAnswer:
+    async def ainvoke(self, messages, timeout=None):
+        await asyncio.sleep(0.4)
+        return AIMessage(content="answer with tools allowed")
+
+    def invoke(self, messages, timeout=None):
+        time.sleep(0.4)
+        return AIMessage(content="answer with tools allowed")
+
+
+def test_answer_is_marked_by_the_turn_it_started_in():
+    calls, saved = _patch_graph("http://127.0.0.1:9/", reserve=0.5)
+    graph.get_model = lambda with_documents=True, allow_tools=True: _SlowAnswer()
+    try:
+        # Less than the reserve is left once the model answers, but it was
+        # asked with tools allowed: not cut short
+        state = {"messages": [HumanMessage(content="q")], "deadline": time.time() + 0.8}
+        final = asyncio.run(graph.aagent(state))["messages"][-1]
+        assert final.content == "answer with tools allowed" and not graph.cut_short(final)
+        state["deadline"] = time.time() + 0.8
+        assert not graph.cut_short(graph.agent(state)["messages"][-1])
+    finally:
+        _restore(saved)
+
+
+def test_expired_run_returns_timeout_answer():
+    calls, saved = _patch_graph("http://127.0.0.1:9/", reserve=0.5)
+    try:
+        result = graph.app.invoke({"messages": [HumanMessage(content="q")], "deadline": time.time() - 1})
+        assert result["messages"][-1].content == graph.TIMEOUT_ANSWER
+        assert calls == []
+    finally:
+        _restore(saved)
+
+
+if __name__ == "__main__":
+    test_bounded_timeout()
+    test_http_tool_gets_the_time_left()
+    test_agent_answers_before_the_deadline()
+    test_answer_is_marked_by_the_turn_it_started_in()
+    test_expired_run_returns_timeout_answer()
+    print("✓ Deadline tests passed")
@@ -0,0 +1,85 @@
+"""Offline tests for the cached embedding layer (no OpenAI key required)"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from agent.embeddings import CachedEmbeddings, EmbeddingCache, HashingEmbeddings
+
+
+class RecordingEmbeddings(HashingEmbeddings):
+    """Deterministic embeddings that record the batches they receive."""
+
+    def __init__(self, size: int = 32):
+        super().__init__(size)
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.batches.append(list(texts))
+        return super().embed_documents(texts)
+
+
+def test_hashing_embeddings_are_deterministic():
+    embedding = HashingEmbeddings(size=64)
+    assert embedding.embed_query("LENA cluster") == HashingEmbeddings(size=64).embed_query("LENA cluster")
+    assert embedding.embed_query("LENA cluster") != embedding.embed_query("Tomcat connector")
+
+
+def test_only_misses_are_embedded_in_batches():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, "cache.sqlite")
+        underlying = RecordingEmbeddings()
+        embedding = CachedEmbeddings(underlying, EmbeddingCache(cache_path), batch_size=2, max_concurrency=2)
+
+        texts = ["a", "b", "c", "a", "d", "e"]
+        vectors = embedding.embed_documents(texts)
+        assert vectors == HashingEmbeddings(32).embed_documents(texts)
+        # Duplicates are embedded once, in batches of at most two
+        assert sorted(t for b in underlying.batches[:3] for t in b) == ["a", "b", "c", "d", "e"]
+        assert all(len(b) <= 2 for b in underlying.batches[:3])
+
+        # A second wrapper over the same file (e.g. after a restart) hits the cache
+        underlying.batches.clear()
+        again = CachedEmbeddings(underlying, EmbeddingCache(cache_path), batch_size=2)
+        vectors = again.embed_documents(["e", "a", "f"])
+        expected = HashingEmbeddings(32).embed_documents(["e", "a", "f"])
+        # Cached vectors are stored as float32
+        assert all(abs(x - y) < 1e-6 for v, w in zip(vectors, expected) for x, y in zip(v, w))
+        assert underlying.batches == [["f"]]
+        assert (again.hits, again.misses) == (2, 1)
+
+
+def test_async_path_uses_cache():
+    with tempfile.TemporaryDirectory() as tmp:
+        underlying = RecordingEmbeddings()
+        embedding = CachedEmbeddings(underlying, EmbeddingCache(os.path.join(tmp, "cache.sqlite")), batch_size=1)
+        first = asyncio.run(embedding.aembed_documents(["x", "y"]))
+        second = asyncio.run(embedding.aembed_documents(["y", "x"]))
+        assert all(abs(x - y) < 1e-6 for v, w in zip(second, reversed(first)) for x, y in zip(v, w))
+        assert embedding.misses == 2 and embedding.hits == 2
+
+
+def test_queries_stay_out_of_the_disk_cache():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache(os.path.join(tmp, "cache.sqlite"))
+        embedding = CachedEmbeddings(HashingEmbeddings(32), cache, query_cache_size=2)
+        assert embedding.embed_query("how do I restart LENA?") == HashingEmbeddings(32).embed_query("how do I restart LENA?")
+        asyncio.run(embedding.aembed_query("which port does the agent use?"))
+        assert len(cache) == 0
+        # Repeated queries are served from memory, bounded to the newest two
+        embedding.embed_query("how do I restart LENA?")
+        embedding.embed_query("third question")
+        assert embedding.queries.stats()["hits"] == 1 and len(embedding.queries) == 2
+
+
+if __name__ == "__main__":
+    test_hashing_embeddings_are_deterministic()
+    test_only_misses_are_embedded_in_batches()
+    test_async_path_uses_cache()
+    test_queries_stay_out_of_the_disk_cache()
+    print("✓ Embedding cache tests passed")
@@ -0,0 +1,276 @@
+"""Offline tests for http_request_tool against a local HTTP server"""
+import asyncio
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from agent.http_client import HTTPClientManager, parse_host_timeouts
+
+
+APPS = [
+    {"id": i, "name": f"app-{i}", "status": "RUNNING" if i % 3 else "STOPPED", "server": {"host": f"was{i % 4}"}}
+    for i in range(500)
+]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests = []
+    versions = {}
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        type(self).requests.append(("GET", self.path))
+        if self.path.startswith("/lena/"):
+            self._lena()
+        elif self.path.startswith("/apps"):
+            self._reply(200, {"total": len(APPS), "apps": APPS})
+        elif self.path.startswith("/log"):
+            data = b"".join(b"line %06d of the server log\n" % i for i in range(20000))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._reply(200, {"path": self.path})
+
+    def _lena(self):
+        """Cacheable endpoints: /lena/status (ETag, no-cache), /lena/apps (max-age), /lena/logs (no-store)"""
+        resource = self.path.split("?")[0]
+        version = type(self).versions.get(resource, 1)
+        etag = f'"{resource}-v{version}"'
+        if resource == "/lena/status" and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        data = json.dumps({"resource": resource, "version": version}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag)
+        self.send_header(
+            "Cache-Control",
+            {"/lena/status": "no-cache", "/lena/apps": "max-age=60"}.get(resource, "no-store"),
+        )
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        type(self).requests.append(("POST", self.path))
+        resource = self.path.split("?")[0]
+        type(self).versions[resource] = type(self).versions.get(resource, 1) + 1
+        self._reply(201, json.loads(body or b"{}"))
+
+    def log_message(self, *args):
+        pass
+
+
+def _server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def test_pooled_client_reuses_connections():
+    server, base = _server()
+    manager = HTTPClientManager(timeout=5, host_timeouts=parse_host_timeouts("127.0.0.1=2, other.example=30"))
+    try:
+        assert manager.timeout_for(f"{base}/status") == 2
+        assert manager.timeout_for("https://docs.lenalab.org/") == 5
+
+        for _ in range(3):
+            assert manager.request("GET", f"{base}/status").json() == {"path": "/status"}
+
+        async def calls():
+            responses = [await manager.arequest("GET", f"{base}/apps") for _ in range(3)]
+            await manager.aclose()
+            return [r.status_code for r in responses]
+
+        assert asyncio.run(calls()) == [200, 200, 200]
+        stats = manager.stats()
+        # One connection per client, reused by every later request
+        assert stats["requests"] == 6
+        assert stats["new_connections"] == 2
+        assert stats["reused_connections"] == 4
+        assert stats["hosts"]["127.0.0.1"]["requests"] == 6
+    finally:
+        manager.close()
+        server.shutdown()
+
+
+def test_http_request_tool_injects_lena_key():
+    from agent import tools
+
+    server, base = _server()
+    os.environ["LENA_API_URL"] = base
+    os.environ["LENA_API_KEY"] = "secret"
+    try:
+        _Handler.requests.clear()
+        result = tools.http_request_tool.invoke({"method": "GET", "url": f"{base}/status"})
+        assert result.startswith("Status Code: 200")
+        result = asyncio.run(
+            tools.http_request_tool.ainvoke({"method": "POST", "url": f"{base}/apps?x=1", "body": {"name": "a"}})
+        )
+        assert result.startswith("Status Code: 201") and '"name":"a"' in result
+        assert _Handler.requests == [("GET", "/status?key=secret"), ("POST", "/apps?x=1&key=secret")]
+    finally:
+        del os.environ["LENA_API_URL"], os.environ["LENA_API_KEY"]
+        server.shutdown()
+
+
+def test_json_selector():
+    from agent.projection import project, select
+
+    data = {"total": len(APPS), "apps": APPS}
+    assert select(data, "$.total") == 500
+    assert select(data, "apps[-1].name") == "app-499"
+    assert select(data, "$.apps[*].server.host")[:3] == ["was0", "was1", "was2"]
+    stopped = select(data, "$.apps[?(@.status=='STOPPED')]")
+    assert len(stopped) == 167 and all(app["id"] % 3 == 0 for app in stopped)
+    assert [a["id"] for a in select(data, "apps[?(@.id >= 498)]")] == [498, 499]
+
+    page, notes = project(data, path="$.apps", fields=["name", "server.host"], limit=2, offset=10)
+    assert page == [{"name": "app-10", "server.host": "was2"}, {"name": "app-11", "server.host": "was3"}]
+    assert notes == ["Showing items 10-12 of 500."]
+
+
+def test_large_responses_are_bounded():
+    from agent import tools
+
+    server, base = _server()
+    try:
+        # Projection keeps the history small
+        result = tools.http_request_tool.invoke({
+            "method": "GET", "url": f"{base}/apps",
+            "path": "$.apps[?(@.status=='STOPPED')]", "fields": ["name"], "limit": 3,
+        })
+        assert result == (
+            'Status Code: 200\nResponse: [{"name":"app-0"},{"name":"app-3"},{"name":"app-6"}]\n'
+            "[Showing items 0-3 of 167.]"
+        )
+
+        # An unprojected large JSON body is cut at an item boundary, with a summary
+        result = asyncio.run(tools.http_request_tool.ainvoke({"method": "GET", "url": f"{base}/apps"}))
+        body, note = result.split("\n", 1)[1].rsplit("\n", 1)
+        assert len(body) <= len("Response: ") + tools.MAX_RESPONSE_CHARS
+        assert "JSON object with keys: total, apps (array of 500)" in note
+
+        page = tools.http_request_tool.invoke({"method": "GET", "url": f"{base}/apps", "path": "apps", "limit": 5})
+        assert '"id":4' in page and '"id":5' not in page
+
+        # Reading stops at the byte cap
+        cap = tools.MAX_RESPONSE_BYTES
+        tools.MAX_RESPONSE_BYTES = 4096
+        try:
+            result = tools.http_request_tool.invoke({"method": "GET", "url": f"{base}/log", "fields": ["x"]})
+        finally:
+            tools.MAX_RESPONSE_BYTES = cap
+        assert "line 000000" in result and "line 019999" not in result
+        assert "[Body truncated after 4096 bytes of 600000. Projection needs the complete JSON body.]" in result
+    finally:
+        server.shutdown()
+
+
+def test_lena_get_cache_revalidates_and_invalidates():
+    from agent import tools
+    from agent.http_cache import HTTPResponseCache
+
+    server, base = _server()
+    os.environ["LENA_API_URL"] = f"{base}/lena"
+    os.environ["LENA_API_KEY"] = "secret"
+    default_cache = tools.response_cache
+    tools.response_cache = cache = HTTPResponseCache(path_ttls={"/status/history": 30})
+
+    def get(path, key="secret"):
+        os.environ["LENA_API_KEY"] = key
+        return tools.http_request_tool.invoke({"method": "GET", "url": f"{base}/lena{path}"})
+
+    try:
+        _Handler.requests.clear()
+        _Handler.versions.clear()
+        # max-age: served from the cache, whatever the injected key
+        assert '"version":1' in get("/apps")
+        assert '"version":1' in get("/apps", key="other")
+        assert _Handler.requests == [("GET", "/lena/apps?key=secret")]
+
+        # no-cache + ETag: every call revalidates, a 304 re-serves the body
+        assert '"version":1' in get("/status")
+        assert '"version":1' in get("/status")
+        assert len(_Handler.requests) == 3
+        assert cache.stats()["revalidated"] == 1
+
+        # no-store is never cached
+        get("/logs")
+        get("/logs")
+        assert len(_Handler.requests) == 5
+
+        # A mutating call is not cached and drops the path's responses
+        result = tools.http_request_tool.invoke({"method": "POST", "url": f"{base}/lena/apps", "body": {}})
+        assert result.startswith("Status Code: 201")
+        assert '"version":2' in get("/apps")
+        stats = cache.stats()
+        assert (stats["hits"], stats["invalidated"]) == (1, 1)
+
+        # Per-path TTL overrides: longest matching prefix wins
+        assert cache._ttl("/status/history/1", {"cache-control": "no-cache"}) == 30
+        assert cache._ttl("/status/history", {"cache-control": "no-store"}) is None
+    finally:
+        tools.response_cache = default_cache
+        del os.environ["LENA_API_URL"], os.environ["LENA_API_KEY"]
+        server.shutdown()
+
+
+def test_304_for_an_evicted_response_is_fetched_again():
+    from agent import tools
+    from agent.http_cache import HTTPResponseCache
+
+    class EvictingCache(HTTPResponseCache):
+        """Evicts everything right after handing out validators."""
+
+        def lookup(self, *args):
+            found = super().lookup(*args)
+            if found.headers:
+                self.clear()
+            return found
+
+    server, base = _server()
+    os.environ["LENA_API_URL"] = f"{base}/lena"
+    default_cache = tools.response_cache
+    tools.response_cache = EvictingCache()
+    request = {"method": "GET", "url": f"{base}/lena/status"}
+    try:
+        _Handler.versions.clear()
+        assert '"version":1' in tools.http_request_tool.invoke(request)
+        _Handler.requests.clear()
+        # Conditional request gets a 304, then the body is asked for again
+        assert tools.http_request_tool.invoke(request).startswith("Status Code: 200")
+        assert asyncio.run(tools.http_request_tool.ainvoke(request)).startswith("Status Code: 200")
+        assert len(_Handler.requests) == 4
+    finally:
+        tools.response_cache = default_cache
+        del os.environ["LENA_API_URL"]
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_pooled_client_reuses_connections()
+    test_http_request_tool_injects_lena_key()
+    test_json_selector()
+    test_large_responses_are_bounded()
+    test_lena_get_cache_revalidates_and_invalidates()
+    test_304_for_an_evicted_response_is_fetched_again()
+    print("✓ HTTP tool tests passed")
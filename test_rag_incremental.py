@@ -0,0 +1,433 @@
+"""Offline test for incremental RAG index sync (no OpenAI key required)"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import agent.rag as rag
+from agent.rag import get_retriever, sync_index
+
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    """Fake embedding that counts how many texts were embedded."""
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return super().embed_documents(texts)
+
+
+def _write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _write_pdf(path, pages):
+    """Writes a minimal PDF with one line of text per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 700 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def test_incremental_sync():
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_dir = os.path.join(tmp, "docs")
+        persist_dir = os.path.join(tmp, "chroma_db")
+        os.makedirs(docs_dir)
+        _write(os.path.join(docs_dir, "a.txt"), "LENA is a modern application server platform.")
+        _write(os.path.join(docs_dir, "b.txt"), "Project X is deployed with LENA.")
+        embedding = CountingEmbedding(size=16)
+
+        _, stats = sync_index(docs_dir, persist_dir, embedding=embedding)
+        assert stats["chunks_added"] == 2
+        assert embedding.calls == 2
+
+        # Nothing changed: nothing is embedded
+        _, stats = sync_index(docs_dir, persist_dir, embedding=embedding)
+        assert stats["chunks_added"] == 0 and stats["chunks_removed"] == 0
+        assert embedding.calls == 2
+
+        # One file edited, one removed
+        _write(os.path.join(docs_dir, "a.txt"), "LENA supports clustering.")
+        os.remove(os.path.join(docs_dir, "b.txt"))
+        vectorstore, stats = sync_index(docs_dir, persist_dir, embedding=embedding)
+        assert (stats["files_changed"], stats["files_removed"]) == (1, 1)
+        assert (stats["chunks_added"], stats["chunks_removed"]) == (1, 2)
+        assert embedding.calls == 3
+        assert vectorstore.get()["documents"] == ["LENA supports clustering."]
+
+
+def test_bm25_index_is_persisted():
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_dir = os.path.join(tmp, "docs")
+        persist_dir = os.path.join(tmp, "chroma_db")
+        os.makedirs(docs_dir)
+        _write(os.path.join(docs_dir, "a.txt"), "LENA is a modern application server platform.")
+        embedding = CountingEmbedding(size=16)
+
+        get_retriever(docs_dir, embedding=embedding, persist_directory=persist_dir)
+        assert os.path.exists(os.path.join(persist_dir, rag.BM25_DIR, "index.json"))
+
+        # Warm start: BM25 comes from disk, documents are not re-parsed
+        original_parse_files = rag.parse_files
+        rag.parse_files = None
+        try:
+            retriever = get_retriever(docs_dir, embedding=embedding, persist_directory=persist_dir)
+        finally:
+            rag.parse_files = original_parse_files
+        assert retriever.invoke("application server")[0].page_content.startswith("LENA")
+
+        # A changed corpus invalidates the persisted BM25 index
+        _write(os.path.join(docs_dir, "b.txt"), "Tomcat connector tuning.")
+        _, stats = sync_index(docs_dir, persist_dir, embedding=embedding)
+        assert rag.load_bm25(persist_dir, stats["fingerprint"], "ngram") is None
+
+
+def test_parallel_parse_reports_failures():
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_dir = os.path.join(tmp, "docs")
+        persist_dir = os.path.join(tmp, "chroma_db")
+        os.makedirs(docs_dir)
+        for i in range(4):
+            _write(os.path.join(docs_dir, f"doc{i}.txt"), f"LENA document number {i}.")
+        _write(os.path.join(docs_dir, "broken.pdf"), "not a pdf")
+
+        os.environ["RAG_INGEST_WORKERS"] = "2"
+        try:
+            _, stats = sync_index(docs_dir, persist_dir, embedding=CountingEmbedding(size=16))
+        finally:
+            del os.environ["RAG_INGEST_WORKERS"]
+        assert stats["files_changed"] == 4 and stats["chunks_added"] == 4
+        assert list(stats["failures"]) == [os.path.join(docs_dir, "broken.pdf")]
+        assert len(stats["parse_seconds"]) == 4
+
+
+def test_numpy_vector_backend():
+    from agent.embeddings import HashingEmbeddings
+    from agent.ingest import ChunkStore
+    from agent.vectorstore import NumpyVectorStore
+
+    for dtype in ("float32", "float16", "int8"):
+        with tempfile.TemporaryDirectory() as tmp:
+            docs_dir = os.path.join(tmp, "docs")
+            persist_dir = os.path.join(tmp, "index")
+            os.makedirs(docs_dir)
+            _write(os.path.join(docs_dir, "lena.txt"), "LENA application server cluster management.")
+            _write(os.path.join(docs_dir, "nginx.txt"), "Nginx reverse proxy upstream configuration.")
+            _write(os.path.join(docs_dir, "tomcat.txt"), "Tomcat connector thread pool tuning.")
+
+            os.environ["RAG_VECTOR_DTYPE"] = dtype
+            try:
+                vectorstore, _ = sync_index(docs_dir, persist_dir, HashingEmbeddings(256), vector_backend="numpy")
+                os.remove(os.path.join(docs_dir, "tomcat.txt"))
+                vectorstore, stats = sync_index(docs_dir, persist_dir, HashingEmbeddings(256), vector_backend="numpy")
+            finally:
+                del os.environ["RAG_VECTOR_DTYPE"]
+            assert isinstance(vectorstore, NumpyVectorStore) and len(vectorstore) == 2
+            assert stats["chunks_removed"] == 1
+
+            # A second reader maps the persisted files read-only; texts come from the chunk store
+            reader = NumpyVectorStore(
+                os.path.join(persist_dir, rag.NUMPY_INDEX_DIR), HashingEmbeddings(256), dtype,
+                documents=ChunkStore.load(persist_dir).get,
+            )
+            results = reader.similarity_search_with_score("nginx upstream proxy", k=2)
+            assert results[0][0].page_content.startswith("Nginx"), dtype
+            assert results[0][1] > results[1][1]
+
+
+def test_numpy_store_appends_and_compacts_on_disk():
+    import json
+    from langchain_core.documents import Document
+    from agent.embeddings import HashingEmbeddings
+    from agent.vectorstore import SIDECAR_FILE, NumpyVectorStore
+
+    docs = {
+        f"c{i}": Document(page_content=f"{product} chunk {i}", metadata={"product": product})
+        for i, product in enumerate(["nginx", "tomcat"] * 6)
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        store = NumpyVectorStore(tmp, HashingEmbeddings(32), "int8", documents=docs.get)
+        ids = sorted(docs, key=lambda cid: int(cid[1:]))
+        for start in range(0, len(ids), 4):
+            batch = ids[start:start + 4]
+            store.add_texts([docs[cid].page_content for cid in batch], ids=batch)
+        # Batches are appended to one file, not concatenated in memory
+        vectors = [name for name in os.listdir(tmp) if name.startswith("vectors-")]
+        assert len(vectors) == 1 and os.path.getsize(os.path.join(tmp, vectors[0])) == 12 * 32
+        store.persist()
+        with open(os.path.join(tmp, SIDECAR_FILE), encoding="utf-8") as f:
+            sidecar = json.load(f)
+        assert sidecar["rows"] == ids and "texts" not in sidecar and "metadatas" not in sidecar
+
+        # Deletes only mark rows dead until they outnumber the live ones
+        store.delete(ids[:4])
+        store.persist()
+        assert len(store) == 8 and len(NumpyVectorStore(tmp, HashingEmbeddings(32), "int8")._row_ids) == 12
+        hits = store.similarity_search("nginx chunk 6", k=8, filter={"product": "nginx"})
+        assert len(hits) == 4 and hits[0].page_content == "nginx chunk 6"
+        assert all(hit.id not in ids[:4] for hit in store.similarity_search("chunk", k=12))
+
+        store.delete(ids[4:9])
+        store.persist()
+        reader = NumpyVectorStore(tmp, HashingEmbeddings(32), "int8", documents=docs.get)
+        assert reader._row_ids == ids[9:] and len(reader) == 3
+        # The compacted generation plus the previous one stay on disk
+        vectors = [name for name in os.listdir(tmp) if name.startswith("vectors-")]
+        assert len(vectors) == 2 and f"vectors-{reader._generation}.bin" in vectors
+        assert os.path.getsize(os.path.join(tmp, f"vectors-{reader._generation}.bin")) == 3 * 32
+        assert reader.similarity_search("tomcat chunk 11", k=1)[0].id == "c11"
+
+
+def test_numpy_store_readers_survive_a_persist():
+    from langchain_core.documents import Document
+    from agent.embeddings import HashingEmbeddings
+    from agent.vectorstore import NumpyVectorStore
+
+    docs = {f"c{i}": Document(page_content=f"chunk {i} about topic {i % 3}") for i in range(6)}
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = NumpyVectorStore(tmp, HashingEmbeddings(32), documents=docs.get)
+        writer.add_texts([docs[cid].page_content for cid in ["c0", "c1", "c2"]], ids=["c0", "c1", "c2"])
+        writer.persist()
+
+        # Opened but not searched yet, then the writer publishes twice
+        reader = NumpyVectorStore(tmp, HashingEmbeddings(32), documents=docs.get)
+        writer.add_texts([docs["c3"].page_content], ids=["c3"])
+        writer.persist()
+        writer.delete(["c0", "c1", "c2"])
+        writer.add_texts([docs["c4"].page_content], ids=["c4"])
+        writer.persist()
+        assert reader.similarity_search("chunk 1 about topic 1", k=1)[0].id == "c1"
+
+        # A reader that read the sidecar just before a persist can still map it
+        stale = NumpyVectorStore(tmp, HashingEmbeddings(32), documents=docs.get)
+        stale._changed()
+        writer.add_texts([docs["c5"].page_content], ids=["c5"])
+        writer.persist()
+        stale._map()
+        assert stale.similarity_search("chunk 4 about topic 1", k=1)[0].id == "c4"
+        assert writer.similarity_search("chunk 5 about topic 2", k=1)[0].id == "c5"
+
+
+def test_index_manager_hot_reload():
+    from agent.embeddings import HashingEmbeddings
+    from agent.rag import IndexManager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_dir = os.path.join(tmp, "docs")
+        os.makedirs(docs_dir)
+        _write(os.path.join(docs_dir, "a.txt"), "LENA application server overview.")
+        manager = IndexManager(docs_dir, embedding=HashingEmbeddings(64), persist_directory=os.path.join(tmp, "db"))
+        manager.refresh()
+        old_retriever, old_version = manager.retriever, manager.version
+
+        manager.start_watcher(0.05)
+        try:
+            _write(os.path.join(docs_dir, "b.txt"), "Nginx upstream keepalive settings.")
+            deadline = time.time() + 10
+            while manager.version == old_version and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            manager.stop_watcher()
+
+        assert manager.version != old_version
+        assert manager.retriever is not old_retriever
+        assert any("Nginx" in d.page_content for d in manager.retriever.invoke("nginx keepalive"))
+        assert manager.status()["ready"] and not manager.status()["watching"]
+
+
+def test_failed_refresh_waits_for_the_next_change():
+    from agent.embeddings import HashingEmbeddings
+    from agent.rag import IndexManager
+
+    class FailingManager(IndexManager):
+        attempts = 0
+
+        def refresh(self):
+            self.attempts += 1
+            raise RuntimeError("embedding service unavailable")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_dir = os.path.join(tmp, "docs")
+        os.makedirs(docs_dir)
+        _write(os.path.join(docs_dir, "a.txt"), "LENA application server overview.")
+        manager = FailingManager(docs_dir, embedding=HashingEmbeddings(64), persist_directory=os.path.join(tmp, "db"))
+        manager.start_watcher(0.02)
+        try:
+            _write(os.path.join(docs_dir, "b.txt"), "Nginx upstream keepalive settings.")
+            time.sleep(0.3)
+            # One attempt for the change, not one per poll
+            assert manager.attempts == 1
+            _write(os.path.join(docs_dir, "c.txt"), "Tomcat connector settings.")
+            time.sleep(0.3)
+            assert manager.attempts == 2
+        finally:
+            manager.stop_watcher()
+
+
+def test_index_manager_background_start():
+    from agent.embeddings import HashingEmbeddings
+    from agent.rag import IndexManager
+
+    class FailingEmbeddings(HashingEmbeddings):
+        def embed_documents(self, texts):
+            raise RuntimeError("embedding service unavailable")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_dir = os.path.join(tmp, "docs")
+        os.makedirs(docs_dir)
+        _write(os.path.join(docs_dir, "a.txt"), "LENA application server overview.")
+
+        manager = IndexManager(docs_dir, embedding=HashingEmbeddings(64), persist_directory=os.path.join(tmp, "db"))
+        assert manager.status()["state"] == "idle"
+        manager.start_background()
+        manager.start_background()  # idempotent
+        assert manager.wait_ready(30)
+        assert manager.status()["state"] == "ready"
+
+        failing = IndexManager(docs_dir, embedding=FailingEmbeddings(64), persist_directory=os.path.join(tmp, "db2"))
+        failing.start_background()
+        assert not failing.wait_ready(30)
+        status = failing.status()
+        assert status["state"] == "failed" and "unavailable" in status["error"]
+
+
+def test_streaming_ingestion_is_batched():
+    from agent.ingest import ChunkStore, IndexManifest, split_file
+
+    class BatchRecordingEmbedding(DeterministicFakeEmbedding):
+        batches: list = []
+
+        def embed_documents(self, texts):
+            self.batches.append(len(texts))
+            return super().embed_documents(texts)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_dir = os.path.join(tmp, "docs")
+        persist_dir = os.path.join(tmp, "chroma_db")
+        os.makedirs(docs_dir)
+        pdf_path = os.path.join(docs_dir, "manual.pdf")
+        _write_pdf(pdf_path, [f"Page {i} of the LENA vendor manual" for i in range(12)])
+
+        embedding = BatchRecordingEmbedding(size=16, batches=[])
+        batch_size = rag.INDEX_BATCH_SIZE
+        os.environ["RAG_STREAM_MIN_MB"] = "0"
+        rag.INDEX_BATCH_SIZE = 5
+        try:
+            _, stats = sync_index(docs_dir, persist_dir, embedding=embedding)
+
+            # A file failing half-way leaves nothing of its new chunks behind
+            _write(os.path.join(docs_dir, "broken.txt"), "never fully parsed")
+            real_iter = rag.iter_file_chunks
+
+            def failing_iter(path, *args):
+                if not path.endswith("broken.txt"):
+                    yield from real_iter(path, *args)
+                    return
+                for doc in real_iter(pdf_path, *args):
+                    doc.metadata["chunk_id"] += "-broken"
+                    yield doc
+                raise ValueError("truncated file")
+
+            rag.iter_file_chunks = failing_iter
+            try:
+                _, failed = sync_index(docs_dir, persist_dir, embedding=embedding)
+            finally:
+                rag.iter_file_chunks = real_iter
+        finally:
+            rag.INDEX_BATCH_SIZE = batch_size
+            del os.environ["RAG_STREAM_MIN_MB"]
+
+        assert stats["files_changed"] == 1 and stats["chunks_added"] == 12
+        assert max(embedding.batches) <= 5
+        # Streamed chunks get the same ids as a whole-file split
+        manifest = IndexManifest.load(persist_dir)
+        assert manifest.files[pdf_path]["chunks"] == [d.metadata["chunk_id"] for d in split_file(pdf_path)]
+
+        assert list(failed["failures"]) == [os.path.join(docs_dir, "broken.txt")]
+        assert os.path.join(docs_dir, "broken.txt") not in manifest.files
+        store = ChunkStore.load(persist_dir)
+        assert len(store.chunks) == 12
+        assert not any(cid.endswith("-broken") for cid in store.chunks)
+
+
+def test_product_shards():
+    from agent.embeddings import HashingEmbeddings
+    from agent.ingest import ChunkStore, file_tags
+    from agent.rag import build_sharded_retriever
+
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_dir = os.path.join(tmp, "docs")
+        for product in ("nginx/1.24", "tomcat"):
+            os.makedirs(os.path.join(docs_dir, product))
+        nginx = os.path.join(docs_dir, "nginx", "1.24", "proxy.txt")
+        tomcat = os.path.join(docs_dir, "tomcat", "connector.txt")
+        notes = os.path.join(docs_dir, "notes.txt")
+        _write(nginx, "Proxy buffering and keepalive settings for upstream servers.")
+        _write(tomcat, "Connector keepalive timeout and thread pool settings.")
+        _write(notes, "---\nproduct: Apache\nversion: 2.4\n---\n\nKeepalive settings for the Apache web server.")
+
+        assert file_tags(nginx, docs_dir) == {"product": "nginx", "version": "1.24"}
+        assert file_tags(tomcat, docs_dir) == {"product": "tomcat"}
+        assert file_tags(notes, docs_dir) == {"product": "apache", "version": "2.4"}
+
+        for backend in ("chroma", "numpy"):
+            os.environ["RAG_VECTOR_BACKEND"] = backend
+            try:
+                shards, stats = build_sharded_retriever(
+                    docs_dir, embedding=HashingEmbeddings(64), persist_directory=os.path.join(tmp, backend)
+                )
+            finally:
+                del os.environ["RAG_VECTOR_BACKEND"]
+            assert shards.products == ["apache", "nginx", "tomcat"]
+            for product, path in (("nginx", nginx), ("Tomcat", tomcat)):
+                docs = shards.get(product).invoke("keepalive settings")
+                assert docs and {d.metadata["source"] for d in docs} == {path}
+            assert len({d.metadata["source"] for d in shards.get().invoke("keepalive settings")}) == 3
+            assert shards.get("unknown") is shards.get()
+
+        # Changing the product in the front matter retags every chunk of the file
+        _write(notes, "---\nproduct: lena\nversion: 2.4\n---\n\nKeepalive settings for the Apache web server.")
+        shards, _ = build_sharded_retriever(
+            docs_dir, embedding=HashingEmbeddings(64), persist_directory=os.path.join(tmp, "chroma")
+        )
+        assert "lena" in shards.products and "apache" not in shards.products
+        store = ChunkStore.load(os.path.join(tmp, "chroma"))
+        assert {c["metadata"]["product"] for c in store.chunks.values() if c["metadata"]["source"] == notes} == {"lena"}
+
+
+if __name__ == "__main__":
+    test_incremental_sync()
+    test_bm25_index_is_persisted()
+    test_parallel_parse_reports_failures()
+    test_numpy_vector_backend()
+    test_numpy_store_appends_and_compacts_on_disk()
+    test_numpy_store_readers_survive_a_persist()
+    test_index_manager_hot_reload()
+    test_failed_refresh_waits_for_the_next_change()
+    test_index_manager_background_start()
+    test_streaming_ingestion_is_batched()
+    test_product_shards()
+    print("✓ Incremental sync tests passed")
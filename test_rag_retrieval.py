@@ -0,0 +1,255 @@
+"""Offline tests for the retrieval side of the RAG pipeline"""
+import asyncio
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from agent.cache import TTLCache
+from agent.context import assemble_context
+from agent.rag import CachedRetriever, HybridRetriever
+from agent.rerank import BatchedRerank, RerankService
+from agent.sparse import KoreanNgramTokenizer, SparseIndex, SparseRetriever, load_indexes, save_indexes
+
+
+class CountingRetriever(BaseRetriever):
+    """Retriever that counts how often it runs."""
+    calls: int = 0
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        self.calls += 1
+        return [Document(page_content=f"result for {query}")]
+
+
+class SlowRetriever(BaseRetriever):
+    """Retriever that returns fixed results after a delay."""
+    results: List[str]
+    delay: float = 0.2
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        time.sleep(self.delay)
+        return [Document(page_content=r) for r in self.results]
+
+    async def _aget_relevant_documents(self, query, *, run_manager=None):
+        await asyncio.sleep(self.delay)
+        return [Document(page_content=r) for r in self.results]
+
+
+def _hybrid():
+    return HybridRetriever(
+        retrievers=[SlowRetriever(results=["bm25 only", "shared"]), SlowRetriever(results=["shared", "vector only"])],
+        weights=[0.5, 0.5],
+    )
+
+
+def test_hybrid_runs_retrievers_concurrently():
+    start = time.perf_counter()
+    docs = _hybrid().invoke("query")
+    assert time.perf_counter() - start < 0.35
+    assert [d.page_content for d in docs] == ["shared", "bm25 only", "vector only"]
+
+
+def test_hybrid_async_path():
+    async def run():
+        # Two concurrent searches on one event loop
+        return await asyncio.gather(_hybrid().ainvoke("a"), _hybrid().ainvoke("b"))
+
+    start = time.perf_counter()
+    first, second = asyncio.run(run())
+    assert time.perf_counter() - start < 0.35
+    assert [d.page_content for d in first] == ["shared", "bm25 only", "vector only"]
+    assert [d.page_content for d in second] == [d.page_content for d in first]
+
+
+def test_cached_retriever_hits_and_invalidation():
+    base = CountingRetriever()
+    cache = TTLCache(maxsize=2, ttl=60)
+    retriever = CachedRetriever(base_retriever=base, cache=cache, index_version="v1")
+
+    retriever.invoke("What is LENA?")
+    retriever.invoke("  what is   lena? ")
+    assert base.calls == 1
+    assert asyncio.run(retriever.ainvoke("WHAT IS LENA?"))[0].page_content == "result for What is LENA?"
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    # A new index version never sees the old entries
+    rebuilt = CachedRetriever(base_retriever=base, cache=cache, index_version="v2")
+    rebuilt.invoke("What is LENA?")
+    assert base.calls == 2
+
+    # LRU eviction at maxsize
+    rebuilt.invoke("a")
+    rebuilt.invoke("b")
+    rebuilt.invoke("What is LENA?")
+    assert base.calls == 5
+
+
+def test_rerank_caps_candidates_and_batches_concurrent_requests():
+    calls = []
+
+    def scorer_factory():
+        def score(pairs):
+            calls.append(len(pairs))
+            time.sleep(0.05)
+            # Longer passages score higher
+            return [float(len(text)) for _, text in pairs]
+        return score
+
+    service = RerankService(scorer_factory, max_batch=64, max_wait=0.02).load()
+    assert calls == [1]  # warm-up on load
+
+    compressor = BatchedRerank(service=service, max_candidates=3, top_n=2)
+    docs = [Document(page_content="x" * n) for n in (1, 3, 2, 10)]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda q: compressor.compress_documents(docs, q), ["a", "b", "c", "d"]))
+
+    # The fourth (longest) document is beyond the candidate cap
+    for result in results:
+        assert [d.page_content for d in result] == ["xxx", "xx"]
+        assert result[0].metadata["relevance_score"] == 3.0
+    # Concurrent requests shared model calls
+    assert service.batches < 4
+    assert sum(calls[1:]) == 12
+
+    result = asyncio.run(compressor.acompress_documents(docs, "e"))
+    assert [d.page_content for d in result] == ["xxx", "xx"]
+
+
+def test_listwise_ranker_without_session():
+    from agent.rerank import ranker_scorer
+
+    class ListwiseRanker:
+        # Like flashrank's Ranker for listwise models: no `session` attribute,
+        # orders a query's whole passage list and returns no scores
+        llm_model = object()
+
+        def __init__(self):
+            self.requests = []
+
+        def rerank(self, request):
+            self.requests.append((request.query, [p["id"] for p in request.passages]))
+            words = set(request.query.split())
+            return sorted(request.passages, key=lambda p: -len(words & set(p["text"].split())))
+
+    ranker = ListwiseRanker()
+    pairs = [("nginx proxy", "tomcat"), ("nginx proxy", "nginx proxy cache"), ("tomcat", "nginx"), ("nginx proxy", "nginx")]
+    scores = ranker_scorer(ranker)(pairs)
+    # One request per query, with all of its passages; scores follow the ranking
+    assert ranker.requests == [("nginx proxy", [0, 1, 3]), ("tomcat", [2])]
+    assert scores[1] > scores[3] > scores[0] and scores[2] == 1.0
+
+
+def _word_count(text):
+    return len(text.split())
+
+
+def test_context_merges_overlaps_and_respects_budget():
+    text = " ".join(f"word{i}" for i in range(300))
+    first, second = text[:1200], text[1000:]
+    docs = [
+        Document(page_content=second, metadata={"source": "docs/guide.txt", "start_index": 1000}),
+        Document(page_content="Tomcat connector tuning notes.", metadata={"source": "docs/tomcat.txt"}),
+        Document(page_content=first, metadata={"source": "docs/guide.txt", "start_index": 0}),
+        Document(page_content="tomcat connector tuning notes", metadata={"source": "docs/copy.txt"}),
+    ]
+    context = assemble_context(docs, max_tokens=1000, token_counter=_word_count)
+    # The two guide chunks become one passage; the duplicate note is dropped
+    assert context.count("[") == 2
+    assert "[1] guide.txt\n" + text in context
+    assert "[2] tomcat.txt\nTomcat connector tuning notes." in context
+
+    # Without offsets, overlapping text still merges
+    no_offsets = [Document(page_content=d.page_content, metadata={"source": "a.txt"}) for d in docs[::2]]
+    assert assemble_context(no_offsets, max_tokens=1000, token_counter=_word_count) == "[1] a.txt\n" + text
+
+    # The budget cuts the output, truncating the last passage
+    short = assemble_context(docs, max_tokens=60, token_counter=_word_count)
+    assert _word_count(short) <= 60 and short.endswith("…")
+
+
+def test_context_orders_by_relevance_score():
+    docs = [
+        Document(page_content="low ranked first", metadata={"source": "a.txt", "relevance_score": 0.1}),
+        Document(page_content="high ranked second", metadata={"source": "b.pdf", "page": 2, "relevance_score": 0.9}),
+    ]
+    assert assemble_context(docs, max_tokens=100, token_counter=_word_count).startswith("[1] b.pdf (p.3)")
+
+
+def _brute_force_bm25(docs, query, k, k1=1.5, b=0.75):
+    """Scores every document; the reference for SparseIndex.search."""
+    counts = [Counter(d) for d in docs]
+    avgdl = sum(len(d) for d in docs) / len(docs)
+    df = Counter(t for c in counts for t in c)
+    scored = []
+    for number, c in enumerate(counts):
+        score = 0.0
+        for term, weight in Counter(query).items():
+            if term in c:
+                idf = math.log1p((len(docs) - df[term] + 0.5) / (df[term] + 0.5))
+                score += weight * idf * c[term] * (k1 + 1) / (c[term] + k1 * (1 - b + b * len(docs[number]) / avgdl))
+        if score > 0:
+            scored.append((-round(score, 4), number))
+    return [number for _, number in sorted(scored)[:k]]
+
+
+def test_sparse_index_matches_exhaustive_bm25():
+    rng = random.Random(7)
+    vocab = [f"term{i}" for i in range(300)]
+    zipf = [1 / (i + 1) for i in range(len(vocab))]
+    docs = [rng.choices(vocab, zipf, k=rng.randint(3, 60)) for _ in range(1500)]
+    index = SparseIndex.build(docs)
+    for _ in range(100):
+        query = rng.choices(vocab, zipf, k=rng.randint(1, 5)) + [rng.choice(vocab)]
+        assert [n for n, _ in index.search(query, 5)] == _brute_force_bm25(docs, query, 5)
+    assert index.search(["unknown"], 5) == []
+
+    # Shard indexes report the shared document numbers
+    shard = SparseIndex.build([docs[n] for n in range(0, 1500, 3)], doc_numbers=list(range(0, 1500, 3)))
+    assert all(n % 3 == 0 for n, _ in shard.search(["term1", "term2"], 10))
+
+
+def test_sparse_index_persists_and_tokenizes_korean():
+    tokenizer = KoreanNgramTokenizer()
+    assert tokenizer("LENA 서버의 설정") == ["lena", "서버", "버의", "설정"]
+
+    documents = [
+        Document(page_content="LENA 서버의 클러스터 설정 방법", metadata={"chunk_id": "a"}),
+        Document(page_content="Tomcat connector thread pool", metadata={"chunk_id": "b"}),
+        Document(page_content="세션 클러스터링을 설정하려면 서버를 재시작한다", metadata={"chunk_id": "c"}),
+    ]
+    index = SparseIndex.build([tokenizer(d.page_content) for d in documents])
+    with tempfile.TemporaryDirectory() as tmp:
+        save_indexes(tmp, {"*": index}, {"fingerprint": "x"})
+        save_indexes(tmp, {"*": index}, {"fingerprint": "y"})  # replaces the first generation
+        metadata, loaded = load_indexes(tmp)
+        assert metadata == {"fingerprint": "y"}
+        assert len([name for name in os.listdir(tmp) if name.endswith(".npy")]) == 5
+
+        retriever = SparseRetriever(index=loaded["*"], documents=documents, tokenizer=tokenizer, k=2)
+        # Particles and endings differ from the documents, the bigrams still match
+        results = retriever.invoke("클러스터링 설정은?")
+        assert [d.metadata["chunk_id"] for d in results] == ["c", "a"]
+        del retriever, loaded  # release the memory maps before cleanup
+
+
+if __name__ == "__main__":
+    test_hybrid_runs_retrievers_concurrently()
+    test_hybrid_async_path()
+    test_cached_retriever_hits_and_invalidation()
+    test_rerank_caps_candidates_and_batches_concurrent_requests()
+    test_listwise_ranker_without_session()
+    test_context_merges_overlaps_and_respects_budget()
+    test_context_orders_by_relevance_score()
+    test_sparse_index_matches_exhaustive_bm25()
+    test_sparse_index_persists_and_tokenizes_korean()
+    print("✓ Retrieval tests passed")
@@ -0,0 +1,93 @@
+"""Offline tests for the semantic answer cache (no OpenAI key required)"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from agent.embeddings import HashingEmbeddings
+from agent.semantic_cache import SemanticCache
+
+
+def test_near_duplicate_questions_hit():
+    cache = SemanticCache(HashingEmbeddings(size=512), threshold=0.9)
+    cache.put("How do I restart a LENA WAS server?", "Use the restart API.")
+
+    hit = cache.get("how do I restart a LENA WAS server")
+    assert hit is not None and hit.answer == "Use the restart API."
+    assert hit.similarity > 0.9
+    assert cache.get("Which Nginx version supports HTTP/3?") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_ttl_and_lru_eviction():
+    cache = SemanticCache(HashingEmbeddings(size=512), threshold=0.99, maxsize=2, ttl=0.2)
+    asyncio.run(cache.aput("first question", "1"))
+    asyncio.run(cache.aput("second question", "2"))
+    assert cache.get("first question").answer == "1"
+
+    # "second" is least recently used and gets evicted
+    cache.put("third question", "3")
+    assert cache.get("second question") is None
+    assert cache.get("first question") is not None
+
+    time.sleep(0.25)
+    assert asyncio.run(cache.aget("third question")) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_repeated_question_refreshes_its_entry():
+    cache = SemanticCache(HashingEmbeddings(size=512), threshold=0.9)
+    cache.put("How do I restart a LENA WAS server?", "old")
+    asyncio.run(cache.aput("how do I restart a LENA WAS server", "new"))
+    assert cache.stats()["size"] == 1
+    assert cache.get("How do I restart a LENA WAS server?").answer == "new"
+
+
+def test_disabled_size_and_embedding_failures_never_raise():
+    class FailingEmbeddings(HashingEmbeddings):
+        def embed_query(self, text):
+            raise RuntimeError("embedding service unavailable")
+
+        async def aembed_query(self, text):
+            raise RuntimeError("embedding service unavailable")
+
+    empty = SemanticCache(HashingEmbeddings(size=64), maxsize=0)
+    asyncio.run(empty.aput("question", "answer"))
+    empty.put("question", "answer")
+    assert empty.get("question") is None and empty.stats()["size"] == 0
+
+    failing = SemanticCache(FailingEmbeddings(size=64))
+    failing.put("question", "answer")
+    asyncio.run(failing.aput("question", "answer"))
+    assert failing.get("question") is None and asyncio.run(failing.aget("question")) is None
+    assert failing.stats()["errors"] == 4
+
+
+def test_answers_from_live_data_are_not_cacheable():
+    from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+    from agent.graph import cacheable
+
+    def run(tool, final=None):
+        call = {"name": tool, "args": {}, "id": "call_1"}
+        return [
+            HumanMessage(content="q"),
+            AIMessage(content="", tool_calls=[call]),
+            ToolMessage(content="result", tool_call_id="call_1"),
+            final or AIMessage(content="answer"),
+        ]
+
+    assert cacheable(run("search_documents"))
+    assert not cacheable(run("http_request_tool"))
+    assert not cacheable(run("tavily_search_results_json"))
+    assert not cacheable(run("search_documents", AIMessage(content="a", response_metadata={"deadline_reached": True})))
+
+
+if __name__ == "__main__":
+    test_near_duplicate_questions_hit()
+    test_ttl_and_lru_eviction()
+    test_repeated_question_refreshes_its_entry()
+    test_disabled_size_and_embedding_failures_never_raise()
+    test_answers_from_live_data_are_not_cacheable()
+    print("✓ Semantic cache tests passed")
@@ -0,0 +1,143 @@
+"""Offline tests for the coalescing Tavily search against a local fake endpoint"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from agent.http_client import HTTPClientManager
+from agent.tavily import CoalescingSearch, TavilyClient
+
+
+class _FakeTavily(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    queries = []
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        type(self).queries.append((payload["query"], tuple(payload["include_domains"])))
+        time.sleep(0.3)
+        if payload["api_key"] != "test-key":
+            status, body = 401, {"detail": "Unauthorized"}
+        else:
+            results = [
+                {"title": f"Result {i}", "url": f"https://{d}/{i}", "content": payload["query"], "score": 0.9, "x": 1}
+                for i, d in enumerate(payload["include_domains"] or ["example.com"])
+            ]
+            status, body = 200, {"query": payload["query"], "results": results}
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def _setup(domains=("docs.lenalab.org",), ttl=60.0):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeTavily)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _FakeTavily.queries.clear()
+    client = TavilyClient(
+        HTTPClientManager(), include_domains=domains, api_url=f"http://127.0.0.1:{server.server_port}",
+        api_key="test-key",
+    )
+    return server, CoalescingSearch(client, ttl=ttl)
+
+
+def test_identical_concurrent_queries_share_one_call():
+    server, search = _setup()
+    try:
+        async def burst():
+            return await asyncio.gather(*(search.asearch("LENA 1.3 release notes") for _ in range(8)))
+
+        start = time.perf_counter()
+        results = asyncio.run(burst())
+        assert time.perf_counter() - start < 1.0
+        assert all(r == results[0] for r in results)
+        assert results[0] == [
+            {"title": "Result 0", "url": "https://docs.lenalab.org/0", "content": "LENA 1.3 release notes", "score": 0.9}
+        ]
+
+        # Sync callers on threads coalesce as well
+        threads_results = []
+        threads = [
+            threading.Thread(target=lambda: threads_results.append(search.search("Tomcat 10 support")))
+            for _ in range(4)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(threads_results) == 4
+
+        # Cached: normalized queries do not reach the API
+        assert search.search("  lena 1.3 RELEASE notes ") == results[0]
+        assert len(_FakeTavily.queries) == 2
+        stats = search.stats()
+        assert (stats["requests"], stats["upstream"], stats["coalesced"], stats["cache_hits"]) == (13, 2, 10, 1)
+    finally:
+        server.shutdown()
+
+
+def test_cache_key_ttl_and_errors():
+    server, search = _setup(ttl=0.2)
+    try:
+        search.search("lena")
+        # Another domain restriction is another cache entry
+        other = CoalescingSearch(
+            TavilyClient(search.client.http, include_domains=["solution.lgcns.com"],
+                         api_url=search.client.api_url, api_key="test-key")
+        )
+        assert search.key("lena") != other.key("lena")
+        assert other.search("lena")[0]["url"] == "https://solution.lgcns.com/0"
+
+        time.sleep(0.25)
+        search.search("lena")
+        assert len(_FakeTavily.queries) == 3
+
+        # Errors reach every waiter and are not cached
+        search.client.api_key = "wrong"
+
+        async def failing():
+            return await asyncio.gather(*(search.asearch("nginx") for _ in range(3)), return_exceptions=True)
+
+        errors = asyncio.run(failing())
+        assert all(isinstance(e, Exception) and "401" in str(e) for e in errors)
+        search.client.api_key = "test-key"
+        assert search.search("nginx")[0]["content"] == "nginx"
+        assert search.stats()["errors"] == 1
+    finally:
+        server.shutdown()
+
+
+def test_follower_timeout_leaves_the_search_running():
+    server, search = _setup()
+    try:
+        async def run():
+            leader = asyncio.ensure_future(search.asearch("lena timeout"))
+            await asyncio.sleep(0.05)
+            try:
+                await search.asearch("lena timeout", timeout=0.05)
+                assert False, "TimeoutError expected"
+            except TimeoutError:
+                pass
+            return await leader
+
+        assert asyncio.run(run())[0]["content"] == "lena timeout"
+        assert len(_FakeTavily.queries) == 1
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_identical_concurrent_queries_share_one_call()
+    test_cache_key_ttl_and_errors()
+    test_follower_timeout_leaves_the_search_running()
+    print("✓ Tavily search tests passed")
@@ -0,0 +1,117 @@
+"""Offline tests for concurrent tool execution with per-tool limits and timeouts"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool
+
+from agent.tool_executor import ToolExecutor, parse_tool_settings
+
+STARTS = []
+
+
+def _sleeper(name: str) -> StructuredTool:
+    def run(seconds: float) -> str:
+        STARTS.append((name, time.perf_counter()))
+        time.sleep(seconds)
+        return f"{name} slept {seconds}"
+
+    async def arun(seconds: float) -> str:
+        STARTS.append((name, time.perf_counter()))
+        await asyncio.sleep(seconds)
+        return f"{name} slept {seconds}"
+
+    return StructuredTool.from_function(func=run, coroutine=arun, name=name, description=f"Sleeps ({name})")
+
+
+def _state(*calls, deadline=None):
+    tool_calls = [{"name": name, "args": args, "id": f"call_{i}"} for i, (name, args) in enumerate(calls)]
+    state = {"messages": [AIMessage(content="", tool_calls=tool_calls)]}
+    if deadline is not None:
+        state["deadline"] = deadline
+    return state
+
+
+def _executor(**kwargs) -> ToolExecutor:
+    STARTS.clear()
+    return ToolExecutor([_sleeper("a"), _sleeper("b"), _sleeper("c")], **kwargs)
+
+
+def _run(executor, state, sync=False):
+    start = time.perf_counter()
+    result = executor.invoke(state) if sync else asyncio.run(executor.ainvoke(state))
+    return result["messages"], time.perf_counter() - start
+
+
+def test_parse_tool_settings():
+    assert parse_tool_settings("context7_tool=2, tavily_search_results_json=0.5") == {
+        "context7_tool": 2.0, "tavily_search_results_json": 0.5
+    }
+    assert parse_tool_settings(None) == {}
+
+
+def test_calls_run_concurrently_in_order():
+    for sync in (False, True):
+        executor = _executor()
+        messages, elapsed = _run(executor, _state(("a", {"seconds": 0.3}), ("b", {"seconds": 0.1}), ("c", {"seconds": 0.2})), sync)
+        # max(latency), not the sum
+        assert elapsed < 0.5
+        assert [m.tool_call_id for m in messages] == ["call_0", "call_1", "call_2"]
+        assert [m.content for m in messages] == ["a slept 0.3", "b slept 0.1", "c slept 0.2"]
+
+
+def test_concurrency_cap_and_rate_limit():
+    for sync in (False, True):
+        executor = _executor(concurrency={"a": 2})
+        messages, elapsed = _run(executor, _state(*[("a", {"seconds": 0.2})] * 5), sync)
+        assert all(m.status == "success" for m in messages)
+        assert executor.stats()["tools"]["a"]["peak"] == 2
+        assert 0.55 < elapsed < 0.9
+
+        executor = _executor(rate_limits={"b": 10})
+        _run(executor, _state(*[("b", {"seconds": 0})] * 3), sync)
+        starts = [t for _, t in STARTS]
+        assert all(later - earlier > 0.08 for earlier, later in zip(starts, starts[1:]))
+
+
+def test_timeouts_and_errors_do_not_fail_the_turn():
+    for sync in (False, True):
+        executor = _executor(timeouts={"a": 0.1})
+        messages, elapsed = _run(
+            executor,
+            _state(("a", {"seconds": 1.0}), ("b", {"seconds": 0.1}), ("missing", {}), ("c", {"seconds": "x"})),
+            sync,
+        )
+        assert elapsed < 0.5
+        assert messages[0].status == "error" and "did not finish within 0.1 seconds" in messages[0].content
+        assert messages[1].content == "b slept 0.1"
+        assert messages[2].status == "error" and "not a valid tool" in messages[2].content
+        assert messages[3].status == "error" and "Please fix your mistakes" in messages[3].content
+        stats = executor.stats()["tools"]
+        assert stats["a"]["timeouts"] == 1 and stats["c"]["errors"] == 1
+
+
+def test_deadline_bounds_the_calls():
+    for sync in (False, True):
+        executor = _executor()
+        messages, elapsed = _run(
+            executor, _state(("a", {"seconds": 1.0}), ("b", {"seconds": 0.1}), deadline=time.time() + 0.3), sync
+        )
+        assert elapsed < 0.6
+        assert messages[0].status == "error" and messages[1].status == "success"
+
+        messages, _ = _run(executor, _state(("a", {"seconds": 0.1}), deadline=time.time() - 1), sync)
+        assert "was not run" in messages[0].content and "time budget" in messages[0].content
+
+
+if __name__ == "__main__":
+    test_parse_tool_settings()
+    test_calls_run_concurrently_in_order()
+    test_concurrency_cap_and_rate_limit()
+    test_timeouts_and_errors_do_not_fail_the_turn()
+    test_deadline_bounds_the_calls()
+    print("✓ Tool executor tests passed")